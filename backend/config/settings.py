@@ -10,11 +10,19 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployment settings come from the environment, optionally from
+# backend/.env (see .env.example)
+load_dotenv(BASE_DIR / ".env")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -56,6 +64,16 @@ REST_FRAMEWORK = {
 
     # OpenAPI schema
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+
+    # Keyset pagination on created_at + id, ?page_size= up to 100
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 20,
+
+    # Same bytes as JSONRenderer, encoded with orjson when installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Swagger / OpenAPI config
@@ -86,6 +104,58 @@ AUTH_USER_MODEL = 'core.User'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'no-reply@foodwaste.com'
 
+# Cache for responses; the version counters invalidating them live in the
+# database (core.models.CacheVersion) so every process sees a bump
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Heatmap tiles are aggregated at this zoom, coarser zooms are derived
+HEATMAP_BASE_ZOOM = 16
+HEATMAP_CACHE_TIMEOUT = 60 * 60
+
+# Leaderboard pages are cached until a pickup is completed, or for this long
+LEADERBOARD_CACHE_TIMEOUT = 60 * 60
+
+# NGO feed pages are cached until a donation changes, or for this long
+DONATION_FEED_CACHE_TIMEOUT = 5 * 60
+
+# Build donation and request list responses from .values() rows instead
+# of a serializer per row (core/fast_serializers.py), same output
+FAST_LIST_SERIALIZATION = True
+
+# Upper bound on items per POST /api/donations/bulk/
+BULK_DONATION_MAX_ITEMS = 500
+
+# GET /api/donations/stream/: radius pushed to each NGO, and how often a
+# stream polls the feed version in the database for changes made by other
+# workers and management commands
+DONATION_STREAM_RADIUS_KM = 10
+DONATION_STREAM_POLL_SECONDS = 15
+
+# Batch matcher (manage.py match_donations): how far an NGO may be sent,
+# and how many km of extra travel one hour less until expiry is worth
+MATCH_RADIUS_KM = 10
+MATCH_EXPIRY_WEIGHT = 0.1
+
+# GET /api/requests/route/: assumed travel speed and time spent per
+# pickup, and how long a computed stop order is reused
+ROUTE_SPEED_KMH = 20
+ROUTE_STOP_MINUTES = 10
+ROUTE_CACHE_TIMEOUT = 15 * 60
+
+# Per-view query count, DB, serialization and total time in Server-Timing
+# headers and GET /api/metrics/ (Prometheus), REQUEST_METRICS=1 to enable
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "0") == "1"
+
+# GET /api/export/...: rows fetched from the cursor and encoded per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+# GET /api/stats/timeseries/: most periods one response may cover
+TIMESERIES_MAX_PERIODS = 1000
+
 # JWT Settings
 from datetime import timedelta
 
@@ -103,6 +173,8 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    # First, so its total covers the rest of the stack
+    "core.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -146,12 +218,67 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DB_NAME", "foodwaste"),
+            "USER": os.getenv("DB_USER", "postgres"),
+            "PASSWORD": os.getenv("DB_PASSWORD", ""),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "5432"),
+            # Keep connections open across requests, checked before reuse
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            # Exports stream through server-side cursors, which do not work
+            # behind PgBouncer in transaction pooling mode; with this set
+            # each export is fetched into memory whole instead
+            "DISABLE_SERVER_SIDE_CURSORS": os.getenv("DB_DISABLE_SERVER_SIDE_CURSORS", "0") == "1",
+            "OPTIONS": {
+                "connect_timeout": 5,
+            },
+        }
     }
-}
+
+    # Built-in connection pool, needs psycopg 3 (psycopg[pool]) instead
+    # of psycopg2 and replaces persistent connections
+    if os.getenv("DB_POOL_MAX_SIZE"):
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE")),
+        }
+elif DB_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                # WAL lets readers run alongside the single writer, and
+                # IMMEDIATE transactions take the write lock up front so
+                # concurrent writers wait (up to timeout seconds) instead
+                # of failing when a read lock cannot be upgraded
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA temp_store=MEMORY;"
+                    "PRAGMA mmap_size=134217728;"
+                    "PRAGMA cache_size=-32000;"
+                ),
+                "transaction_mode": "IMMEDIATE",
+                "timeout": 20,
+            },
+            # A file rather than the in-memory default, so tests that run
+            # requests on several threads share one database
+            "TEST": {
+                "NAME": os.getenv("DB_TEST_NAME", BASE_DIR / "test_db.sqlite3"),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unsupported DB_ENGINE {DB_ENGINE!r}, use 'sqlite' or 'postgresql'.")
 
 
 # Password validation
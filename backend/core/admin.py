@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Donation, FoodRequest, ImpactLog, FoodRiskAssessment
+from .models import User, Donation, FoodRequest, ImpactLog, ImpactRollup, FoodRiskAssessment, NotificationOutbox
 
 
 @admin.register(User)
@@ -46,6 +46,19 @@ class ImpactAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ImpactRollup)
+class ImpactRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        "scope",
+        "key",
+        "meals_saved",
+        "food_saved_kg",
+        "co2_saved_kg",
+        "donations_count",
+    )
+    list_filter = ("scope",)
+
+
 from .models import Rating
 
 @admin.register(Rating)
@@ -54,3 +67,8 @@ class RatingAdmin(admin.ModelAdmin):
     list_filter = ("rating", "created_at")
 
 
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ("recipient", "donation", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("recipient",)
@@ -0,0 +1,17 @@
+"""
+API load and latency benchmarks, run with manage.py bench_api.
+
+core.benchmarks.data seeds a synthetic dataset and core.benchmarks.runner
+drives the endpoints against it, in-process through Django's test client
+or over HTTP through a threaded WSGI server.
+"""
+from .data import delete_dataset, generate_dataset
+from .runner import SCENARIOS, compare_reports, run_benchmarks
+
+__all__ = [
+    'SCENARIOS',
+    'compare_reports',
+    'delete_dataset',
+    'generate_dataset',
+    'run_benchmarks',
+]
@@ -0,0 +1,286 @@
+"""
+Synthetic data for the API benchmarks.
+
+Users are scattered around a handful of city centres with a normal
+spread, so feeds, distance filters and heatmap tiles see clustered data
+like production rather than a uniform grid. Donations skew towards a few
+busy donors and spread over the last few days; older ones are mostly
+picked up, recent ones available or requested. Everything a dataset
+creates hangs off users named after its tag, so delete_dataset can
+remove it again.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Donation, FoodRequest, ImpactLog, Rating
+from ..services import (
+    assess_food_risk_bulk,
+    donation_feed_changed,
+    rebuild_daily_impact_stats,
+    rebuild_heatmap,
+    rebuild_impact_rollup,
+    rebuild_leaderboards,
+)
+
+User = get_user_model()
+
+# (name, latitude, longitude, relative share of users)
+CITIES = [
+    ('Bengaluru', 12.9716, 77.5946, 4),
+    ('Mumbai', 19.0760, 72.8777, 5),
+    ('Delhi', 28.6139, 77.2090, 5),
+    ('Hyderabad', 17.3850, 78.4867, 3),
+    ('Chennai', 13.0827, 80.2707, 3),
+]
+
+# Donors who never set a location, they are left out of NGO feeds and
+# the heatmap
+UNLOCATED_DONOR_SHARE = 0.05
+
+FOOD_TYPES = ['COOKED', 'PACKAGED', 'RAW']
+FOOD_TYPE_WEIGHTS = [5, 3, 2]
+
+# Hours from posting to expiry
+SHELF_LIFE_HOURS = {
+    'COOKED': (4, 12),
+    'PACKAGED': (24, 240),
+    'RAW': (12, 72),
+}
+
+DESCRIPTIONS = {
+    'COOKED': ['Rice and dal', 'Vegetable biryani', 'Chapati and sabzi', 'Idli and sambar'],
+    'PACKAGED': ['Biscuit packets', 'Bread loaves', 'Packaged juice', 'Instant noodles'],
+    'RAW': ['Tomatoes and onions', 'Rice sacks', 'Fresh fruit', 'Leafy vegetables'],
+}
+
+RATING_WEIGHTS = [1, 1, 3, 7, 8]
+
+KM_PER_DEGREE = 111.32
+
+
+class Dataset:
+    """Users and row counts of a generated dataset."""
+
+    def __init__(self, tag, donors, ngos, counts):
+        self.tag = tag
+        self.donors = donors
+        self.ngos = ngos
+        self.counts = counts
+
+    def users(self):
+        return User.objects.filter(username__startswith=f'{self.tag}_')
+
+
+def generate_dataset(donors=200, ngos=40, donations=5000, ratings=500, impact_logs=1000,
+                     days=7, spread_km=8, seed=0):
+    """
+    Create a synthetic dataset with bulk inserts and bring the impact
+    rollup, timeseries, heatmap and rating aggregates up to date with it.
+
+    impact_logs and ratings are capped by what the data allows: one log
+    per picked up donation and one rating per pair of users.
+    """
+    rng = random.Random(seed)
+    tag = f'bench_api_{time.time_ns()}'
+    now = timezone.now()
+
+    with transaction.atomic():
+        donor_users, donor_cities = _create_users(rng, tag, 'DONOR', donors, spread_km)
+        ngo_users, ngo_cities = _create_users(rng, tag, 'NGO', ngos, spread_km)
+        donor_city = {donor.pk: city for donor, city in zip(donor_users, donor_cities)}
+        city_ngos = {}
+        for ngo, city in zip(ngo_users, ngo_cities):
+            city_ngos.setdefault(city, []).append(ngo)
+
+        created = _create_donations(rng, donor_users, donations, days, now)
+        requests = _create_requests(rng, created, donor_city, ngo_users, city_ngos, now)
+        logs = _create_impact_logs(rng, requests, impact_logs)
+        rated = _create_ratings(rng, donor_users, ngo_users, requests, ratings)
+
+        rebuild_impact_rollup()
+        rebuild_heatmap()
+        rebuild_daily_impact_stats()
+        rebuild_leaderboards()
+        donation_feed_changed()
+
+    return Dataset(tag, donor_users, ngo_users, {
+        'donors': len(donor_users),
+        'ngos': len(ngo_users),
+        'donations': len(created),
+        'requests': len(requests),
+        'impact_logs': logs,
+        'ratings': rated,
+    })
+
+
+def delete_dataset(dataset):
+    """Remove a generated dataset and rebuild the aggregates it fed."""
+    with transaction.atomic():
+        # Impact logs outlive their donation, everything else cascades
+        ImpactLog.objects.filter(donation__donor__in=dataset.users()).delete()
+        dataset.users().delete()
+
+        rebuild_impact_rollup()
+        rebuild_heatmap()
+        rebuild_daily_impact_stats()
+        rebuild_leaderboards()
+        donation_feed_changed()
+
+
+def _create_users(rng, tag, role, count, spread_km):
+    users, cities = [], []
+    for i in range(count):
+        city = rng.choices(range(len(CITIES)), weights=[c[3] for c in CITIES])[0]
+        latitude = longitude = None
+        if role == 'NGO' or rng.random() >= UNLOCATED_DONOR_SHARE:
+            latitude, longitude = _scatter(rng, CITIES[city][1], CITIES[city][2], spread_km)
+        users.append(User(
+            username=f'{tag}_{role.lower()}{i}',
+            email=f'{role.lower()}{i}@bench.invalid',
+            role=role,
+            latitude=latitude,
+            longitude=longitude,
+            pickup_capacity=rng.randint(3, 10) if role == 'NGO' else 5,
+        ))
+        cities.append(city)
+    return User.objects.bulk_create(users, batch_size=500), cities
+
+
+def _scatter(rng, latitude, longitude, spread_km):
+    # Normal spread around the centre, degrees of longitude shrink with
+    # the cosine of the latitude
+    latitude_offset = rng.gauss(0, spread_km) / KM_PER_DEGREE
+    longitude_offset = rng.gauss(0, spread_km) / (KM_PER_DEGREE * math.cos(math.radians(latitude)))
+    return round(latitude + latitude_offset, 6), round(longitude + longitude_offset, 6)
+
+
+def _create_donations(rng, donors, count, days, now):
+    # A few busy donors (restaurants, caterers) post most donations
+    weights = [rng.paretovariate(1.5) for _ in donors]
+    donations = []
+    for donor in rng.choices(donors, weights=weights, k=count):
+        created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        food_type = rng.choices(FOOD_TYPES, weights=FOOD_TYPE_WEIGHTS)[0]
+        shelf_life = rng.uniform(*SHELF_LIFE_HOURS[food_type])
+        expiry_time = created_at + timedelta(hours=shelf_life)
+
+        if expiry_time > now:
+            status = 'AVAILABLE' if rng.random() < 0.75 else 'REQUESTED'
+        else:
+            status = 'PICKED_UP' if rng.random() < 0.7 else 'EXPIRED'
+
+        donation = Donation(
+            donor=donor,
+            food_type=food_type,
+            description=rng.choice(DESCRIPTIONS[food_type]),
+            quantity_kg=max(0.5, round(rng.lognormvariate(1.0, 0.7), 1)),
+            cooked_time=created_at - timedelta(minutes=rng.uniform(0, 120)) if food_type == 'COOKED' else None,
+            expiry_time=expiry_time,
+            status=status,
+        )
+        donation.backdated = created_at
+        donations.append(donation)
+
+    donations = Donation.objects.bulk_create(donations, batch_size=1000)
+    assess_food_risk_bulk(donations)
+
+    # created_at is auto_now_add, so the spread over past days goes in
+    # with a second pass
+    for donation in donations:
+        donation.created_at = donation.backdated
+    Donation.objects.bulk_update(donations, ['created_at'], batch_size=500)
+    return donations
+
+
+def _create_requests(rng, donations, donor_city, ngos, city_ngos, now):
+    requests = []
+    for donation in donations:
+        if donation.status not in ('REQUESTED', 'PICKED_UP'):
+            continue
+        # NGOs claim food in their own city when there is one
+        ngo = rng.choice(city_ngos.get(donor_city[donation.donor_id]) or ngos)
+
+        if donation.status == 'REQUESTED':
+            status = 'PENDING' if rng.random() < 0.6 else 'APPROVED'
+            pickup_time = now + timedelta(hours=rng.uniform(0.5, 6))
+        else:
+            status = 'COMPLETED'
+            pickup_time = donation.created_at + timedelta(hours=rng.uniform(0.5, 6))
+
+        request = FoodRequest(donation=donation, ngo=ngo, pickup_time=pickup_time, status=status)
+        request.backdated = donation.created_at + timedelta(minutes=rng.uniform(5, 30))
+        requests.append(request)
+
+    requests = FoodRequest.objects.bulk_create(requests, batch_size=1000)
+    for request in requests:
+        request.requested_at = request.backdated
+    FoodRequest.objects.bulk_update(requests, ['requested_at'], batch_size=500)
+    return requests
+
+
+def _create_impact_logs(rng, requests, count):
+    completed = [request for request in requests if request.status == 'COMPLETED']
+    logs = []
+    for request in rng.sample(completed, min(count, len(completed))):
+        food_kg = request.donation.quantity_kg
+        log = ImpactLog(
+            donation=request.donation,
+            # Same figures as services.calculate_impact
+            meals_saved=int(food_kg / 0.5),
+            food_saved_kg=food_kg,
+            co2_saved_kg=round(food_kg * 2.5, 2),
+        )
+        log.backdated = request.pickup_time
+        logs.append(log)
+
+    logs = ImpactLog.objects.bulk_create(logs, batch_size=1000)
+    for log in logs:
+        log.created_at = log.backdated
+    ImpactLog.objects.bulk_update(logs, ['created_at'], batch_size=500)
+    return len(logs)
+
+
+def _create_ratings(rng, donors, ngos, requests, count):
+    # NGOs rate the donors they picked up from first, then random pairs
+    # in either direction fill up the rest
+    pairs = list(dict.fromkeys(
+        (request.donation.donor_id, request.ngo_id)
+        for request in requests if request.status == 'COMPLETED'
+    ))
+    rng.shuffle(pairs)
+    pairs = pairs[:count]
+
+    chosen = set(pairs)
+    available = 2 * len(donors) * len(ngos)
+    while len(chosen) < min(count, available):
+        donor, ngo = rng.choice(donors), rng.choice(ngos)
+        pair = (donor.pk, ngo.pk) if rng.random() < 0.8 else (ngo.pk, donor.pk)
+        if pair not in chosen:
+            chosen.add(pair)
+            pairs.append(pair)
+
+    ratings = [
+        Rating(
+            rated_user_id=rated_user_id,
+            rated_by_id=rated_by_id,
+            rating=rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+        )
+        for rated_user_id, rated_by_id in pairs
+    ]
+    Rating.objects.bulk_create(ratings, batch_size=1000)
+
+    # Only users of this dataset were rated, keep their aggregates in
+    # step without touching anyone else's
+    users = {user.pk: user for user in donors + ngos}
+    for rating in ratings:
+        user = users[rating.rated_user_id]
+        user.rating_count += 1
+        user.rating_sum += rating.rating
+    User.objects.bulk_update(users.values(), ['rating_count', 'rating_sum'], batch_size=500)
+    return len(ratings)
@@ -0,0 +1,232 @@
+"""
+Drive API endpoints against a generated dataset and report latency.
+
+Two modes:
+
+- client: requests go through django.test.Client one at a time in this
+  thread, so latency is Django and the database without any network.
+- wsgi: a threaded WSGI server on a free local port serves requests
+  sent over HTTP by several client threads at once, closer to how the
+  API behaves under load.
+
+Both count the SQL queries each request runs with an execute wrapper on
+the connection serving it. Every scenario is warmed up first so cached
+endpoints are measured in their steady state.
+"""
+import http.client
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+import numpy as np
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+# (name, path, role of the requesting user)
+SCENARIOS = [
+    ('donations_donor', '/api/donations/', 'DONOR'),
+    ('donations_ngo', '/api/donations/', 'NGO'),
+    ('requests_ngo', '/api/requests/', 'NGO'),
+    ('impact_stats', '/api/stats/impact/', 'NGO'),
+    ('impact_timeseries', '/api/stats/timeseries/?bucket=week&group_by=food_type', 'NGO'),
+    ('leaderboard_all', '/api/stats/leaderboard/donors/?period=all', 'DONOR'),
+    ('heatmap', '/api/stats/heatmap/', 'NGO'),
+    ('heatmap_week', '/api/stats/heatmap/?zoom=10&days=7', 'NGO'),
+]
+
+MODES = ('client', 'wsgi')
+
+
+def run_benchmarks(dataset, modes=MODES, scenarios=None, requests=200, threads=8, warmup=5, seed=0):
+    """
+    Run every scenario in each mode and return a JSON-ready report.
+
+    scenarios is a list of names from SCENARIOS, all of them by default.
+    """
+    selected = [s for s in SCENARIOS if scenarios is None or s[0] in scenarios]
+    tokens = {
+        user.pk: f'Bearer {AccessToken.for_user(user)}'
+        for user in dataset.donors + dataset.ngos
+    }
+    users = {'DONOR': dataset.donors, 'NGO': dataset.ngos}
+
+    results = []
+    for mode in modes:
+        run = _run_client if mode == 'client' else _run_wsgi
+        for name, path, role in selected:
+            rng = random.Random(seed)
+            headers = [tokens[rng.choice(users[role]).pk] for _ in range(warmup + requests)]
+            samples, elapsed = run(path, headers[:warmup], headers[warmup:], threads)
+            results.append(_summarize(name, path, mode, samples, elapsed, threads if mode == 'wsgi' else 1))
+
+    return {
+        'commit': _git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'dataset': dataset.counts,
+        'options': {'requests': requests, 'threads': threads, 'warmup': warmup, 'seed': seed},
+        'results': results,
+    }
+
+
+def compare_reports(baseline, current, threshold=0.2):
+    """
+    Pair up results by scenario and mode. A result regressed when it runs
+    more queries per request than the baseline, or its p95 latency grew
+    by more than threshold (a fraction).
+    """
+    previous = {(r['name'], r['mode']): r for r in baseline['results']}
+    comparisons = []
+    for result in current['results']:
+        before = previous.get((result['name'], result['mode']))
+        if before is None:
+            continue
+        p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+        comparisons.append({
+            'name': result['name'],
+            'mode': result['mode'],
+            'p95_ms': (before['p95_ms'], result['p95_ms']),
+            'queries_per_request': (before['queries_per_request'], result['queries_per_request']),
+            'regressed': (
+                result['queries_per_request'] > before['queries_per_request']
+                or p95_change > threshold
+            ),
+        })
+    return comparisons
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _host():
+    return next(
+        (host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')),
+        'localhost',
+    )
+
+
+def _run_client(path, warmup, headers, threads):
+    client = Client(SERVER_NAME=_host())
+    for header in warmup:
+        client.get(path, HTTP_AUTHORIZATION=header)
+
+    samples = []
+    started = time.perf_counter()
+    for header in headers:
+        counter = _QueryCounter()
+        request_started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = client.get(path, HTTP_AUTHORIZATION=header)
+        samples.append((time.perf_counter() - request_started, counter.count, response.status_code))
+    return samples, time.perf_counter() - started
+
+
+def _run_wsgi(path, warmup, headers, threads):
+    queries = {}
+    handler = WSGIHandler()
+
+    def application(environ, start_response):
+        # Runs in the server thread handling the request, on its own
+        # connection
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = handler(environ, start_response)
+        queries[environ['HTTP_X_BENCH_REQUEST']] = counter.count
+        return response
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler)
+    server.set_app(application)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    host = _host()
+    port = server.server_address[1]
+
+    def send(request_id, header):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            request_started = time.perf_counter()
+            conn.request('GET', path, headers={
+                'Host': host,
+                'Authorization': header,
+                'X-Bench-Request': str(request_id),
+            })
+            response = conn.getresponse()
+            response.read()
+            return time.perf_counter() - request_started, response.status
+        finally:
+            conn.close()
+
+    try:
+        for i, header in enumerate(warmup):
+            send(-i - 1, header)
+
+        with ThreadPoolExecutor(threads) as pool:
+            started = time.perf_counter()
+            timings = list(pool.map(send, range(len(headers)), headers))
+            elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    samples = [
+        (latency, queries.get(str(request_id), 0), status)
+        for request_id, (latency, status) in enumerate(timings)
+    ]
+    return samples, elapsed
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _summarize(name, path, mode, samples, elapsed, concurrency):
+    latencies = np.array([latency for latency, _, _ in samples]) * 1000
+    queries = [count for _, count, _ in samples]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'name': name,
+        'path': path,
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status in samples if status != 200),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+    }
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
@@ -0,0 +1,19 @@
+from django.db.models import F
+
+from .models import CacheVersion
+
+
+def get_version(name):
+    """Current value of a named cache version counter."""
+    value = CacheVersion.objects.filter(name=name).values_list('value', flat=True).first()
+    return value or 1
+
+
+def bump_version(name):
+    """Invalidate every cache entry built from the named version."""
+    if not CacheVersion.objects.filter(name=name).update(value=F('value') + 1):
+        _, created = CacheVersion.objects.get_or_create(name=name, defaults={'value': 2})
+        if created:
+            return 2
+        CacheVersion.objects.filter(name=name).update(value=F('value') + 1)
+    return get_version(name)
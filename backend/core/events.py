@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+
+class DonationBroker:
+    """
+    In-process pub/sub for donation changes.
+
+    Publishers run in sync request or worker threads, subscribers are
+    SSE connections on an event loop, so delivery goes through
+    loop.call_soon_threadsafe. Only subscribers in this process are
+    reached; streams in other workers catch up by polling the
+    donation_feed version row (core.models.CacheVersion).
+    """
+
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {sub for sub in self._subscribers if sub[1] is not queue}
+
+    def publish(self, version, donation_ids):
+        """
+        Deliver a donation_feed version bump to every subscriber as a
+        (version, donation_ids) item, donation_ids None meaning resync.
+        """
+        event = (version, None if donation_ids is None else list(donation_ids))
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # Loop already closed, the subscriber is going away
+                pass
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client falls back to a full resync on its next poll
+            pass
+
+
+broker = DonationBroker()
@@ -0,0 +1,187 @@
+"""
+Read-only fast paths for list responses.
+
+Rows come from .values() and are turned into the exact dicts
+DonationSerializer and FoodRequestSerializer produce, without building
+a serializer and its fields per row. Values that need formatting
+(datetimes, decimals) go through the serializers' own fields, so the
+output stays identical; keep these in step with the serializers, the
+tests compare both.
+"""
+from django.utils import timezone
+from rest_framework.settings import ISO_8601, api_settings
+
+from .metrics import timed_serialization
+from .serializers import DonationSerializer, FoodRequestSerializer
+from .utils import haversine_distances
+
+USER_COLUMNS = [
+    'id', 'username', 'email', 'role', 'phone', 'address',
+    'latitude', 'longitude', 'pickup_capacity', 'rating_count', 'rating_sum',
+]
+
+DONATION_COLUMNS = [
+    'id', 'food_type', 'description', 'quantity_kg', 'cooked_time',
+    'expiry_time', 'status', 'created_at', 'risk__risk_level', 'risk__reason',
+] + [f'donor__{column}' for column in USER_COLUMNS]
+
+FOOD_REQUEST_COLUMNS = [
+    'id', 'pickup_time', 'status', 'requested_at',
+] + [f'donation__{column}' for column in DONATION_COLUMNS] + [
+    f'ngo__{column}' for column in USER_COLUMNS
+]
+
+
+def donation_values(queryset):
+    return queryset.values(*DONATION_COLUMNS)
+
+
+def food_request_values(queryset):
+    return queryset.values(*FOOD_REQUEST_COLUMNS)
+
+
+class _Formats:
+    """
+    The serializer fields' to_representation for values that need
+    formatting, with the per-call work hoisted out of the row loop.
+    """
+
+    def __init__(self):
+        donation = DonationSerializer().fields
+        user = donation['donor'].fields
+        food_request = FoodRequestSerializer().fields
+
+        self.datetime = _datetime_format(donation['expiry_time'])
+        self.pickup_time = _datetime_format(food_request['pickup_time'])
+        self.requested_at = _datetime_format(food_request['requested_at'])
+        # Coordinates repeat for every row of the same donor
+        self.latitude = _memoized(user['latitude'].to_representation)
+        self.longitude = _memoized(user['longitude'].to_representation)
+        self.users = {}
+
+
+def _datetime_format(field):
+    """
+    DateTimeField.to_representation for aware datetimes in ISO 8601,
+    resolving the output timezone once instead of per value.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None or output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def format_value(value):
+        if not value or not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return format_value
+
+
+def _memoized(format_value):
+    formatted = {}
+
+    def format_cached(value):
+        if value not in formatted:
+            formatted[value] = format_value(value)
+        return formatted[value]
+
+    return format_cached
+
+
+def _optional(format_value, value):
+    return None if value is None else format_value(value)
+
+
+def _user(row, prefix, formats):
+    # Built once per user and response, repeated donors and the NGO of
+    # every request share the dict
+    user_id = row[f'{prefix}id']
+    if user_id in formats.users:
+        return formats.users[user_id]
+
+    count = row[f'{prefix}rating_count']
+    user = formats.users[user_id] = {
+        'id': user_id,
+        'username': row[f'{prefix}username'],
+        'email': row[f'{prefix}email'],
+        'role': row[f'{prefix}role'],
+        'phone': row[f'{prefix}phone'],
+        'address': row[f'{prefix}address'],
+        'latitude': _optional(formats.latitude, row[f'{prefix}latitude']),
+        'longitude': _optional(formats.longitude, row[f'{prefix}longitude']),
+        'pickup_capacity': row[f'{prefix}pickup_capacity'],
+        # Same rounding as User.average_rating
+        'average_rating': round(row[f'{prefix}rating_sum'] / count, 2) if count else None,
+    }
+    return user
+
+
+def _donation(row, prefix, formats, distance_km=None):
+    donor = _user(row, f'{prefix}donor__', formats)
+
+    risk_level = row[f'{prefix}risk__risk_level']
+    return {
+        'id': row[f'{prefix}id'],
+        'donor': donor,
+        'risk_assessment': None if risk_level is None else {
+            'risk_level': risk_level,
+            'reason': row[f'{prefix}risk__reason'],
+        },
+        'distance_km': distance_km,
+        'food_type': row[f'{prefix}food_type'],
+        'description': row[f'{prefix}description'],
+        'quantity_kg': row[f'{prefix}quantity_kg'],
+        'cooked_time': _optional(formats.datetime, row[f'{prefix}cooked_time']),
+        'expiry_time': formats.datetime(row[f'{prefix}expiry_time']),
+        'status': row[f'{prefix}status'],
+        'created_at': formats.datetime(row[f'{prefix}created_at']),
+    }
+
+
+@timed_serialization
+def donation_payloads(rows):
+    """DonationSerializer(many=True) output without distance_km filled in."""
+    formats = _Formats()
+    return [_donation(row, '', formats) for row in rows]
+
+
+@timed_serialization
+def food_request_payloads(rows, ngo=None):
+    """
+    FoodRequestSerializer(many=True) output; pass the requesting NGO
+    (with a location) to fill in each nested donation's distance_km.
+    """
+    formats = _Formats()
+    rows = list(rows)
+
+    # One vectorized call for the page, like DonationListSerializer
+    distances = {}
+    if ngo is not None:
+        located = [
+            row for row in rows
+            if row['donation__donor__latitude'] and row['donation__donor__longitude']
+        ]
+        if located:
+            km = haversine_distances(
+                ngo.latitude,
+                ngo.longitude,
+                [row['donation__donor__latitude'] for row in located],
+                [row['donation__donor__longitude'] for row in located],
+            )
+            distances = {row['id']: round(float(d), 2) for row, d in zip(located, km)}
+
+    return [
+        {
+            'id': row['id'],
+            'donation': _donation(row, 'donation__', formats, distances.get(row['id'])),
+            'ngo': _user(row, 'ngo__', formats),
+            'pickup_time': formats.pickup_time(row['pickup_time']),
+            'status': row['status'],
+            'requested_at': formats.requested_at(row['requested_at']),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,117 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import SCENARIOS, compare_reports, delete_dataset, generate_dataset, run_benchmarks
+from core.benchmarks.runner import MODES
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset, benchmark the main API endpoints through the "
+        "test client and a threaded WSGI server, and report latency percentiles, "
+        "queries per request and throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--donors", type=int, default=200)
+        parser.add_argument("--ngos", type=int, default=40)
+        parser.add_argument("--donations", type=int, default=5000)
+        parser.add_argument("--ratings", type=int, default=500)
+        parser.add_argument("--impact-logs", type=int, default=1000)
+        parser.add_argument("--days", type=int, default=7, help="Spread donations over the last N days")
+        parser.add_argument("--spread-km", type=float, default=8, help="Spread of users around each city centre")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario and mode")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--threads", type=int, default=8, help="Client threads in wsgi mode")
+        parser.add_argument("--mode", choices=MODES + ("both",), default="both")
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[name for name, _, _ in SCENARIOS],
+            help="Run only this scenario, may be repeated",
+        )
+        parser.add_argument("--json", help="Write the report to this file, - for stdout")
+        parser.add_argument("--compare", help="Baseline report to compare against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20,
+            help="p95 growth in percent that counts as a regression",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        # Requests in wsgi mode run on the server's own connections, so
+        # the dataset is committed and deleted again at the end. Run it
+        # against a scratch database: rollups and the heatmap are rebuilt
+        # from the whole table on the way in and out.
+        dataset = generate_dataset(
+            donors=options["donors"],
+            ngos=options["ngos"],
+            donations=options["donations"],
+            ratings=options["ratings"],
+            impact_logs=options["impact_logs"],
+            days=options["days"],
+            spread_km=options["spread_km"],
+            seed=options["seed"],
+        )
+        try:
+            report = run_benchmarks(
+                dataset,
+                modes=MODES if options["mode"] == "both" else (options["mode"],),
+                scenarios=options["scenario"],
+                requests=options["requests"],
+                threads=options["threads"],
+                warmup=options["warmup"],
+                seed=options["seed"],
+            )
+        finally:
+            delete_dataset(dataset)
+
+        if options["json"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print(report)
+            if options["json"]:
+                with open(options["json"], "w") as f:
+                    json.dump(report, f, indent=2)
+                self.stdout.write(f"Report written to {options['json']}")
+
+        if baseline is not None:
+            self._compare(baseline, report, options["threshold"] / 100)
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{report['environment']['database']} @ {report['commit'] or 'unknown commit'}, dataset "
+            + ", ".join(f"{count} {name}" for name, count in report["dataset"].items())
+        )
+        self.stdout.write(
+            f"{'scenario':<18} {'mode':<7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'queries':>8} {'req/s':>8} {'errors':>7}"
+        )
+        for r in report["results"]:
+            self.stdout.write(
+                f"{r['name']:<18} {r['mode']:<7} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                f"{r['p99_ms']:>8.1f} {r['queries_per_request']:>8.1f} {r['throughput_rps']:>8.1f} "
+                f"{r['errors']:>7}"
+            )
+
+    def _compare(self, baseline, report, threshold):
+        self.stdout.write(f"Compared with {baseline.get('commit') or 'baseline'}:")
+        comparisons = compare_reports(baseline, report, threshold)
+        for c in comparisons:
+            (p95_before, p95_after), (queries_before, queries_after) = c["p95_ms"], c["queries_per_request"]
+            self.stdout.write(
+                f"{c['name']:<18} {c['mode']:<7} p95 {p95_before:.1f} -> {p95_after:.1f} ms, "
+                f"queries {queries_before:g} -> {queries_after:g}" + ("  REGRESSED" if c["regressed"] else "")
+            )
+
+        regressed = [f"{c['name']} ({c['mode']})" for c in comparisons if c["regressed"]]
+        if regressed:
+            raise CommandError(f"Regressed: {', '.join(regressed)}")
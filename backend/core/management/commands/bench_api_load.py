@@ -0,0 +1,148 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Donation, FoodRequest, FoodRiskAssessment, User
+from core.services import donation_feed_changed, rebuild_daily_impact_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the API in-process from concurrent threads against the "
+        "configured database (DB_ENGINE) and report requests/sec"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10, help="Seconds to run")
+        parser.add_argument("--donations", type=int, default=2000)
+        parser.add_argument(
+            "--write-ratio",
+            type=float,
+            default=0.1,
+            help="Share of requests that create a donation",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        db = settings.DATABASES["default"]
+        self.stdout.write(
+            f"{vendor}: CONN_MAX_AGE={db.get('CONN_MAX_AGE', 0)} "
+            f"pool={'pool' in db.get('OPTIONS', {})} threads={options['threads']}"
+        )
+
+        # Requests run on their own connections, so the seeded rows are
+        # committed and deleted again at the end instead of rolled back.
+        # Users have no location, which keeps the heatmap untouched; the
+        # posted donations counted in the daily stats are rebuilt.
+        run_id = f"{time.time_ns()}"
+        donors = User.objects.bulk_create([
+            User(username=f"bench_load_donor_{run_id}_{i}", role="DONOR") for i in range(20)
+        ])
+        ngo = User.objects.create(username=f"bench_load_ngo_{run_id}", role="NGO")
+        users = [ngo] + donors
+
+        try:
+            self._seed(donors, ngo, options["donations"])
+            results = self._run(donors, ngo, options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            rebuild_daily_impact_stats()
+            donation_feed_changed()
+
+        latencies = sorted(latency for thread in results for latency, _ in thread)
+        errors = sum(1 for thread in results for _, ok in thread if not ok)
+        total = len(latencies)
+        self.stdout.write(
+            f"{total} requests in {options['duration']:.0f}s - {total / options['duration']:.0f} req/s, "
+            f"p50 {latencies[total // 2] * 1000:.1f}ms, "
+            f"p95 {latencies[int(total * 0.95)] * 1000:.1f}ms, {errors} errors"
+        )
+
+    def _seed(self, donors, ngo, count):
+        now = timezone.now()
+        donations = Donation.objects.bulk_create(
+            [
+                Donation(
+                    donor=donors[i % len(donors)],
+                    food_type="PACKAGED",
+                    description="bench",
+                    quantity_kg=1,
+                    expiry_time=now + timedelta(days=1),
+                    status="REQUESTED" if i % 4 == 0 else "AVAILABLE",
+                )
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+        FoodRiskAssessment.objects.bulk_create(
+            [
+                FoodRiskAssessment(donation=donation, risk_level="LOW", reason="Food is safe for consumption")
+                for donation in donations
+            ],
+            batch_size=1000,
+        )
+        FoodRequest.objects.bulk_create(
+            [
+                FoodRequest(donation=donation, ngo=ngo, pickup_time=now)
+                for donation in donations
+                if donation.status == "REQUESTED"
+            ],
+            batch_size=1000,
+        )
+
+    def _run(self, donors, ngo, options):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != "*" and not host.startswith(".")),
+            "localhost",
+        )
+        tokens = {user.pk: f"Bearer {AccessToken.for_user(user)}" for user in donors + [ngo]}
+        expiry = (timezone.now() + timedelta(days=1)).isoformat()
+        deadline = time.perf_counter() + options["duration"]
+        barrier = threading.Barrier(options["threads"])
+        results = [[] for _ in range(options["threads"])]
+
+        def worker(index):
+            rng = random.Random(index)
+            client = Client(SERVER_NAME=host)
+            try:
+                barrier.wait()
+                while time.perf_counter() < deadline:
+                    donor = rng.choice(donors)
+                    roll = rng.random()
+                    started = time.perf_counter()
+                    if roll < options["write_ratio"]:
+                        response = client.post(
+                            "/api/donations/",
+                            {"food_type": "RAW", "description": "bench", "quantity_kg": 1, "expiry_time": expiry},
+                            content_type="application/json",
+                            HTTP_AUTHORIZATION=tokens[donor.pk],
+                        )
+                        ok = response.status_code == 201
+                    elif roll < 0.55:
+                        response = client.get("/api/donations/", HTTP_AUTHORIZATION=tokens[donor.pk])
+                        ok = response.status_code == 200
+                    elif roll < 0.85:
+                        response = client.get("/api/requests/", HTTP_AUTHORIZATION=tokens[ngo.pk])
+                        ok = response.status_code == 200
+                    else:
+                        response = client.get("/api/stats/impact/", HTTP_AUTHORIZATION=tokens[ngo.pk])
+                        ok = response.status_code == 200
+                    results[index].append((time.perf_counter() - started, ok))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
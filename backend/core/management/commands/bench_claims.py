@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import Donation, FoodRequest, User
+from core.services import claim_donation
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent NGO claims on a small set of popular donations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--donations", type=int, default=100)
+        parser.add_argument(
+            "--attempts",
+            type=int,
+            default=20,
+            help="Claim attempts per thread",
+        )
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        now = timezone.now()
+
+        # Claims run on their own connections, so the seeded rows are
+        # committed and deleted again at the end instead of rolled back.
+        donor = User.objects.create(username="bench_claims_donor", role="DONOR")
+        ngos = User.objects.bulk_create([
+            User(username=f"bench_claims_ngo{i}", role="NGO") for i in range(threads)
+        ])
+        donations = Donation.objects.bulk_create([
+            Donation(
+                donor=donor,
+                food_type="PACKAGED",
+                description="bench",
+                quantity_kg=1,
+                expiry_time=now + timedelta(days=1),
+            )
+            for _ in range(options["donations"])
+        ])
+        donation_ids = [donation.pk for donation in donations]
+
+        try:
+            barrier = threading.Barrier(threads)
+
+            def run(ngo):
+                rng = random.Random(ngo.pk)
+                won = 0
+                try:
+                    barrier.wait()
+                    for _ in range(options["attempts"]):
+                        donation = Donation(pk=rng.choice(donation_ids))
+                        with transaction.atomic():
+                            if claim_donation(donation):
+                                FoodRequest.objects.create(
+                                    donation=donation, ngo=ngo, pickup_time=now
+                                )
+                                won += 1
+                finally:
+                    connection.close()
+                return won
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                won = sum(pool.map(run, ngos))
+            elapsed = time.perf_counter() - started
+
+            attempts = threads * options["attempts"]
+            requests = FoodRequest.objects.filter(donation_id__in=donation_ids)
+            duplicates = requests.values("donation").annotate(n=Count("id")).filter(n__gt=1).count()
+            claimed = Donation.objects.filter(pk__in=donation_ids, status="REQUESTED").count()
+
+            self.stdout.write(
+                f"{attempts} claim attempts from {threads} threads in {elapsed:.2f}s - "
+                f"{attempts / elapsed:.0f} attempts/s, {won} won"
+            )
+            if duplicates or won != claimed or requests.count() != won:
+                raise CommandError(
+                    f"Claims raced: {duplicates} donations claimed twice, "
+                    f"{won} wins for {claimed} claimed donations"
+                )
+            self.stdout.write("Every claimed donation has exactly one request")
+        finally:
+            FoodRequest.objects.filter(donation_id__in=donation_ids).delete()
+            Donation.objects.filter(pk__in=donation_ids).delete()
+            User.objects.filter(pk__in=[donor.pk] + [ngo.pk for ngo in ngos]).delete()
@@ -0,0 +1,119 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.fast_serializers import donation_payloads, donation_values, food_request_payloads, food_request_values
+from core.models import Donation, FoodRequest, FoodRiskAssessment, User
+from core.renderers import FastJSONRenderer
+from core.serializers import DonationSerializer, FoodRequestSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare serializer and .values() list serialization throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,1000,10000",
+            help="Comma separated response sizes in rows",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+
+        # Everything created here is rolled back, the benchmark never
+        # leaves data behind in the configured database.
+        with transaction.atomic():
+            self._seed(max(sizes))
+
+            donations = Donation.objects.filter(description="bench").order_by("id")
+            requests = FoodRequest.objects.filter(donation__description="bench").order_by("id")
+
+            self.stdout.write(
+                f"{'list':>9} {'rows':>6} {'serializer rows/s':>18} {'fast rows/s':>12} {'speedup':>8}"
+            )
+            for size in sizes:
+                for name, slow, fast in [
+                    (
+                        "donations",
+                        lambda: JSONRenderer().render(DonationSerializer(
+                            donations.select_related("donor", "risk")[:size],
+                            many=True,
+                            context={"omit_distance": True},
+                        ).data),
+                        lambda: FastJSONRenderer().render(
+                            donation_payloads(donation_values(donations)[:size])
+                        ),
+                    ),
+                    (
+                        "requests",
+                        lambda: JSONRenderer().render(FoodRequestSerializer(
+                            requests.select_related("ngo", "donation__donor", "donation__risk")[:size],
+                            many=True,
+                        ).data),
+                        lambda: FastJSONRenderer().render(
+                            food_request_payloads(food_request_values(requests)[:size])
+                        ),
+                    ),
+                ]:
+                    slow_rate = size / self._best(slow, options["repeat"])
+                    fast_rate = size / self._best(fast, options["repeat"])
+                    self.stdout.write(
+                        f"{name:>9} {size:>6} {slow_rate:>18.0f} {fast_rate:>12.0f} "
+                        f"{fast_rate / slow_rate:>7.1f}x"
+                    )
+
+            transaction.set_rollback(True)
+
+    def _best(self, render, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def _seed(self, count):
+        now = timezone.now()
+        ngo = User.objects.create(username="bench_list_ngo", role="NGO", latitude=12.97, longitude=77.59)
+        donors = User.objects.bulk_create([
+            User(
+                username=f"bench_list_donor_{i}",
+                role="DONOR",
+                latitude=12.98,
+                longitude=77.60,
+                rating_count=2,
+                rating_sum=9,
+            )
+            for i in range(100)
+        ])
+        donations = Donation.objects.bulk_create(
+            [
+                Donation(
+                    donor=donors[i % len(donors)],
+                    food_type="COOKED",
+                    description="bench",
+                    quantity_kg=2.5,
+                    cooked_time=now - timedelta(hours=1),
+                    expiry_time=now + timedelta(days=1),
+                )
+                for i in range(count)
+            ],
+            batch_size=5000,
+        )
+        FoodRiskAssessment.objects.bulk_create(
+            [
+                FoodRiskAssessment(donation=donation, risk_level="LOW", reason="Food is safe for consumption")
+                for donation in donations
+            ],
+            batch_size=5000,
+        )
+        FoodRequest.objects.bulk_create(
+            [FoodRequest(donation=donation, ngo=ngo, pickup_time=now) for donation in donations],
+            batch_size=5000,
+        )
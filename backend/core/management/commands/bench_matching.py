@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Donation, User
+from core.services import match_donations
+
+
+class Command(BaseCommand):
+    help = "Benchmark match_donations on synthetic donation x NGO instances"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000x1000,10000x5000",
+            help="Comma separated DONATIONSxNGOS instance sizes",
+        )
+        parser.add_argument(
+            "--spread-km",
+            type=float,
+            default=50,
+            help="Half width of the square area everyone is scattered over",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'instance':>12} {'seconds':>8} {'matched':>8} {'unmatched':>9} {'avg km':>7}"
+        )
+        for size in options["sizes"].split(","):
+            donations, ngos = (int(part) for part in size.split("x"))
+            elapsed, result = self._run(donations, ngos, options["spread_km"])
+            avg_km = result["total_distance_km"] / result["matched"] if result["matched"] else 0
+            self.stdout.write(
+                f"{size:>12} {elapsed:>8.2f} {result['matched']:>8} "
+                f"{result['unmatched']:>9} {avg_km:>7.2f}"
+            )
+
+    def _run(self, donation_count, ngo_count, spread_km):
+        # Everything created here is rolled back, the benchmark never
+        # leaves data behind in the configured database.
+        with transaction.atomic():
+            rng = random.Random(donation_count * ngo_count)
+            center_lat, center_lon = 12.9716, 77.5946
+            spread = spread_km / 111
+            now = timezone.now()
+
+            def point():
+                return (
+                    round(center_lat + rng.uniform(-spread, spread), 6),
+                    round(center_lon + rng.uniform(-spread, spread), 6),
+                )
+
+            User.objects.bulk_create(
+                [
+                    User(username=f"bench_match_ngo_{i}", role="NGO", latitude=lat, longitude=lon)
+                    for i, (lat, lon) in enumerate(point() for _ in range(ngo_count))
+                ],
+                batch_size=5000,
+            )
+            # One donor per donation, matching is by donor location
+            donors = User.objects.bulk_create(
+                [
+                    User(username=f"bench_match_donor_{i}", role="DONOR", latitude=lat, longitude=lon)
+                    for i, (lat, lon) in enumerate(point() for _ in range(donation_count))
+                ],
+                batch_size=5000,
+            )
+            Donation.objects.bulk_create(
+                [
+                    Donation(
+                        donor=donor,
+                        food_type="PACKAGED",
+                        description="bench",
+                        quantity_kg=1,
+                        expiry_time=now + timedelta(hours=rng.uniform(1, 72)),
+                    )
+                    for donor in donors
+                ],
+                batch_size=5000,
+            )
+
+            started = time.perf_counter()
+            result = match_donations()
+            elapsed = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        return elapsed, result
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Donation, User
+from core.services import find_nearby_ngos
+
+
+class Command(BaseCommand):
+    help = "Benchmark find_nearby_ngos lookup time against the number of NGOs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000",
+            help="Comma separated NGO counts to benchmark",
+        )
+        parser.add_argument("--lookups", type=int, default=50)
+        parser.add_argument(
+            "--spread-km",
+            type=float,
+            default=50,
+            help="Half width of the square area NGOs are scattered over",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+
+        self.stdout.write(f"{'ngos':>8} {'avg ms':>10} {'p95 ms':>10} {'matches':>8}")
+        for size in sizes:
+            avg_ms, p95_ms, matches = self._run(size, options)
+            self.stdout.write(f"{size:>8} {avg_ms:>10.2f} {p95_ms:>10.2f} {matches:>8}")
+
+    def _run(self, size, options):
+        # Everything created here is rolled back, the benchmark never
+        # leaves data behind in the configured database.
+        with transaction.atomic():
+            rng = random.Random(size)
+            center_lat, center_lon = 12.9716, 77.5946
+            spread = options["spread_km"] / 111
+
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=f"bench_ngo_{i}",
+                        role="NGO",
+                        latitude=round(center_lat + rng.uniform(-spread, spread), 6),
+                        longitude=round(center_lon + rng.uniform(-spread, spread), 6),
+                    )
+                    for i in range(size)
+                ],
+                batch_size=5000,
+            )
+            donor = User.objects.create(username="bench_donor", role="DONOR")
+            donation = Donation(donor=donor)
+
+            timings = []
+            matches = 0
+            for _ in range(options["lookups"]):
+                donor.latitude = round(center_lat + rng.uniform(-spread, spread), 6)
+                donor.longitude = round(center_lon + rng.uniform(-spread, spread), 6)
+
+                start = time.perf_counter()
+                matches += len(find_nearby_ngos(donation))
+                timings.append((time.perf_counter() - start) * 1000)
+
+            transaction.set_rollback(True)
+
+        timings.sort()
+        avg_ms = sum(timings) / len(timings)
+        p95_ms = timings[int(len(timings) * 0.95) - 1]
+        return avg_ms, p95_ms, matches // options["lookups"]
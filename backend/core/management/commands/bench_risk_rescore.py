@@ -0,0 +1,73 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Donation, FoodRiskAssessment, User
+from core.services import rescore_due_risk
+
+
+class Command(BaseCommand):
+    help = "Benchmark rescore_due_risk over a synthetic set of active donations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000000)
+        parser.add_argument(
+            "--due-fraction",
+            type=float,
+            default=1.0,
+            help="Share of the donations whose next review has already passed",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        rng = random.Random(count)
+        now = timezone.now()
+
+        # Everything created here is rolled back, the benchmark never
+        # leaves data behind in the configured database.
+        with transaction.atomic():
+            donor = User.objects.create(username="bench_risk_donor", role="DONOR")
+
+            started = time.perf_counter()
+            for offset in range(0, count, 10000):
+                size = min(10000, count - offset)
+                donations = []
+                for _ in range(size):
+                    cooked = rng.random() < 0.5
+                    donations.append(Donation(
+                        donor=donor,
+                        food_type="COOKED" if cooked else "PACKAGED",
+                        description="bench",
+                        quantity_kg=1,
+                        cooked_time=now - timedelta(hours=rng.uniform(0, 12)) if cooked else None,
+                        expiry_time=now + timedelta(hours=rng.uniform(-12, 72)),
+                    ))
+                donations = Donation.objects.bulk_create(donations)
+
+                FoodRiskAssessment.objects.bulk_create([
+                    FoodRiskAssessment(
+                        donation=donation,
+                        risk_level="LOW",
+                        reason="Food is safe for consumption",
+                        next_review_at=now - timedelta(minutes=1)
+                        if rng.random() < options["due_fraction"]
+                        else now + timedelta(hours=1),
+                    )
+                    for donation in donations
+                ])
+            self.stdout.write(
+                f"Seeded {count} donations in {time.perf_counter() - started:.1f}s"
+            )
+
+            stats = rescore_due_risk()
+            rate = stats["rescored"] / stats["elapsed_seconds"]
+            self.stdout.write(
+                f"Re-scored {stats['rescored']} assessments in "
+                f"{stats['elapsed_seconds']:.2f}s - {rate:.0f} rows/s"
+            )
+
+            transaction.set_rollback(True)
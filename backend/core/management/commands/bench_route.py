@@ -0,0 +1,58 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.utils import haversine_matrix, order_stops, route_schedule
+
+
+class Command(BaseCommand):
+    help = "Benchmark the pickup route heuristic against the number of stops"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10,50,100,200",
+            help="Comma separated stop counts to benchmark",
+        )
+        parser.add_argument(
+            "--spread-km",
+            type=float,
+            default=10,
+            help="Half width of the square area stops are scattered over",
+        )
+
+    def handle(self, *args, **options):
+        speed_kmh = settings.ROUTE_SPEED_KMH
+        service_hours = settings.ROUTE_STOP_MINUTES / 60
+
+        self.stdout.write(
+            f"{'stops':>6} {'ms':>8} {'km':>8} {'greedy km':>10} {'late':>5}"
+        )
+        for size in (int(size) for size in options["sizes"].split(",")):
+            rng = random.Random(size)
+            spread = options["spread_km"] / 111
+            lats = [12.9716] + [12.9716 + rng.uniform(-spread, spread) for _ in range(size)]
+            lons = [77.5946] + [77.5946 + rng.uniform(-spread, spread) for _ in range(size)]
+            distances = haversine_matrix(lats, lons, lats, lons)
+
+            # Pickups open over the next few hours and expire a few to
+            # many hours after the route could reach them
+            ready = [0.0] + [rng.uniform(0, 3) for _ in range(size)]
+            due = [math.inf] + [
+                opens + size * service_hours * rng.uniform(0.5, 2) for opens in ready[1:]
+            ]
+
+            started = time.perf_counter()
+            route = order_stops(distances, ready, due, speed_kmh, service_hours)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            greedy = order_stops(distances, ready, due, speed_kmh, service_hours, max_passes=0)
+            _, late, km = route_schedule(route, distances.tolist(), ready, due, speed_kmh, service_hours)
+            _, _, greedy_km = route_schedule(greedy, distances.tolist(), ready, due, speed_kmh, service_hours)
+
+            self.stdout.write(
+                f"{size:>6} {elapsed_ms:>8.1f} {km:>8.1f} {greedy_km:>10.1f} {late:>5}"
+            )
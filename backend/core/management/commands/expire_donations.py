@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import expire_donations
+
+
+class Command(BaseCommand):
+    help = "Mark AVAILABLE donations past their expiry time as EXPIRED"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep sweeping instead of exiting after one pass",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds to sleep between sweeps",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = expire_donations(batch_size=options["batch_size"])
+
+            if stats["expired"] or not options["loop"]:
+                rate = stats["expired"] / stats["elapsed_seconds"]
+                self.stdout.write(
+                    f"Expired {stats['expired']} donations in "
+                    f"{stats['elapsed_seconds']:.2f}s - {rate:.0f} rows/s"
+                )
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
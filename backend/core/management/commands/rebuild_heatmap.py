@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_heatmap
+
+
+class Command(BaseCommand):
+    help = "Rebuild the heatmap tile aggregates from the Donation table"
+
+    def handle(self, *args, **options):
+        cells = rebuild_heatmap()
+        self.stdout.write(f"Rebuilt {cells} heatmap cells")
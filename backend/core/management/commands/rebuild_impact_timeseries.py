@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_daily_impact_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily impact aggregates behind /api/stats/timeseries/ from the Donation and ImpactLog tables"
+
+    def handle(self, *args, **options):
+        stats = rebuild_daily_impact_stats()
+        self.stdout.write(f"Rebuilt {stats} daily impact rows")
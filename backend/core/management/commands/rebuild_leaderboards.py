@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the donor and NGO leaderboards behind /api/stats/leaderboard/ from the ImpactLog table"
+
+    def handle(self, *args, **options):
+        entries = rebuild_leaderboards()
+        self.stdout.write(f"Rebuilt {entries} leaderboard entries")
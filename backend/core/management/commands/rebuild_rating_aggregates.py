@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating_count/rating_sum columns on users"
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_aggregates()
+        self.stdout.write(f"Rebuilt rating aggregates for {updated} users")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_impact_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ImpactRollup totals from the ImpactLog table"
+
+    def handle(self, *args, **options):
+        rows = rebuild_impact_rollup()
+        self.stdout.write(f"Rebuilt {rows} impact rollup rows")
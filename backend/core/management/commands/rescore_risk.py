@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import rescore_due_risk
+
+
+class Command(BaseCommand):
+    help = "Re-score food risk assessments whose next review time has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep re-scoring instead of exiting after one pass",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds to sleep between passes",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = rescore_due_risk()
+
+            if stats["rescored"] or not options["loop"]:
+                rate = stats["rescored"] / stats["elapsed_seconds"]
+                self.stdout.write(
+                    f"Re-scored {stats['rescored']} assessments in "
+                    f"{stats['elapsed_seconds']:.2f}s - {rate:.0f} rows/s"
+                )
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
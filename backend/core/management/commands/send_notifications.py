@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import send_pending_notifications
+
+
+class Command(BaseCommand):
+    help = "Deliver queued donation notifications from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=60,
+            help="Seconds before the first retry, doubled on each further attempt",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=300,
+            help="Seconds a claimed batch is hidden from other workers while it is sent",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting once it is drained",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to sleep between polls when the outbox is empty",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = send_pending_notifications(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+                retry_delay_seconds=options["retry_delay"],
+                lease_seconds=options["lease"],
+            )
+
+            if stats["processed"]:
+                rate = stats["processed"] / stats["elapsed_seconds"]
+                self.stdout.write(
+                    f"Processed {stats['processed']} notifications "
+                    f"(sent {stats['sent']}, retrying {stats['retried']}, "
+                    f"failed {stats['failed']}) in {stats['elapsed_seconds']:.2f}s "
+                    f"- {rate:.1f} msg/s"
+                )
+
+            if stats["processed"] == options["batch_size"]:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,156 @@
+"""
+In-process request metrics, collected by core.middleware.RequestMetricsMiddleware
+when REQUEST_METRICS is on and served by GET /api/metrics/ in the
+Prometheus text format.
+
+Every worker process keeps its own histograms, scrape each one.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Timings of the request being handled, None outside the middleware
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def timed_serialization(func):
+    """
+    Count the time spent in func towards the current request's serialize
+    timing. Nested calls (a serializer's nested serializers, a renderer
+    rendering serialized data) are only counted once.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None or timings.serializing:
+            return func(*args, **kwargs)
+
+        timings.serializing = True
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings.serialize_seconds += time.perf_counter() - started
+            timings.serializing = False
+
+    return wrapper
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels -> [count per bucket and +Inf, sum]
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Per-view histograms of request, database and serialization time."""
+
+    LABELS = ('view', 'method')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.duration = Histogram(
+                'api_request_duration_seconds', 'Time spent handling a request.', SECONDS_BUCKETS
+            )
+            self.db_duration = Histogram(
+                'api_request_db_duration_seconds', 'Time spent in SQL queries per request.', SECONDS_BUCKETS
+            )
+            self.serialize_duration = Histogram(
+                'api_request_serialize_duration_seconds',
+                'Time spent serializing and rendering response data per request.',
+                SECONDS_BUCKETS,
+            )
+            self.queries = Histogram(
+                'api_request_queries', 'SQL queries run per request.', QUERY_BUCKETS
+            )
+
+    def observe(self, view, method, status, total_seconds, timings):
+        labels = (view, method)
+        with self._lock:
+            key = labels + (str(status),)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.duration.observe(labels, total_seconds)
+            self.db_duration.observe(labels, timings.db_seconds)
+            self.serialize_duration.observe(labels, timings.serialize_seconds)
+            self.queries.observe(labels, timings.queries)
+
+    def render(self):
+        """Everything recorded so far in the Prometheus text format."""
+        with self._lock:
+            lines = ['# HELP api_requests_total Requests handled.', '# TYPE api_requests_total counter']
+            lines += [
+                f'api_requests_total{{{_labels(self.LABELS + ("status",), key)}}} {count}'
+                for key, count in sorted(self.requests.items())
+            ]
+            for histogram in (self.duration, self.db_duration, self.serialize_duration, self.queries):
+                lines += histogram.render(self.LABELS)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import end_request, registry, start_request
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request, its SQL queries and its serialization, adds a
+    Server-Timing header and records the figures per view in
+    core.metrics.registry.
+
+    Removed from the stack at startup unless REQUEST_METRICS is on, so it
+    costs nothing when disabled.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timings, token = start_request()
+        try:
+            with connection.execute_wrapper(timings.record_query):
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+        total = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, request.method, response.status_code, total, timings)
+
+        response['Server-Timing'] = (
+            f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries", '
+            f'serialize;dur={timings.serialize_seconds * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+        return response
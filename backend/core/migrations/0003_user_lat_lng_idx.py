@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0002_alter_foodrequest_status_alter_user_phone_impactlog_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="user_lat_lng_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    User = apps.get_model("core", "User")
+    Rating = apps.get_model("core", "Rating")
+
+    ratings = (
+        Rating.objects.filter(rated_user=OuterRef("pk")).order_by().values("rated_user")
+    )
+    User.objects.update(
+        rating_count=Coalesce(
+            Subquery(ratings.annotate(count=Count("id")).values("count")), 0
+        ),
+        rating_sum=Coalesce(
+            Subquery(ratings.annotate(total=Sum("rating")).values("total")), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_notificationoutbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
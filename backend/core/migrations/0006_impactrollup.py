@@ -0,0 +1,96 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:49
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_impact_rollup(apps, schema_editor):
+    ImpactLog = apps.get_model("core", "ImpactLog")
+    ImpactRollup = apps.get_model("core", "ImpactRollup")
+
+    totals = dict(
+        meals=Sum("meals_saved"),
+        food_kg=Sum("food_saved_kg"),
+        co2_kg=Sum("co2_saved_kg"),
+        count=Count("id"),
+    )
+    logs = ImpactLog.objects.order_by()
+
+    buckets = [("GLOBAL", "", logs.aggregate(**totals))]
+    buckets += [
+        ("DAY", row["day"].isoformat(), row)
+        for row in logs.annotate(day=TruncDate("created_at"))
+        .values("day")
+        .annotate(**totals)
+    ]
+    buckets += [
+        ("DONOR", str(row["donation__donor"]), row)
+        for row in logs.filter(donation__isnull=False)
+        .values("donation__donor")
+        .annotate(**totals)
+    ]
+
+    ImpactRollup.objects.bulk_create(
+        [
+            ImpactRollup(
+                scope=scope,
+                key=key,
+                meals_saved=row["meals"] or 0,
+                food_saved_kg=row["food_kg"] or 0,
+                co2_saved_kg=row["co2_kg"] or 0,
+                donations_count=row["count"],
+            )
+            for scope, key, row in buckets
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_user_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImpactRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("GLOBAL", "Global"),
+                            ("DAY", "Day"),
+                            ("DONOR", "Donor"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, default="", max_length=32)),
+                ("meals_saved", models.PositiveBigIntegerField(default=0)),
+                ("food_saved_kg", models.FloatField(default=0)),
+                ("co2_saved_kg", models.FloatField(default=0)),
+                ("donations_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("scope", "key"), name="impact_rollup_scope_key_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_impact_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from core.utils import lat_lng_to_tile
+
+
+def backfill_heatmap_cells(apps, schema_editor):
+    Donation = apps.get_model("core", "Donation")
+    HeatmapCell = apps.get_model("core", "HeatmapCell")
+
+    cells = {}
+    donations = Donation.objects.filter(
+        donor__latitude__isnull=False, donor__longitude__isnull=False
+    ).values_list("created_at", "quantity_kg", "donor__latitude", "donor__longitude")
+
+    for created_at, quantity_kg, latitude, longitude in donations.iterator():
+        day = timezone.localdate(created_at)
+        tile_x, tile_y = lat_lng_to_tile(
+            latitude, longitude, settings.HEATMAP_BASE_ZOOM
+        )
+        cell = cells.setdefault(
+            (day, tile_x, tile_y),
+            HeatmapCell(
+                day=day,
+                tile_x=tile_x,
+                tile_y=tile_y,
+                donations_count=0,
+                total_quantity_kg=0,
+            ),
+        )
+        cell.donations_count += 1
+        cell.total_quantity_kg += quantity_kg
+
+    HeatmapCell.objects.bulk_create(cells.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_impactrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HeatmapCell",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("tile_x", models.IntegerField()),
+                ("tile_y", models.IntegerField()),
+                ("donations_count", models.IntegerField(default=0)),
+                ("total_quantity_kg", models.FloatField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "tile_x", "tile_y"),
+                        name="heatmap_cell_day_tile_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_heatmap_cells, migrations.RunPython.noop),
+    ]
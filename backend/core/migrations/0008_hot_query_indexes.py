@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0007_heatmapcell"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="user",
+            name="user_lat_lng_idx",
+        ),
+        migrations.AddIndex(
+            model_name="donation",
+            index=models.Index(
+                fields=["status", "expiry_time"], name="donation_status_expiry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="donation",
+            index=models.Index(
+                fields=["donor", "created_at"], name="donation_donor_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="foodrequest",
+            index=models.Index(
+                fields=["ngo", "requested_at"], name="foodrequest_ngo_requested_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["role", "latitude", "longitude"], name="user_role_geo_idx"
+            ),
+        ),
+    ]
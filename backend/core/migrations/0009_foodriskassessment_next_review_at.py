@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:53
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_active_reviews(apps, schema_editor):
+    # Existing levels were frozen at creation time, make every active
+    # donation due so the first rescore_risk run brings them up to date
+    FoodRiskAssessment = apps.get_model("core", "FoodRiskAssessment")
+    FoodRiskAssessment.objects.filter(
+        donation__status__in=["AVAILABLE", "REQUESTED"]
+    ).update(next_review_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="foodriskassessment",
+            name="next_review_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(schedule_active_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_foodriskassessment_next_review_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="pickup_capacity",
+            field=models.PositiveIntegerField(default=5),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:35
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_impact_stats(apps, schema_editor):
+    Donation = apps.get_model("core", "Donation")
+    ImpactLog = apps.get_model("core", "ImpactLog")
+    DailyImpactStat = apps.get_model("core", "DailyImpactStat")
+
+    stats = {}
+
+    def add(rows, **fields):
+        for row in rows:
+            stat = stats.setdefault(
+                (row["day"], row["food_type"]),
+                DailyImpactStat(day=row["day"], food_type=row["food_type"]),
+            )
+            for name, source in fields.items():
+                setattr(stat, name, getattr(stat, name) + (row[source] or 0))
+
+    donations = Donation.objects.order_by()
+    add(
+        donations.values("food_type", day=TruncDate("created_at")).annotate(
+            count=Count("id")
+        ),
+        donations_posted="count",
+    )
+    add(
+        donations.filter(status="EXPIRED")
+        .values("food_type", day=TruncDate("expiry_time"))
+        .annotate(count=Count("id")),
+        donations_expired="count",
+    )
+    add(
+        ImpactLog.objects.filter(donation__isnull=False)
+        .order_by()
+        .values(day=TruncDate("created_at"), food_type=F("donation__food_type"))
+        .annotate(
+            count=Count("id"),
+            meals=Sum("meals_saved"),
+            food_kg=Sum("food_saved_kg"),
+            co2_kg=Sum("co2_saved_kg"),
+        ),
+        donations_picked_up="count",
+        meals_saved="meals",
+        food_saved_kg="food_kg",
+        co2_saved_kg="co2_kg",
+    )
+
+    DailyImpactStat.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_user_pickup_capacity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyImpactStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "food_type",
+                    models.CharField(
+                        choices=[
+                            ("COOKED", "Cooked Food"),
+                            ("PACKAGED", "Packaged Food"),
+                            ("RAW", "Raw Ingredients"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("donations_posted", models.IntegerField(default=0)),
+                ("donations_expired", models.IntegerField(default=0)),
+                ("donations_picked_up", models.IntegerField(default=0)),
+                ("meals_saved", models.BigIntegerField(default=0)),
+                ("food_saved_kg", models.FloatField(default=0)),
+                ("co2_saved_kg", models.FloatField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "food_type"),
+                        name="daily_impact_day_food_type_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_daily_impact_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:41
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def backfill_leaderboards(apps, schema_editor):
+    FoodRequest = apps.get_model("core", "FoodRequest")
+    ImpactLog = apps.get_model("core", "ImpactLog")
+    LeaderboardEntry = apps.get_model("core", "LeaderboardEntry")
+
+    entries = {}
+
+    completed_by = (
+        FoodRequest.objects.filter(donation=OuterRef("donation"), status="COMPLETED")
+        .order_by("-requested_at")
+        .values("ngo")[:1]
+    )
+    logs = (
+        ImpactLog.objects.filter(donation__isnull=False)
+        .annotate(ngo=Subquery(completed_by))
+        .values_list("created_at", "food_saved_kg", "donation__donor", "ngo")
+    )
+
+    for created_at, food_kg, donor_id, ngo_id in logs.iterator(chunk_size=2000):
+        day = timezone.localdate(created_at)
+        periods = [
+            ("WEEK", (day - timedelta(days=day.weekday())).isoformat()),
+            ("MONTH", day.replace(day=1).isoformat()),
+            ("ALL", ""),
+        ]
+        for board, user_id in [("DONOR", donor_id), ("NGO", ngo_id)]:
+            if user_id is None:
+                continue
+            for period, key in periods:
+                entry = entries.setdefault(
+                    (board, period, key, user_id),
+                    LeaderboardEntry(
+                        board=board, period=period, period_key=key, user_id=user_id
+                    ),
+                )
+                entry.pickups += 1
+                entry.food_saved_kg += food_kg
+                entry.score += food_kg if board == "DONOR" else 1
+
+    LeaderboardEntry.objects.bulk_create(entries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_dailyimpactstat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "board",
+                    models.CharField(
+                        choices=[("DONOR", "Donors"), ("NGO", "NGOs")], max_length=10
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[
+                            ("WEEK", "Week"),
+                            ("MONTH", "Month"),
+                            ("ALL", "All time"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("period_key", models.CharField(blank=True, default="", max_length=10)),
+                ("pickups", models.PositiveIntegerField(default=0)),
+                ("food_saved_kg", models.FloatField(default=0)),
+                ("score", models.FloatField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leaderboard_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["board", "period", "period_key", "-score", "user"],
+                        name="leaderboard_rank_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("board", "period", "period_key", "user"),
+                        name="leaderboard_board_period_user_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -39,9 +40,30 @@ class User(AbstractUser):
         null=True
     )
 
+    # Maintained by core.services.apply_rating_change, rebuilt with
+    # manage.py rebuild_rating_aggregates
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    # NGOs only: donations they can have open (pending or approved) at
+    # once, the batch matcher never assigns beyond it
+    pickup_capacity = models.PositiveIntegerField(default=5)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # find_nearby_ngos: role='NGO' plus a latitude/longitude bounding box
+            models.Index(fields=['role', 'latitude', 'longitude'], name='user_role_geo_idx'),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
 
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
 
 class Donation(models.Model):
     FOOD_TYPE_CHOICES = (
@@ -87,6 +109,14 @@ class Donation(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # NGO feed: status='AVAILABLE' and not yet expired
+            models.Index(fields=['status', 'expiry_time'], name='donation_status_expiry_idx'),
+            # Donor history, newest first
+            models.Index(fields=['donor', 'created_at'], name='donation_donor_created_idx'),
+        ]
+
     def __str__(self):
         return f"Donation {self.id} - {self.food_type} - {self.status}"
 
@@ -111,6 +141,8 @@ class FoodRequest(models.Model):
         related_name='food_requests'
     )
 
+    # Set by the NGO, or for requests recorded by dispatch_matches an
+    # estimate of when its pickup route reaches the donor
     pickup_time = models.DateTimeField()
 
     status = models.CharField(
@@ -121,6 +153,12 @@ class FoodRequest(models.Model):
 
     requested_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # NGO request lists, newest first
+            models.Index(fields=['ngo', 'requested_at'], name='foodrequest_ngo_requested_idx'),
+        ]
+
     def __str__(self):
         return f"Request {self.id} - {self.status}"
 
@@ -147,6 +185,14 @@ class FoodRiskAssessment(models.Model):
 
     assessed_at = models.DateTimeField(auto_now_add=True)
 
+    # When the level next changes, None once it is final or the donation
+    # is no longer active. Due rows are re-scored by manage.py rescore_risk.
+    next_review_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True
+    )
+
     def __str__(self):
         return f"Donation {self.donation.id} - {self.risk_level}"
 
@@ -198,3 +244,219 @@ class ImpactLog(models.Model):
 
     def __str__(self):
         return f"Impact {self.id} - Meals: {self.meals_saved}"
+
+
+class ImpactRollup(models.Model):
+    """
+    Running ImpactLog totals, maintained by core.services.calculate_impact
+    and rebuilt with manage.py reconcile_impact_rollup.
+    """
+
+    SCOPE_CHOICES = (
+        ('GLOBAL', 'Global'),
+        ('DAY', 'Day'),
+        ('DONOR', 'Donor'),
+    )
+
+    scope = models.CharField(
+        max_length=10,
+        choices=SCOPE_CHOICES
+    )
+
+    # '' for GLOBAL, ISO date for DAY, donor id for DONOR
+    key = models.CharField(
+        max_length=32,
+        blank=True,
+        default=''
+    )
+
+    meals_saved = models.PositiveBigIntegerField(default=0)
+    food_saved_kg = models.FloatField(default=0)
+    co2_saved_kg = models.FloatField(default=0)
+    donations_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='impact_rollup_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Impact rollup {self.scope} {self.key} - Meals: {self.meals_saved}"
+
+
+class HeatmapCell(models.Model):
+    """
+    Donation counts per day and slippy map tile at HEATMAP_BASE_ZOOM.
+    Coarser zoom levels are derived by shifting the tile coordinates.
+    """
+
+    day = models.DateField()
+    tile_x = models.IntegerField()
+    tile_y = models.IntegerField()
+
+    donations_count = models.IntegerField(default=0)
+    total_quantity_kg = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'tile_x', 'tile_y'], name='heatmap_cell_day_tile_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Heatmap {self.day} ({self.tile_x}, {self.tile_y}) - {self.donations_count}"
+
+
+class DailyImpactStat(models.Model):
+    """
+    Per day and food type totals behind GET /api/stats/timeseries/, kept
+    up to date by core.services.record_daily_stats and rebuilt with
+    manage.py rebuild_impact_timeseries. Weeks and months are summed from
+    these rows.
+    """
+
+    day = models.DateField()
+    food_type = models.CharField(
+        max_length=20,
+        choices=Donation.FOOD_TYPE_CHOICES
+    )
+
+    # Counted on the day a donation was posted, expired or picked up
+    donations_posted = models.IntegerField(default=0)
+    donations_expired = models.IntegerField(default=0)
+    donations_picked_up = models.IntegerField(default=0)
+
+    meals_saved = models.BigIntegerField(default=0)
+    food_saved_kg = models.FloatField(default=0)
+    co2_saved_kg = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the day range scans
+            models.UniqueConstraint(fields=['day', 'food_type'], name='daily_impact_day_food_type_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Impact {self.day} {self.food_type} - Meals: {self.meals_saved}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    One user's completed pickups and kg saved in one leaderboard period,
+    kept up to date by core.services.record_leaderboard_pickup and rebuilt
+    with manage.py rebuild_leaderboards. Donors rank by kg, NGOs by
+    pickups.
+    """
+
+    BOARD_CHOICES = (
+        ('DONOR', 'Donors'),
+        ('NGO', 'NGOs'),
+    )
+
+    PERIOD_CHOICES = (
+        ('WEEK', 'Week'),
+        ('MONTH', 'Month'),
+        ('ALL', 'All time'),
+    )
+
+    board = models.CharField(
+        max_length=10,
+        choices=BOARD_CHOICES
+    )
+
+    period = models.CharField(
+        max_length=10,
+        choices=PERIOD_CHOICES
+    )
+
+    # '' for ALL, ISO date the week (Monday) or month starts on otherwise
+    period_key = models.CharField(
+        max_length=10,
+        blank=True,
+        default=''
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_entries'
+    )
+
+    pickups = models.PositiveIntegerField(default=0)
+    food_saved_kg = models.FloatField(default=0)
+
+    # food_saved_kg on the DONOR board, pickups on the NGO board
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['board', 'period', 'period_key', 'user'],
+                name='leaderboard_board_period_user_uniq'
+            ),
+        ]
+        indexes = [
+            # Pages of one board and period, highest score first
+            models.Index(
+                fields=['board', 'period', 'period_key', '-score', 'user'],
+                name='leaderboard_rank_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Leaderboard {self.board} {self.period} {self.period_key} - {self.user_id}: {self.score}"
+
+
+class NotificationOutbox(models.Model):
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+
+    donation = models.ForeignKey(
+        Donation,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='notifications'
+    )
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='PENDING'
+    )
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification {self.id} to {self.recipient} - {self.status}"
+
+
+class CacheVersion(models.Model):
+    """
+    Named version counters keying cached responses and ETags (core.cache).
+    Kept in the database so a bump made by any worker or management
+    command is seen by every process.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} v{self.value}"
@@ -0,0 +1,81 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination, newest first, with id breaking timestamp ties."""
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RequestedAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-requested_at', '-id')
+
+
+class ScoreCursorPagination(BasePagination):
+    """
+    Keyset pagination of LeaderboardEntry rows, highest score first with
+    user id breaking ties, each row given its standard competition rank
+    (1, 2, 2, 4). The cursor carries the last row's score, user id, rank
+    and position so the next page is one range scan of the rank index
+    however deep it is.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        score, user_id, rank, position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('-score', 'user_id')
+        if position:
+            queryset = queryset.filter(Q(score__lt=score) | Q(score=score, user_id__gt=user_id))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        for row in rows:
+            position += 1
+            if row.score != score:
+                rank = position
+            row.rank, score = rank, row.score
+        self.last = (rows[-1].score, rows[-1].user_id, rank, position) if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = urlsafe_b64encode(','.join(map(repr, self.last)).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def decode_cursor(self, request):
+        """(score, user_id, rank, position) of the last row already sent."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None, 0, 0
+        try:
+            score, user_id, rank, position = urlsafe_b64decode(encoded.encode()).decode().split(',')
+            return float(score), int(user_id), int(rank), int(position)
+        except ValueError:
+            raise NotFound("Invalid cursor")
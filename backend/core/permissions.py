@@ -15,3 +15,11 @@ class IsNGO(BasePermission):
             request.user.is_authenticated
             and request.user.role == "NGO"
         )
+
+
+class IsAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return (
+            request.user.is_authenticated
+            and (request.user.role == "ADMIN" or request.user.is_staff)
+        )
@@ -1,6 +1,12 @@
+import math
+
+from django.db import models, transaction
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .metrics import timed_serialization
 from .models import FoodRequest, User, Donation, FoodRiskAssessment, ImpactLog, Rating
+from .utils import calculate_distance, haversine_distances
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -12,22 +18,135 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
-class UserSerializer(serializers.ModelSerializer):
+def parse_sparse_fields(query_params):
+    """
+    Parse ?fields=id,donor.username and ?expand=donor into nested dicts,
+    or None when the client did not ask for a sparse fieldset.
+    """
+    if not query_params.get('fields'):
+        return None
+    return _field_tree(query_params['fields']), _field_tree(query_params.get('expand', ''))
+
+
+def _field_tree(value):
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def is_selected(sparse, path, nested=False):
+    """
+    Whether the dotted path is part of a sparse response, for nested
+    objects whether they are rendered in full rather than as an id.
+    Views use it to skip joins nobody asked for.
+    """
+    if sparse is None:
+        return True
+
+    selected, expand = sparse
+    names = path.split('.')
+    for depth, name in enumerate(names):
+        last = depth == len(names) - 1
+        if name not in selected:
+            return False
+        if (nested or not last) and not selected[name] and name not in expand:
+            return False
+        selected, expand = selected[name], expand.get(name, {})
+        if not selected and not last:
+            # Expanded without sub-fields, everything below is rendered
+            return True
+    return True
+
+
+class SparseFieldsMixin:
+    """
+    Trims GET responses to ?fields= (dotted for nested objects). Fields
+    left out are dropped before serialization, so their method fields
+    never run. A nested object named without sub-fields is rendered as
+    its id unless it is also listed in ?expand=.
+    """
+
+    # Output name -> field that renders it when expanded
+    sparse_aliases = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse = self._get_sparse()
+        if sparse is None:
+            return fields
+
+        selected, expand = dict(sparse[0]), dict(sparse[1])
+        for name, field_name in self.sparse_aliases.items():
+            if name in selected and (selected[name] or name in expand):
+                selected[field_name] = selected.pop(name)
+                expand[field_name] = expand.pop(name, {})
+
+        kept = {}
+        for name, field in fields.items():
+            if name not in selected:
+                continue
+
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if isinstance(nested, serializers.BaseSerializer):
+                if selected[name] or name in expand:
+                    nested._sparse = (selected[name], expand.get(name, {})) if selected[name] else None
+                else:
+                    field = serializers.PrimaryKeyRelatedField(
+                        read_only=True, many=many, source=field.source
+                    )
+            kept[name] = field
+        return kept
+
+    def _get_sparse(self):
+        # Set by the parent serializer for nested ones
+        if hasattr(self, '_sparse'):
+            return self._sparse
+
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return None
+        return parse_sparse_fields(request.query_params)
+
+
+class TimedRepresentationMixin:
+    """Counts to_representation towards the request's serialize timing (core.metrics)."""
+
+    @timed_serialization
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+
+class UserSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     average_rating = serializers.SerializerMethodField()
     
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'role', 'phone', 'address', 'latitude', 'longitude', 'average_rating']
+        fields = ['id', 'username', 'email', 'role', 'phone', 'address', 'latitude', 'longitude', 'pickup_capacity', 'average_rating']
         read_only_fields = ['id', 'average_rating']
     
     def get_average_rating(self, obj):
-        ratings = Rating.objects.filter(rated_user=obj)
-        if ratings.exists():
-            return round(sum(r.rating for r in ratings) / ratings.count(), 2)
-        return None
+        return obj.average_rating
+
+
+class DonationListSerializer(TimedRepresentationMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        # Compute the distance column for the whole page in one pass
+        # instead of one haversine call per row.
+        donations = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if 'distance_km' in self.child.fields:
+            self.child.distances = self.child.get_distances(donations)
+        try:
+            return super().to_representation(donations)
+        finally:
+            self.child.distances = None
 
 
-class DonationSerializer(serializers.ModelSerializer):
+class DonationSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     donor = UserSerializer(read_only=True)
     risk_assessment = serializers.SerializerMethodField()
     distance_km = serializers.SerializerMethodField()
@@ -36,6 +155,11 @@ class DonationSerializer(serializers.ModelSerializer):
         model = Donation
         fields = '__all__'
         read_only_fields = ['donor', 'status', 'created_at']
+        list_serializer_class = DonationListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.distances = None
     
     def get_risk_assessment(self, obj):
         try:
@@ -46,33 +170,73 @@ class DonationSerializer(serializers.ModelSerializer):
             }
         except FoodRiskAssessment.DoesNotExist:
             return None
-    
-    def get_distance_km(self, obj):
+
+    def _get_ngo(self):
+        if self.context.get('omit_distance'):
+            return None
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user.role == 'NGO':
-            if request.user.latitude and request.user.longitude and obj.donor.latitude and obj.donor.longitude:
-                from .utils import calculate_distance
-                return calculate_distance(
-                    request.user.latitude,
-                    request.user.longitude,
-                    obj.donor.latitude,
-                    obj.donor.longitude
-                )
+            if request.user.latitude and request.user.longitude:
+                return request.user
+        return None
+
+    def get_distances(self, donations):
+        """Map donation id -> distance from the requesting NGO, in bulk."""
+        ngo = self._get_ngo()
+        located = [d for d in donations if d.donor.latitude and d.donor.longitude]
+        if ngo is None or not located:
+            return {}
+
+        distances = haversine_distances(
+            ngo.latitude,
+            ngo.longitude,
+            [d.donor.latitude for d in located],
+            [d.donor.longitude for d in located],
+        ).round(2)
+        return {d.pk: float(km) for d, km in zip(located, distances)}
+    
+    def get_distance_km(self, obj):
+        if self.distances is not None:
+            return self.distances.get(obj.pk)
+
+        ngo = self._get_ngo()
+        if ngo and obj.donor.latitude and obj.donor.longitude:
+            return calculate_distance(
+                ngo.latitude,
+                ngo.longitude,
+                obj.donor.latitude,
+                obj.donor.longitude
+            )
         return None
+
+    def validate_quantity_kg(self, value):
+        # float() accepts 'nan' and 'inf', which CSV cells pass through
+        if not math.isfinite(value):
+            raise serializers.ValidationError("A valid number is required.")
+        return value
     
     def create(self, validated_data):
         validated_data['donor'] = self.context['request'].user
-        donation = super().create(validated_data)
-        # Assess risk and notify NGOs
-        from .services import assess_food_risk, find_nearby_ngos, notify_ngos
-        assess_food_risk(donation)
-        nearby_ngos = find_nearby_ngos(donation)
-        notify_ngos(nearby_ngos, donation)
+        from .services import (
+            assess_food_risk, donation_feed_changed, find_nearby_ngos, notify_ngos, record_daily_stats,
+            record_heatmap_change
+        )
+        with transaction.atomic():
+            donation = super().create(validated_data)
+            # Assess risk and queue NGO notifications, the outbox worker
+            # (manage.py send_notifications) delivers them
+            assess_food_risk(donation)
+            nearby_ngos = find_nearby_ngos(donation)
+            notify_ngos(nearby_ngos, donation)
+            record_heatmap_change(donation, 1, donation.quantity_kg)
+            record_daily_stats(timezone.localdate(donation.created_at), donation.food_type, donations_posted=1)
+            donation_feed_changed([donation.pk])
         return donation
 
-class FoodRequestSerializer(serializers.ModelSerializer):
+class FoodRequestSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     ngo = UserSerializer(read_only=True)
     donation_detail = DonationSerializer(source='donation', read_only=True)
+    sparse_aliases = {'donation': 'donation_detail'}
     
     class Meta:
         model = FoodRequest
@@ -81,11 +245,16 @@ class FoodRequestSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data['ngo'] = self.context['request'].user
-        food_request = super().create(validated_data)
-        # Update donation status
-        donation = food_request.donation
-        donation.status = 'REQUESTED'
-        donation.save()
+        donation = validated_data['donation']
+        from .services import claim_donation, donation_feed_changed
+        with transaction.atomic():
+            # Only one of several NGOs racing for the same donation wins
+            if not claim_donation(donation):
+                raise serializers.ValidationError(
+                    {"donation": ["Donation is no longer available."]}
+                )
+            food_request = super().create(validated_data)
+            donation_feed_changed([donation.pk])
         return food_request
     
     def to_representation(self, instance):
@@ -123,7 +292,7 @@ class ImpactSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     rated_by = UserSerializer(read_only=True)
     rated_user = UserSerializer(read_only=True)
     
@@ -1,103 +1,975 @@
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
 from django.contrib.auth import get_user_model
-from .utils import calculate_distance
+from .cache import bump_version
+from .events import broker
+from .utils import (
+    bounding_box, haversine_distances, haversine_matrix, lat_lng_to_tile, order_stops, period_start, route_schedule,
+)
 from django.utils import timezone
 from .models import FoodRiskAssessment
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from .models import ImpactLog
+from django.db import transaction
+from django.db.models import Count, DateTimeField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from .models import (
+    DailyImpactStat, Donation, FoodRequest, HeatmapCell, ImpactLog, ImpactRollup, LeaderboardEntry,
+    NotificationOutbox, Rating,
+)
 
 User = get_user_model()
 
 
 def find_nearby_ngos(donation, max_distance_km=10):
+    donor = donation.donor
+    if donor.latitude is None or donor.longitude is None:
+        return []
+
+    # Prefilter on the indexed coordinate columns so only NGOs inside the
+    # bounding box of the search radius reach the haversine check.
+    min_lat, max_lat, min_lon, max_lon = bounding_box(
+        donor.latitude, donor.longitude, max_distance_km
+    )
+
     ngos = User.objects.filter(
         role='NGO',
-        latitude__isnull=False,
+        latitude__range=(min_lat, max_lat),
         longitude__isnull=False
     )
+    if min_lon is not None:
+        ngos = ngos.filter(longitude__range=(min_lon, max_lon))
 
-    nearby_ngos = []
-
-    for ngo in ngos:
-        distance = calculate_distance(
-            donation.donor.latitude,
-            donation.donor.longitude,
-            ngo.latitude,
-            ngo.longitude
-        )
+    candidates = list(ngos)
+    if not candidates:
+        return []
 
-        if distance <= max_distance_km:
-            nearby_ngos.append({
-                "ngo": ngo,
-                "distance_km": distance
-            })
+    distances = haversine_distances(
+        donor.latitude,
+        donor.longitude,
+        [ngo.latitude for ngo in candidates],
+        [ngo.longitude for ngo in candidates]
+    ).round(2)
 
-    # Sort by nearest first
-    nearby_ngos.sort(key=lambda x: x['distance_km'])
+    # Nearest first
+    order = distances.argsort(kind='stable')
+    nearby_ngos = [
+        {
+            "ngo": candidates[i],
+            "distance_km": float(distances[i])
+        }
+        for i in order
+        if distances[i] <= max_distance_km
+    ]
 
     return nearby_ngos 
 
 
 
 
+SAFE_REASON = "Food is safe for consumption"
+
+# Risk stages, most severe first: a stage applies once now reaches
+# anchor + offset, where the anchor is cooked_time for cooked food and
+# expiry_time for everything else.
+COOKED_STAGES = [
+    (timedelta(hours=8), "HIGH", "Cooked food older than 8 hours"),
+    (timedelta(hours=4), "MEDIUM", "Cooked food older than 4 hours"),
+]
+EXPIRY_STAGES = [
+    (timedelta(0), "HIGH", "Food is expired"),
+    (timedelta(hours=-24), "MEDIUM", "Food nearing expiry"),
+]
+
+
+def score_risk(food_type, cooked_time, expiry_time, now):
+    """
+    Return (risk_level, reason, next_review_at) for a donation at `now`.
+
+    next_review_at is when the next, more severe stage starts, or None
+    once the level is final.
+    """
+    if food_type == "COOKED" and cooked_time:
+        anchor, stages = cooked_time, COOKED_STAGES
+    elif expiry_time:
+        anchor, stages = expiry_time, EXPIRY_STAGES
+    else:
+        return "LOW", SAFE_REASON, None
+
+    next_review_at = None
+    for offset, risk_level, reason in stages:
+        if now >= anchor + offset:
+            return risk_level, reason, next_review_at
+        next_review_at = anchor + offset
+
+    return "LOW", SAFE_REASON, next_review_at
+
+
 def assess_food_risk(donation):
+    assess_food_risk_bulk([donation])
+
+
+def assess_food_risk_bulk(donations):
+    """Score and store the risk of many new donations with one INSERT."""
     now = timezone.now()
 
-    risk_level = "LOW"
-    reason = "Food is safe for consumption"
+    assessments = []
+    for donation in donations:
+        risk_level, reason, next_review_at = score_risk(
+            donation.food_type,
+            donation.cooked_time,
+            donation.expiry_time,
+            now
+        )
+        assessments.append(FoodRiskAssessment(
+            donation=donation,
+            risk_level=risk_level,
+            reason=reason,
+            next_review_at=next_review_at
+        ))
 
-    if donation.food_type == "COOKED" and donation.cooked_time:
-        hours_passed = (now - donation.cooked_time).total_seconds() / 3600
+    FoodRiskAssessment.objects.bulk_create(assessments)
 
-        if hours_passed > 8:
-            risk_level = "HIGH"
-            reason = "Cooked food older than 8 hours"
-        elif hours_passed > 4:
-            risk_level = "MEDIUM"
-            reason = "Cooked food older than 4 hours"
+    for donation, assessment in zip(donations, assessments):
+        donation.risk = assessment
 
-    elif donation.expiry_time:
-        hours_left = (donation.expiry_time - now).total_seconds() / 3600
 
-        if hours_left <= 0:
-            risk_level = "HIGH"
-            reason = "Food is expired"
-        elif hours_left <= 24:
-            risk_level = "MEDIUM"
-            reason = "Food nearing expiry"
+def reassess_food_risk(donation):
+    """
+    Re-score an edited donation in place, keeping its next_review_at
+    accurate after a change to food_type, cooked_time or expiry_time.
+    """
+    now = timezone.now()
+    risk_level, reason, next_review_at = score_risk(
+        donation.food_type,
+        donation.cooked_time,
+        donation.expiry_time,
+        now
+    )
 
-    FoodRiskAssessment.objects.create(
+    donation.risk, _ = FoodRiskAssessment.objects.update_or_create(
         donation=donation,
-        risk_level=risk_level,
-        reason=reason
+        defaults={
+            "risk_level": risk_level,
+            "reason": reason,
+            "next_review_at": next_review_at,
+            "assessed_at": now,
+        }
     )
 
 
+def rescore_due_risk():
+    """
+    Re-score every assessment whose next_review_at has passed.
+
+    Works set-based, one UPDATE per risk stage: only due rows are touched
+    (a range scan on the next_review_at index) and each stage moves its
+    rows' next_review_at past now, so no row is written twice.
+    """
+    started = time.perf_counter()
+    now = timezone.now()
+
+    due = FoodRiskAssessment.objects.filter(next_review_at__lte=now)
+    cooked = Q(donation__food_type="COOKED", donation__cooked_time__isnull=False)
+
+    total = 0
+    for rows, anchor, stages in (
+        (due.filter(cooked), "cooked_time", COOKED_STAGES),
+        (due.exclude(cooked), "expiry_time", EXPIRY_STAGES),
+    ):
+        anchor_value = Subquery(
+            Donation.objects.filter(pk=OuterRef("donation_id")).values(anchor)
+        )
+
+        next_review_at = Value(None, output_field=DateTimeField())
+        for offset, risk_level, reason in stages + [(None, "LOW", SAFE_REASON)]:
+            stage_rows = rows
+            if offset is not None:
+                stage_rows = rows.filter(**{f"donation__{anchor}__lte": now - offset})
+
+            total += stage_rows.update(
+                risk_level=risk_level,
+                reason=reason,
+                next_review_at=next_review_at,
+                assessed_at=now
+            )
+
+            if offset is not None:
+                next_review_at = ExpressionWrapper(
+                    anchor_value + offset, output_field=DateTimeField()
+                )
+
+    if total:
+        donation_feed_changed()
+
+    return {
+        "rescored": total,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+def expire_donations(batch_size=1000):
+    """
+    Move AVAILABLE donations past their expiry_time to EXPIRED.
+
+    Rows are updated in id-ordered batches, each in its own short
+    transaction, and their risk assessments are marked HIGH.
+    """
+    started = time.perf_counter()
+    now = timezone.now()
+    expired = Donation.objects.filter(status='AVAILABLE', expiry_time__lt=now)
+
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(
+            expired.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            # Re-check the status, a request may have claimed the row meanwhile
+            total += expired.filter(id__in=ids).update(status='EXPIRED')
+            FoodRiskAssessment.objects.filter(
+                donation_id__in=ids,
+                donation__status='EXPIRED'
+            ).update(
+                risk_level='HIGH',
+                reason='Food is expired',
+                assessed_at=now,
+                next_review_at=None
+            )
+            # Wasted food counts on the day it expired
+            wasted = Donation.objects.filter(id__in=ids, status='EXPIRED').values(
+                'food_type', day=TruncDate('expiry_time')
+            ).annotate(count=Count('id')).order_by()
+            for row in wasted:
+                record_daily_stats(row['day'], row['food_type'], donations_expired=row['count'])
+            donation_feed_changed(ids)
+
+    return {
+        "expired": total,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+def claim_donation(donation):
+    """
+    Move a donation from AVAILABLE to REQUESTED with one conditional
+    UPDATE, so concurrent claims cannot both succeed. Returns whether
+    this caller won; expired donations cannot be claimed.
+    """
+    claimed = Donation.objects.filter(
+        pk=donation.pk,
+        status='AVAILABLE',
+        expiry_time__gt=timezone.now()
+    ).update(status='REQUESTED')
+
+    if claimed:
+        donation.status = 'REQUESTED'
+    return bool(claimed)
+
+
+def match_donations(radius_km=None, expiry_weight=None, chunk_size=1000):
+    """
+    Assign AVAILABLE donations to NGOs within radius_km, respecting each
+    NGO's free pickup capacity.
+
+    Each donation/NGO pair costs its distance plus expiry_weight km per
+    hour the donation has left, so food about to expire is placed first
+    and then with the closest NGO. Pairs are taken greedily by ascending
+    cost over the sparse set of pairs within the radius, which keeps
+    10k x 5k instances to seconds; it is not guaranteed to be the
+    minimum total cost.
+    """
+    started = time.perf_counter()
+    radius_km = settings.MATCH_RADIUS_KM if radius_km is None else radius_km
+    expiry_weight = settings.MATCH_EXPIRY_WEIGHT if expiry_weight is None else expiry_weight
+    now = timezone.now()
+
+    donations = list(
+        Donation.objects.filter(
+            status='AVAILABLE',
+            expiry_time__gt=now,
+            donor__latitude__isnull=False,
+            donor__longitude__isnull=False
+        ).values_list('id', 'donor__latitude', 'donor__longitude', 'expiry_time')
+    )
+    ngos = list(
+        User.objects.filter(
+            role='NGO',
+            latitude__isnull=False,
+            longitude__isnull=False
+        ).annotate(
+            open_requests=Count(
+                'food_requests',
+                filter=Q(food_requests__status__in=['PENDING', 'APPROVED'])
+            )
+        ).filter(
+            pickup_capacity__gt=F('open_requests')
+        ).values_list('id', 'latitude', 'longitude', 'pickup_capacity', 'open_requests')
+    )
+
+    assignments = []
+    if donations and ngos:
+        # Sorted by latitude so each chunk of donations is only compared
+        # with the band of NGOs its radius can reach
+        donations.sort(key=lambda row: row[1])
+        ngos.sort(key=lambda row: row[1])
+        donation_lats = np.array([row[1] for row in donations], dtype=float)
+        donation_lons = np.array([row[2] for row in donations], dtype=float)
+        hours_left = np.array(
+            [(row[3] - now).total_seconds() / 3600 for row in donations]
+        )
+        ngo_lats = np.array([row[1] for row in ngos], dtype=float)
+        ngo_lons = np.array([row[2] for row in ngos], dtype=float)
+
+        edge_donations, edge_ngos, edge_distances = [], [], []
+        for start in range(0, len(donations), chunk_size):
+            stop = min(start + chunk_size, len(donations))
+            min_lat = bounding_box(donation_lats[start], 0, radius_km)[0]
+            max_lat = bounding_box(donation_lats[stop - 1], 0, radius_km)[1]
+            first = np.searchsorted(ngo_lats, min_lat, side='left')
+            last = np.searchsorted(ngo_lats, max_lat, side='right')
+            if first == last:
+                continue
+
+            distances = haversine_matrix(
+                donation_lats[start:stop], donation_lons[start:stop],
+                ngo_lats[first:last], ngo_lons[first:last]
+            )
+            rows, columns = np.nonzero(distances <= radius_km)
+            edge_donations.append(rows + start)
+            edge_ngos.append(columns + first)
+            edge_distances.append(distances[rows, columns])
+
+        if edge_donations:
+            edge_donations = np.concatenate(edge_donations)
+            edge_ngos = np.concatenate(edge_ngos)
+            edge_distances = np.concatenate(edge_distances)
+            order = np.argsort(
+                edge_distances + expiry_weight * hours_left[edge_donations], kind='stable'
+            )
+
+            capacity = [row[3] - row[4] for row in ngos]
+            assigned = [False] * len(donations)
+            remaining = min(len(donations), sum(capacity))
+            for donation_index, ngo_index, km in zip(
+                edge_donations[order].tolist(),
+                edge_ngos[order].tolist(),
+                edge_distances[order].tolist()
+            ):
+                if assigned[donation_index] or not capacity[ngo_index]:
+                    continue
+                assigned[donation_index] = True
+                capacity[ngo_index] -= 1
+                assignments.append({
+                    'donation_id': donations[donation_index][0],
+                    'ngo_id': ngos[ngo_index][0],
+                    'distance_km': round(km, 2),
+                })
+                remaining -= 1
+                if not remaining:
+                    break
+
+    return {
+        'assignments': assignments,
+        'matched': len(assignments),
+        'unmatched': len(donations) - len(assignments),
+        'total_distance_km': round(sum(a['distance_km'] for a in assignments), 2),
+        'elapsed_seconds': time.perf_counter() - started,
+    }
+
+
+def dispatch_matches(assignments):
+    """
+    Record assignments from match_donations as PENDING requests from
+    their NGOs and queue one notification per NGO listing its donations.
+
+    Donations are claimed like an NGO request claims them, so one that
+    was claimed or expired since the match, or whose NGO has no free
+    capacity left, is skipped, and dispatching the same match twice
+    records nothing the second time. Each request's pickup_time is an
+    estimate from pickup_times; the NGO may change it. Returns the
+    assignments recorded.
+    """
+    if not assignments:
+        return []
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Locked so concurrent dispatches cannot overfill an NGO, and
+        # NGO requests for these donations wait for this claim
+        ngos = User.objects.select_for_update().in_bulk({a['ngo_id'] for a in assignments})
+        open_requests = dict(
+            FoodRequest.objects.filter(ngo__in=list(ngos), status__in=['PENDING', 'APPROVED'])
+            .values('ngo').annotate(count=Count('id')).values_list('ngo', 'count').order_by()
+        )
+        donations = Donation.objects.select_for_update().filter(
+            pk__in=[a['donation_id'] for a in assignments],
+            status='AVAILABLE',
+            expiry_time__gt=now
+        ).in_bulk()
+
+        recorded = []
+        for assignment in assignments:
+            ngo = ngos.get(assignment['ngo_id'])
+            if assignment['donation_id'] not in donations or ngo is None:
+                continue
+            if open_requests.get(ngo.pk, 0) >= ngo.pickup_capacity:
+                continue
+            open_requests[ngo.pk] = open_requests.get(ngo.pk, 0) + 1
+            recorded.append(assignment)
+
+        by_ngo = defaultdict(list)
+        for assignment in recorded:
+            by_ngo[assignment['ngo_id']].append(assignment)
+
+        claimed = [a['donation_id'] for a in recorded]
+        donors = User.objects.in_bulk({donations[donation_id].donor_id for donation_id in claimed})
+        pickup_at = {}
+        for ngo_id, matched in by_ngo.items():
+            pickup_at.update(pickup_times(
+                ngos[ngo_id], [donations[a['donation_id']] for a in matched], donors, now
+            ))
+
+        Donation.objects.filter(pk__in=claimed).update(status='REQUESTED')
+        FoodRequest.objects.bulk_create([
+            FoodRequest(donation_id=a['donation_id'], ngo_id=a['ngo_id'], pickup_time=pickup_at[a['donation_id']])
+            for a in recorded
+        ])
+
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(
+                recipient=ngos[ngo_id].email,
+                subject=f"{len(matched)} Food Donations Matched to You",
+                message="\n".join(
+                    f"- {donations[a['donation_id']].food_type}, "
+                    f"{donations[a['donation_id']].quantity_kg} kg, "
+                    f"{a['distance_km']} km away, "
+                    f"expires {donations[a['donation_id']].expiry_time}"
+                    for a in matched
+                ),
+            )
+            for ngo_id, matched in by_ngo.items()
+            if ngos[ngo_id].email
+        ])
+        if claimed:
+            donation_feed_changed(claimed)
+
+    return recorded
+
+
+def pickup_times(ngo, donations, donors, now):
+    """
+    Estimate when an NGO reaches each of its matched donations, as a
+    {donation_id: datetime} dict.
+
+    The donations are ordered into one round trip from the NGO, the way
+    GET /api/requests/route/ orders approved pickups, at ROUTE_SPEED_KMH
+    with ROUTE_STOP_MINUTES per stop. Without a location for the NGO
+    or the donor there is nothing to estimate from, so those get now.
+    """
+    speed_kmh = settings.ROUTE_SPEED_KMH
+    service_hours = settings.ROUTE_STOP_MINUTES / 60
+
+    times = {donation.pk: now for donation in donations}
+    if ngo.latitude is None or ngo.longitude is None:
+        return times
+
+    located = [
+        donation for donation in donations
+        if donors[donation.donor_id].latitude is not None
+        and donors[donation.donor_id].longitude is not None
+    ]
+    if not located:
+        return times
+
+    lats = [ngo.latitude] + [donors[donation.donor_id].latitude for donation in located]
+    lons = [ngo.longitude] + [donors[donation.donor_id].longitude for donation in located]
+    distances = haversine_matrix(lats, lons, lats, lons).tolist()
+    ready = [0.0] * len(lats)
+    due = [float('inf')] + [(donation.expiry_time - now).total_seconds() / 3600 for donation in located]
+
+    order = order_stops(distances, ready, due, speed_kmh, service_hours)
+    starts, _, _ = route_schedule(order, distances, ready, due, speed_kmh, service_hours)
+    for stop, start in zip(order, starts):
+        times[located[stop - 1].pk] = now + timedelta(hours=start)
+
+    return times
+
+
 def notify_ngos(nearby_ngos, donation):
-    for ngo_data in nearby_ngos:
-        ngo = ngo_data["ngo"]
-
-        send_mail(
-            subject="New Food Donation Available",
-            message=(
-                f"Food Type: {donation.food_type}\n"
-                f"Quantity: {donation.quantity_kg} kg\n"
-                f"Expiry: {donation.expiry_time}"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[ngo.email],
-            fail_silently=True,
-        )
-
-def calculate_impact(donation):
+    """Queue one outbox row per NGO, sent later by send_pending_notifications."""
+    _queue_notifications(
+        nearby_ngos,
+        subject="New Food Donation Available",
+        message=(
+            f"Food Type: {donation.food_type}\n"
+            f"Quantity: {donation.quantity_kg} kg\n"
+            f"Expiry: {donation.expiry_time}"
+        ),
+        donation=donation,
+    )
+
+
+def notify_ngos_digest(nearby_ngos, donations):
+    """Queue a single notification per NGO listing every donation in a batch."""
+    items = "\n".join(
+        f"- {donation.food_type}, {donation.quantity_kg} kg, expires {donation.expiry_time}"
+        for donation in donations
+    )
+    _queue_notifications(
+        nearby_ngos,
+        subject=f"{len(donations)} New Food Donations Available",
+        message=items,
+    )
+
+
+def _queue_notifications(nearby_ngos, subject, message, donation=None):
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            donation=donation,
+            recipient=ngo_data["ngo"].email,
+            subject=subject,
+            message=message,
+        )
+        for ngo_data in nearby_ngos
+        if ngo_data["ngo"].email
+    ])
+
+
+def create_donations_bulk(donor, items):
+    """
+    Create many donations for one donor: a single INSERT for the
+    donations and their risk assessments, one NGO lookup and one
+    digest notification per nearby NGO.
+    """
+    with transaction.atomic():
+        donations = Donation.objects.bulk_create([
+            Donation(donor=donor, **item) for item in items
+        ])
+        assess_food_risk_bulk(donations)
+
+        # Every item shares the donor's location, one lookup covers the batch
+        nearby_ngos = find_nearby_ngos(donations[0])
+        notify_ngos_digest(nearby_ngos, donations)
+
+        record_heatmap_change(
+            donations[0],
+            len(donations),
+            sum(donation.quantity_kg for donation in donations)
+        )
+        day = timezone.localdate(donations[0].created_at)
+        for food_type, count in Counter(donation.food_type for donation in donations).items():
+            record_daily_stats(day, food_type, donations_posted=count)
+        donation_feed_changed([donation.pk for donation in donations])
+
+    return donations
+
+
+def send_pending_notifications(batch_size=100, max_attempts=5, retry_delay_seconds=60, lease_seconds=300):
+    """
+    Send one batch of due outbox rows over a single mail connection.
+
+    Rows are claimed in a short transaction by pushing next_attempt_at
+    lease_seconds ahead, so other workers skip them, then sent with no
+    transaction or row lock held. A worker that dies mid-batch leaves its
+    rows due again once the lease runs out.
+
+    Failed rows are retried with exponential backoff and marked FAILED
+    after max_attempts. Returns throughput metrics for the run.
+    """
+    started = time.perf_counter()
+    now = timezone.now()
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        NotificationOutbox.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+            next_attempt_at=now + timedelta(seconds=lease_seconds)
+        )
+
+    if batch:
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            open_error = None
+        except Exception as exc:
+            open_error = exc
+
+        for notification in batch:
+            error = open_error
+            if error is None:
+                try:
+                    connection.send_messages([EmailMessage(
+                        subject=notification.subject,
+                        body=notification.message,
+                        from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=[notification.recipient],
+                        connection=connection,
+                    )])
+                except Exception as exc:
+                    error = exc
+
+            if error is None:
+                notification.status = 'SENT'
+                notification.sent_at = timezone.now()
+                notification.last_error = None
+                stats["sent"] += 1
+                continue
+
+            notification.attempts += 1
+            notification.last_error = str(error)
+            if notification.attempts >= max_attempts:
+                notification.status = 'FAILED'
+                stats["failed"] += 1
+            else:
+                notification.next_attempt_at = timezone.now() + timedelta(
+                    seconds=retry_delay_seconds * 2 ** (notification.attempts - 1)
+                )
+                stats["retried"] += 1
+
+        if open_error is None:
+            # Every row is accounted for already, a failing QUIT is harmless
+            connection.fail_silently = True
+            connection.close()
+
+        NotificationOutbox.objects.bulk_update(
+            batch,
+            ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+        )
+
+    stats["processed"] = len(batch)
+    stats["elapsed_seconds"] = time.perf_counter() - started
+    return stats
+
+def calculate_impact(donation, ngo_id=None):
+    """
+    Log the impact of a picked up donation and add it to the rollups,
+    daily stats and leaderboards, ngo_id being the NGO that collected it.
+    """
     food_kg = donation.quantity_kg
 
     meals_saved = int(food_kg / 0.5)
     co2_saved = round(food_kg * 2.5, 2)
 
-    ImpactLog.objects.create(
-        donation=donation,
-        meals_saved=meals_saved,
-        food_saved_kg=food_kg,
-        co2_saved_kg=co2_saved,
+    with transaction.atomic():
+        impact = ImpactLog.objects.create(
+            donation=donation,
+            meals_saved=meals_saved,
+            food_saved_kg=food_kg,
+            co2_saved_kg=co2_saved,
+        )
+
+        for scope, key in _impact_rollup_keys(impact, donation.donor_id):
+            rollup, _ = ImpactRollup.objects.get_or_create(scope=scope, key=key)
+            ImpactRollup.objects.filter(pk=rollup.pk).update(
+                meals_saved=F('meals_saved') + meals_saved,
+                food_saved_kg=F('food_saved_kg') + food_kg,
+                co2_saved_kg=F('co2_saved_kg') + co2_saved,
+                donations_count=F('donations_count') + 1,
+                updated_at=timezone.now(),
+            )
+
+        record_daily_stats(
+            timezone.localdate(impact.created_at),
+            donation.food_type,
+            donations_picked_up=1,
+            meals_saved=meals_saved,
+            food_saved_kg=food_kg,
+            co2_saved_kg=co2_saved,
+        )
+
+        record_leaderboard_pickup(
+            timezone.localdate(impact.created_at), donation.donor_id, ngo_id, food_kg
+        )
+
+    return impact
+
+
+def _impact_rollup_keys(impact, donor_id):
+    yield 'GLOBAL', ''
+    yield 'DAY', timezone.localdate(impact.created_at).isoformat()
+    if donor_id is not None:
+        yield 'DONOR', str(donor_id)
+
+
+def rebuild_impact_rollup():
+    """Recompute every ImpactRollup row from the full ImpactLog table."""
+    totals = dict(
+        meals=Sum('meals_saved'),
+        food_kg=Sum('food_saved_kg'),
+        co2_kg=Sum('co2_saved_kg'),
+        count=Count('id'),
+    )
+    logs = ImpactLog.objects.order_by()
+
+    buckets = [('GLOBAL', '', logs.aggregate(**totals))]
+    buckets += [
+        ('DAY', row['day'].isoformat(), row)
+        for row in logs.annotate(day=TruncDate('created_at')).values('day').annotate(**totals)
+    ]
+    buckets += [
+        ('DONOR', str(row['donation__donor']), row)
+        for row in logs.filter(donation__isnull=False).values('donation__donor').annotate(**totals)
+    ]
+
+    rollups = [
+        ImpactRollup(
+            scope=scope,
+            key=key,
+            meals_saved=row['meals'] or 0,
+            food_saved_kg=row['food_kg'] or 0,
+            co2_saved_kg=row['co2_kg'] or 0,
+            donations_count=row['count'],
+        )
+        for scope, key, row in buckets
+    ]
+
+    with transaction.atomic():
+        ImpactRollup.objects.all().delete()
+        ImpactRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return len(rollups)
+
+
+def apply_rating_change(user_id, count_delta, sum_delta):
+    """Adjust a user's denormalized rating aggregates in place."""
+    User.objects.filter(pk=user_id).update(
+        rating_count=F('rating_count') + count_delta,
+        rating_sum=F('rating_sum') + sum_delta,
+    )
+    # Feed pages embed each donor's average rating, streams only carry
+    # availability so they are not woken up for it
+    donation_feed_changed(donation_ids=[])
+
+
+def rebuild_rating_aggregates():
+    """Recompute every user's rating aggregates from the Rating table."""
+    ratings = Rating.objects.filter(rated_user=OuterRef('pk')).order_by().values('rated_user')
+
+    return User.objects.update(
+        rating_count=Coalesce(Subquery(ratings.annotate(count=Count('id')).values('count')), 0),
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), 0),
+    )
+
+
+def donation_feed_changed(donation_ids=None):
+    """
+    Invalidate cached NGO feed pages and notify donation streams once
+    the current transaction commits. Streams re-check just the given
+    donation_ids, or resync from the database when they are None.
+    """
+    if donation_ids is not None:
+        donation_ids = list(donation_ids)
+
+    def changed():
+        version = bump_version('donation_feed')
+        if donation_ids != []:
+            broker.publish(version, donation_ids)
+
+    transaction.on_commit(changed)
+
+
+def record_heatmap_change(donation, count_delta, quantity_delta):
+    """
+    Apply a donation create/update/delete to its heatmap cell and
+    invalidate cached heatmap responses.
+    """
+    donor = donation.donor
+    if donor.latitude is None or donor.longitude is None:
+        return
+
+    tile_x, tile_y = lat_lng_to_tile(donor.latitude, donor.longitude, settings.HEATMAP_BASE_ZOOM)
+    day = timezone.localdate(donation.created_at)
+
+    with transaction.atomic():
+        cell, _ = HeatmapCell.objects.get_or_create(day=day, tile_x=tile_x, tile_y=tile_y)
+        HeatmapCell.objects.filter(pk=cell.pk).update(
+            donations_count=F('donations_count') + count_delta,
+            total_quantity_kg=F('total_quantity_kg') + quantity_delta,
+        )
+
+    transaction.on_commit(lambda: bump_version('heatmap'))
+
+
+def rebuild_heatmap():
+    """Recompute every HeatmapCell from the Donation table."""
+    cells = {}
+
+    donations = Donation.objects.filter(
+        donor__latitude__isnull=False,
+        donor__longitude__isnull=False
+    ).values_list('created_at', 'quantity_kg', 'donor__latitude', 'donor__longitude')
+
+    for created_at, quantity_kg, latitude, longitude in donations.iterator(chunk_size=2000):
+        tile_x, tile_y = lat_lng_to_tile(latitude, longitude, settings.HEATMAP_BASE_ZOOM)
+        cell = cells.setdefault(
+            (timezone.localdate(created_at), tile_x, tile_y),
+            HeatmapCell(day=timezone.localdate(created_at), tile_x=tile_x, tile_y=tile_y)
+        )
+        cell.donations_count += 1
+        cell.total_quantity_kg += quantity_kg
+
+    with transaction.atomic():
+        HeatmapCell.objects.all().delete()
+        HeatmapCell.objects.bulk_create(cells.values(), batch_size=1000)
+
+    bump_version('heatmap')
+    return len(cells)
+
+
+DAILY_STAT_FIELDS = [
+    'donations_posted',
+    'donations_expired',
+    'donations_picked_up',
+    'meals_saved',
+    'food_saved_kg',
+    'co2_saved_kg',
+]
+
+
+def record_daily_stats(day, food_type, **deltas):
+    """Add deltas (DAILY_STAT_FIELDS) to one day and food type."""
+    stat, _ = DailyImpactStat.objects.get_or_create(day=day, food_type=food_type)
+    DailyImpactStat.objects.filter(pk=stat.pk).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def rebuild_daily_impact_stats():
+    """
+    Recompute every DailyImpactStat row from the Donation and ImpactLog
+    tables. Impact logs whose donation was deleted have no food type and
+    are left out.
+    """
+    stats = {}
+
+    def add(rows, **fields):
+        for row in rows:
+            stat = stats.setdefault(
+                (row['day'], row['food_type']),
+                DailyImpactStat(day=row['day'], food_type=row['food_type'])
+            )
+            for name, source in fields.items():
+                setattr(stat, name, getattr(stat, name) + (row[source] or 0))
+
+    donations = Donation.objects.order_by()
+    add(
+        donations.values('food_type', day=TruncDate('created_at')).annotate(count=Count('id')),
+        donations_posted='count',
+    )
+    add(
+        donations.filter(status='EXPIRED').values('food_type', day=TruncDate('expiry_time')).annotate(count=Count('id')),
+        donations_expired='count',
+    )
+    add(
+        ImpactLog.objects.filter(donation__isnull=False).order_by().values(
+            day=TruncDate('created_at'), food_type=F('donation__food_type')
+        ).annotate(
+            count=Count('id'),
+            meals=Sum('meals_saved'),
+            food_kg=Sum('food_saved_kg'),
+            co2_kg=Sum('co2_saved_kg'),
+        ),
+        donations_picked_up='count',
+        meals_saved='meals',
+        food_saved_kg='food_kg',
+        co2_saved_kg='co2_kg',
     )
+
+    with transaction.atomic():
+        DailyImpactStat.objects.all().delete()
+        DailyImpactStat.objects.bulk_create(stats.values(), batch_size=1000)
+
+    return len(stats)
+
+
+# Leaderboard period -> utils.period_start bucket, None for all time
+LEADERBOARD_PERIODS = {
+    'WEEK': 'week',
+    'MONTH': 'month',
+    'ALL': None,
+}
+
+
+def leaderboard_period_key(period, day):
+    """LeaderboardEntry.period_key of the period holding day."""
+    bucket = LEADERBOARD_PERIODS[period]
+    return period_start(day, bucket).isoformat() if bucket else ''
+
+
+def record_leaderboard_pickup(day, donor_id, ngo_id, food_kg):
+    """
+    Count one completed pickup for its donor and NGO in every
+    leaderboard period holding day, and invalidate cached pages.
+    """
+    boards = [('DONOR', donor_id), ('NGO', ngo_id)]
+
+    with transaction.atomic():
+        for board, user_id in boards:
+            if user_id is None:
+                continue
+            for period in LEADERBOARD_PERIODS:
+                entry, _ = LeaderboardEntry.objects.get_or_create(
+                    board=board,
+                    period=period,
+                    period_key=leaderboard_period_key(period, day),
+                    user_id=user_id,
+                )
+                LeaderboardEntry.objects.filter(pk=entry.pk).update(
+                    pickups=F('pickups') + 1,
+                    food_saved_kg=F('food_saved_kg') + food_kg,
+                    score=F('score') + (food_kg if board == 'DONOR' else 1),
+                )
+
+    transaction.on_commit(lambda: bump_version('leaderboard'))
+
+
+def rebuild_leaderboards():
+    """
+    Recompute every LeaderboardEntry from the ImpactLog table, the NGO of
+    a pickup being the one whose request on the donation was completed.
+    Impact logs whose donation was deleted are left out.
+    """
+    entries = {}
+
+    completed_by = FoodRequest.objects.filter(
+        donation=OuterRef('donation'), status='COMPLETED'
+    ).order_by('-requested_at').values('ngo')[:1]
+    logs = ImpactLog.objects.filter(donation__isnull=False).annotate(
+        ngo=Subquery(completed_by)
+    ).values_list('created_at', 'food_saved_kg', 'donation__donor', 'ngo')
+
+    for created_at, food_kg, donor_id, ngo_id in logs.iterator(chunk_size=2000):
+        day = timezone.localdate(created_at)
+        for board, user_id in [('DONOR', donor_id), ('NGO', ngo_id)]:
+            if user_id is None:
+                continue
+            for period in LEADERBOARD_PERIODS:
+                key = leaderboard_period_key(period, day)
+                entry = entries.setdefault(
+                    (board, period, key, user_id),
+                    LeaderboardEntry(board=board, period=period, period_key=key, user_id=user_id)
+                )
+                entry.pickups += 1
+                entry.food_saved_kg += food_kg
+                entry.score += food_kg if board == 'DONOR' else 1
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries.values(), batch_size=1000)
+
+    bump_version('leaderboard')
+    return len(entries)
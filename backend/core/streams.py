@@ -0,0 +1,206 @@
+import asyncio
+import json
+from collections import OrderedDict
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .cache import get_version
+from .events import broker
+from .models import Donation
+from .serializers import DonationSerializer
+from .utils import haversine_distances
+
+# Shared loads kept per event loop, see _shared
+SHARED_LOADS_KEPT = 16
+
+_shared_loads = OrderedDict()
+
+
+async def donation_stream(request):
+    """
+    Server-sent events for NGOs, replacing polling of the donation list.
+
+    On connect every AVAILABLE donation within the radius is sent as a
+    'donation' event, then new or changed donations follow as they
+    happen and 'removed' events once they are claimed, expired or
+    deleted. EventSource cannot set headers, so the access token may
+    also be passed as ?token=.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+    if user.role != 'NGO':
+        return JsonResponse({"detail": "Only NGOs can stream donations."}, status=403)
+    if user.latitude is None or user.longitude is None:
+        return JsonResponse({"detail": "Set your location to stream nearby donations."}, status=400)
+
+    radius_km = settings.DONATION_STREAM_RADIUS_KM
+    if request.GET.get('radius_km'):
+        try:
+            radius_km = min(float(request.GET['radius_km']), radius_km)
+        except ValueError:
+            return JsonResponse({"detail": "radius_km must be a number."}, status=400)
+
+    response = StreamingHttpResponse(
+        _donation_events(user, radius_km),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _authenticate(request):
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def _donation_events(ngo, radius_km):
+    """
+    Pushes in-process events from core.events as they arrive. Changes
+    made in other workers or by management commands only bump the
+    donation_feed version row in the database, so the stream resyncs as
+    soon as an event skips a version, and also polls that row every
+    DONATION_STREAM_POLL_SECONDS whether or not events are arriving.
+    """
+    loop = asyncio.get_running_loop()
+    poll_seconds = settings.DONATION_STREAM_POLL_SECONDS
+    queue = broker.subscribe()
+    try:
+        sent = {}
+        version = await sync_to_async(get_version)('donation_feed')
+        yield f"retry: {poll_seconds * 1000}\n\n"
+        for frame in await _diff(ngo, radius_km, sent, await _snapshot(version, None), None):
+            yield frame
+
+        next_poll = loop.time() + poll_seconds
+        while True:
+            try:
+                event_version, donation_ids = await asyncio.wait_for(
+                    queue.get(), max(next_poll - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                next_poll = loop.time() + poll_seconds
+                current = await _polled_version(poll_seconds)
+                if current <= version:
+                    yield ": keepalive\n\n"
+                    continue
+                version, donation_ids = current, None
+            else:
+                if event_version <= version:
+                    # Already covered by a resync
+                    continue
+                if event_version > version + 1:
+                    # A gap in versions means another worker changed something
+                    donation_ids = None
+                version = event_version
+
+            snapshot = await _snapshot(version, donation_ids)
+            for frame in await _diff(ngo, radius_km, sent, snapshot, donation_ids):
+                yield frame
+    finally:
+        broker.unsubscribe(queue)
+
+
+def _shared(key, load, *args):
+    """
+    Run load(*args) in a thread once per key for every stream on the
+    running event loop, so a change costs one query however many
+    clients are connected.
+    """
+    key = (asyncio.get_running_loop(), *key)
+    task = _shared_loads.get(key)
+    if task is None:
+        task = asyncio.ensure_future(sync_to_async(load)(*args))
+        _shared_loads[key] = task
+        while len(_shared_loads) > SHARED_LOADS_KEPT:
+            _shared_loads.popitem(last=False)
+
+        def forget_failed(done):
+            if (done.cancelled() or done.exception()) and _shared_loads.get(key) is done:
+                del _shared_loads[key]
+
+        task.add_done_callback(forget_failed)
+
+    # One stream disconnecting must not cancel the load for the others
+    return asyncio.shield(task)
+
+
+def _polled_version(poll_seconds):
+    """The donation_feed version, read once per poll interval."""
+    return _shared(('version', int(asyncio.get_running_loop().time() // poll_seconds)), get_version, 'donation_feed')
+
+
+def _snapshot(version, donation_ids):
+    """
+    The located AVAILABLE donations at a feed version, for donation_ids
+    only or for everything when it is None.
+    """
+    ids = None if donation_ids is None else tuple(sorted(donation_ids))
+    return _shared(('snapshot', version, ids), _load_snapshot, ids)
+
+
+def _load_snapshot(donation_ids):
+    """(payloads, latitudes, longitudes), serialized without distance_km."""
+    donations = Donation.objects.filter(
+        status='AVAILABLE',
+        donor__latitude__isnull=False,
+        donor__longitude__isnull=False
+    )
+    if donation_ids is not None:
+        donations = donations.filter(id__in=donation_ids)
+
+    donations = list(donations.select_related('donor', 'risk'))
+    payloads = DonationSerializer(donations, many=True, context={'omit_distance': True}).data
+    return (
+        payloads,
+        np.array([donation.donor.latitude for donation in donations], dtype=float),
+        np.array([donation.donor.longitude for donation in donations], dtype=float),
+    )
+
+
+@sync_to_async(thread_sensitive=False)
+def _diff(ngo, radius_km, sent, snapshot, donation_ids):
+    """
+    Diff the snapshot's donations in range against what the client was
+    sent, for donation_ids only or for everything when it is None.
+    """
+    payloads, latitudes, longitudes = snapshot
+    current = {}
+    if payloads:
+        distances = haversine_distances(ngo.latitude, ngo.longitude, latitudes, longitudes)
+        for i in np.flatnonzero(distances <= radius_km):
+            payload = {**payloads[i], 'distance_km': round(float(distances[i]), 2)}
+            current[payload['id']] = payload
+
+    checked = sent.keys() | current.keys() if donation_ids is None else set(donation_ids)
+    frames = []
+    for donation_id in sorted(checked):
+        payload = current.get(donation_id)
+        if payload is None:
+            if sent.pop(donation_id, None) is not None:
+                frames.append(_event('removed', {'id': donation_id}))
+        elif sent.get(donation_id) != payload:
+            sent[donation_id] = payload
+            frames.append(_event('donation', payload))
+    return frames
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
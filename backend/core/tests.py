@@ -1,3 +1,1595 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import itertools
+import json
+import math
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    DailyImpactStat, Donation, FoodRequest, FoodRiskAssessment, ImpactLog, ImpactRollup, LeaderboardEntry,
+    NotificationOutbox, Rating, User,
+)
+from .benchmarks import SCENARIOS, compare_reports, delete_dataset, generate_dataset, run_benchmarks
+from .benchmarks.data import CITIES
+from . import streams as streams_module
+from .events import broker
+from .metrics import registry
+from .renderers import FastJSONRenderer
+from .services import (
+    apply_rating_change,
+    calculate_impact,
+    dispatch_matches,
+    expire_donations,
+    match_donations,
+    rebuild_daily_impact_stats,
+    rebuild_heatmap,
+    rebuild_impact_rollup,
+    rebuild_leaderboards,
+    rebuild_rating_aggregates,
+    rescore_due_risk,
+    score_risk,
+    find_nearby_ngos,
+    send_pending_notifications,
+)
+from .utils import bounding_box, calculate_distance, haversine_distances, haversine_matrix
+
+
+def make_donation(donor, **kwargs):
+    donation = Donation.objects.create(
+        donor=donor,
+        food_type=kwargs.pop('food_type', 'PACKAGED'),
+        description=kwargs.pop('description', 'Bread'),
+        quantity_kg=kwargs.pop('quantity_kg', 5),
+        expiry_time=kwargs.pop('expiry_time', timezone.now() + timedelta(days=2)),
+        **kwargs
+    )
+    FoodRiskAssessment.objects.create(donation=donation, risk_level='LOW', reason='Fresh')
+    return donation
+
+
+def rate(user, rated_by, value):
+    rating = Rating.objects.create(rated_user=user, rated_by=rated_by, rating=value)
+    apply_rating_change(user.pk, 1, value)
+    return rating
+
+
+class DonationListQueryCountTests(TestCase):
+    def setUp(self):
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.client = APIClient()
+
+    def add_donors(self, count):
+        for i in range(count):
+            donor = User.objects.create(
+                username=f'donor{User.objects.count()}',
+                role='DONOR',
+                latitude=12.98,
+                longitude=77.60
+            )
+            rate(donor, self.ngo, 4)
+            make_donation(donor)
+
+    def count_list_queries(self, user):
+        cache.clear()
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/donations/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def test_ngo_feed_query_count_is_constant(self):
+        self.add_donors(1)
+        small, _ = self.count_list_queries(self.ngo)
+
+        self.add_donors(10)
+        large, data = self.count_list_queries(self.ngo)
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 11)
+        self.assertEqual(data[0]['donor']['average_rating'], 4.0)
+        self.assertEqual(data[0]['risk_assessment']['risk_level'], 'LOW')
+
+    def test_donor_history_query_count_is_constant(self):
+        donor = User.objects.create(username='donor', role='DONOR')
+        make_donation(donor)
+        small, _ = self.count_list_queries(donor)
+
+        for _ in range(10):
+            make_donation(donor)
+        large, data = self.count_list_queries(donor)
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 11)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create(username='donor', role='DONOR')
+        self.ngo = User.objects.create(username='ngo', role='NGO')
+        self.other_ngo = User.objects.create(username='ngo2', role='NGO')
+        self.client = APIClient()
+        self.client.force_authenticate(self.ngo)
+
+    def test_update_and_delete_adjust_aggregates(self):
+        rating = rate(self.donor, self.ngo, 4)
+        rate(self.donor, self.other_ngo, 5)
+
+        response = self.client.patch(
+            f'/api/ratings/{rating.pk}/?rated_user={self.donor.pk}', {'rating': 2}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.donor.refresh_from_db()
+        self.assertEqual((self.donor.rating_count, self.donor.rating_sum), (2, 7))
+        self.assertEqual(self.donor.average_rating, 3.5)
+
+        response = self.client.delete(f'/api/ratings/{rating.pk}/?rated_user={self.donor.pk}')
+        self.assertEqual(response.status_code, 204)
+        self.donor.refresh_from_db()
+        self.assertEqual((self.donor.rating_count, self.donor.rating_sum), (1, 5))
+
+    def test_rebuild_recomputes_from_ratings(self):
+        Rating.objects.create(rated_user=self.donor, rated_by=self.ngo, rating=3)
+        Rating.objects.create(rated_user=self.donor, rated_by=self.other_ngo, rating=4)
+        User.objects.filter(pk=self.ngo.pk).update(rating_count=9, rating_sum=40)
+
+        rebuild_rating_aggregates()
+
+        self.donor.refresh_from_db()
+        self.ngo.refresh_from_db()
+        self.assertEqual((self.donor.rating_count, self.donor.rating_sum), (2, 7))
+        self.assertEqual((self.ngo.rating_count, self.ngo.rating_sum), (0, 0))
+        self.assertIsNone(self.ngo.average_rating)
+
+
+class PaginationTests(TestCase):
+    def test_cursor_pages_cover_every_donation_once(self):
+        donor = User.objects.create(username='donor', role='DONOR')
+        donations = [make_donation(donor) for _ in range(5)]
+        client = APIClient()
+        client.force_authenticate(donor)
+
+        seen = []
+        url = '/api/donations/?page_size=2'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json()['results']), 2)
+            seen += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+
+        self.assertEqual(seen, [d.pk for d in reversed(donations)])
+
+
+class ImpactRollupTests(TestCase):
+    def test_stats_read_rollup_that_matches_rebuild(self):
+        donors = [User.objects.create(username=f'donor{i}', role='DONOR') for i in range(2)]
+        for donor, kg in [(donors[0], 10), (donors[0], 3), (donors[1], 4)]:
+            calculate_impact(make_donation(donor, quantity_kg=kg))
+
+        client = APIClient()
+        client.force_authenticate(donors[0])
+        response = client.get('/api/stats/impact/')
+        self.assertEqual(response.json(), {
+            'total_meals_saved': 34,
+            'total_food_saved_kg': 17.0,
+            'total_co2_saved_kg': 42.5,
+            'total_donations': 3,
+        })
+
+        def snapshot():
+            return sorted(ImpactRollup.objects.values_list(
+                'scope', 'key', 'meals_saved', 'food_saved_kg', 'co2_saved_kg', 'donations_count'
+            ))
+
+        incremental = snapshot()
+        rebuild_impact_rollup()
+        self.assertEqual(snapshot(), incremental)
+        self.assertIn(('DONOR', str(donors[0].pk), 26, 13.0, 32.5, 2), incremental)
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.9716, longitude=77.5946)
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def post_donation(self, quantity_kg):
+        response = self.client.post('/api/donations/', {
+            'food_type': 'PACKAGED',
+            'description': 'Rice',
+            'quantity_kg': quantity_kg,
+            'expiry_time': (timezone.now() + timedelta(days=2)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_tiles_follow_creates_updates_and_deletes(self):
+        self.assertEqual(self.client.get('/api/stats/heatmap/').json(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post_donation(4)
+            self.post_donation(6)
+        tiles = self.client.get('/api/stats/heatmap/?zoom=12&days=1').json()
+        self.assertEqual(len(tiles), 1)
+        self.assertEqual((tiles[0]['count'], tiles[0]['total_quantity_kg']), (2, 10))
+        self.assertAlmostEqual(tiles[0]['latitude'], 12.9716, delta=0.05)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/donations/{first}/', {'quantity_kg': 1}, format='json')
+            self.client.delete(f'/api/donations/{first}/')
+        tiles = self.client.get('/api/stats/heatmap/?zoom=12&days=1').json()
+        self.assertEqual((tiles[0]['count'], tiles[0]['total_quantity_kg']), (1, 6))
+
+        elsewhere = self.client.get('/api/stats/heatmap/?bbox=0,0,1,1').json()
+        self.assertEqual(elsewhere, [])
+
+        incremental = self.client.get('/api/stats/heatmap/').json()
+        rebuild_heatmap()
+        self.assertEqual(self.client.get('/api/stats/heatmap/').json(), incremental)
+
+    def test_rejects_invalid_params(self):
+        invalid = [
+            'zoom=17', 'zoom=x', 'days=0', 'days=99999999', 'bbox=1,2,3',
+            'bbox=nan,nan,nan,nan', 'bbox=0,0,inf,1',
+        ]
+        for query in invalid:
+            self.assertEqual(self.client.get(f'/api/stats/heatmap/?{query}').status_code, 400, query)
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN the SQL the main endpoints run and check the indexes are used."""
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"No EXPLAIN parser for {connection.vendor}")
+
+        cache.clear()
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        self.client = APIClient()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+            # Tiny test tables make a sequential scan cheaper, we only want
+            # to know whether the planner can use the index at all
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertIndexUsed(self, queries, table, index):
+        plans = [
+            self.explain(query['sql'])
+            for query in queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+        ]
+        self.assertTrue(plans, f"No query against {table}")
+        self.assertTrue(
+            any(index in plan for plan in plans),
+            f"{index} not used:\n" + '\n\n'.join(plans)
+        )
+
+    def capture(self, method, path, user, data=None):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400, response.content)
+        return queries.captured_queries
+
+    def test_ngo_feed_uses_status_expiry_index(self):
+        make_donation(self.donor)
+        queries = self.capture('get', '/api/donations/', self.ngo)
+        self.assertIndexUsed(queries, 'core_donation', 'donation_status_expiry_idx')
+
+    def test_donor_history_uses_donor_index(self):
+        make_donation(self.donor)
+        queries = self.capture('get', '/api/donations/', self.donor)
+        self.assertIndexUsed(queries, 'core_donation', 'donation_donor_created_idx')
+
+    def test_nearby_ngo_lookup_uses_geo_index(self):
+        queries = self.capture('post', '/api/donations/', self.donor, {
+            'food_type': 'RAW',
+            'description': 'Vegetables',
+            'quantity_kg': 3,
+            'expiry_time': (timezone.now() + timedelta(days=2)).isoformat(),
+        })
+        self.assertIndexUsed(queries, 'core_user', 'user_role_geo_idx')
+
+    def test_ngo_requests_use_ngo_requested_index(self):
+        queries = self.capture('get', '/api/requests/', self.ngo)
+        self.assertIndexUsed(queries, 'core_foodrequest', 'foodrequest_ngo_requested_idx')
+
+
+class ExpirySweepTests(TestCase):
+    def test_sweep_expires_only_stale_available_donations(self):
+        donor = User.objects.create(username='donor', role='DONOR')
+        past = timezone.now() - timedelta(hours=1)
+        stale = [make_donation(donor, expiry_time=past) for _ in range(3)]
+        requested = make_donation(donor, expiry_time=past, status='REQUESTED')
+        fresh = make_donation(donor)
+
+        stats = expire_donations(batch_size=2)
+
+        self.assertEqual(stats['expired'], 3)
+        statuses = dict(Donation.objects.values_list('id', 'status'))
+        self.assertEqual({statuses[d.pk] for d in stale}, {'EXPIRED'})
+        self.assertEqual(statuses[requested.pk], 'REQUESTED')
+        self.assertEqual(statuses[fresh.pk], 'AVAILABLE')
+        self.assertEqual(
+            set(FoodRiskAssessment.objects.filter(risk_level='HIGH').values_list('donation_id', flat=True)),
+            {d.pk for d in stale}
+        )
+        self.assertEqual(expire_donations()['expired'], 0)
+
+
+class RiskRescoreTests(TestCase):
+    def test_set_based_rescore_matches_score_risk(self):
+        donor = User.objects.create(username='donor', role='DONOR')
+        now = timezone.now()
+        cases = [
+            ('COOKED', now - timedelta(hours=1), now + timedelta(days=1)),
+            ('COOKED', now - timedelta(hours=5), now + timedelta(days=1)),
+            ('COOKED', now - timedelta(hours=9), now + timedelta(days=1)),
+            ('PACKAGED', None, now + timedelta(days=3)),
+            ('PACKAGED', None, now + timedelta(hours=3)),
+            ('RAW', None, now - timedelta(hours=3)),
+            ('COOKED', None, now + timedelta(hours=3)),
+        ]
+        donations = [
+            make_donation(donor, food_type=food_type, cooked_time=cooked_time, expiry_time=expiry_time)
+            for food_type, cooked_time, expiry_time in cases
+        ]
+        FoodRiskAssessment.objects.update(next_review_at=now - timedelta(minutes=1))
+
+        self.assertEqual(rescore_due_risk()['rescored'], len(cases))
+
+        for donation in donations:
+            risk = FoodRiskAssessment.objects.get(donation=donation)
+            expected = score_risk(donation.food_type, donation.cooked_time, donation.expiry_time, now)
+            self.assertEqual((risk.risk_level, risk.reason, risk.next_review_at), expected)
+
+        self.assertEqual(rescore_due_risk()['rescored'], 0)
+
+    def test_editing_risk_inputs_rescores(self):
+        donor = User.objects.create(username='donor', role='DONOR')
+        donation = make_donation(donor, expiry_time=timezone.now() - timedelta(hours=1))
+        FoodRiskAssessment.objects.filter(donation=donation).update(
+            risk_level='HIGH', reason='Food is expired', next_review_at=None
+        )
+        client = APIClient()
+        client.force_authenticate(donor)
+
+        # Pushed back: out of HIGH, with the MEDIUM crossing scheduled
+        expiry_time = timezone.now() + timedelta(days=3)
+        response = client.patch(f'/api/donations/{donation.pk}/', {'expiry_time': expiry_time}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['risk_assessment']['risk_level'], 'LOW')
+        risk = FoodRiskAssessment.objects.get(donation=donation)
+        self.assertEqual((risk.risk_level, risk.next_review_at), ('LOW', expiry_time - timedelta(hours=24)))
+
+        # Pulled forward: the next crossing moves with it
+        expiry_time = timezone.now() + timedelta(hours=3)
+        client.patch(f'/api/donations/{donation.pk}/', {'expiry_time': expiry_time}, format='json')
+        risk.refresh_from_db()
+        self.assertEqual((risk.risk_level, risk.next_review_at), ('MEDIUM', expiry_time))
+
+        # Other edits leave the assessment alone
+        assessed_at = risk.assessed_at
+        client.patch(f'/api/donations/{donation.pk}/', {'quantity_kg': 2}, format='json')
+        risk.refresh_from_db()
+        self.assertEqual(risk.assessed_at, assessed_at)
+
+
+class BulkDonationTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        User.objects.create(username='ngo', role='NGO', email='ngo@example.com', latitude=12.97, longitude=77.59)
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+        self.expiry = (timezone.now() + timedelta(days=2)).isoformat()
+
+    def test_json_array_creates_donations_with_one_digest(self):
+        items = [
+            {'food_type': 'PACKAGED', 'description': f'Item {i}', 'quantity_kg': i + 1, 'expiry_time': self.expiry}
+            for i in range(3)
+        ]
+        response = self.client.post('/api/donations/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(response.json()[0]['risk_assessment']['risk_level'], 'LOW')
+        self.assertEqual(Donation.objects.filter(donor=self.donor).count(), 3)
+        self.assertEqual(FoodRiskAssessment.objects.count(), 3)
+        digest = NotificationOutbox.objects.get()
+        self.assertEqual(digest.recipient, 'ngo@example.com')
+        self.assertEqual(digest.message.count('\n'), 2)
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('donations.csv', (
+            'food_type,description,quantity_kg,cooked_time,expiry_time\n'
+            f'COOKED,Rice,4,{timezone.now().isoformat()},{self.expiry}\n'
+            f'RAW,Onions,10,,{self.expiry}\n'
+        ).encode(), content_type='text/csv')
+
+        response = self.client.post('/api/donations/bulk/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            sorted(Donation.objects.values_list('description', flat=True)), ['Onions', 'Rice']
+        )
+
+    def test_invalid_item_rejects_whole_batch(self):
+        items = [
+            {'food_type': 'PACKAGED', 'description': 'Ok', 'quantity_kg': 1, 'expiry_time': self.expiry},
+            {'food_type': 'PIZZA', 'description': 'Bad', 'quantity_kg': 1, 'expiry_time': self.expiry},
+        ]
+        response = self.client.post('/api/donations/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('food_type', response.json()[1])
+        self.assertFalse(Donation.objects.exists())
+
+    def test_csv_rejects_non_utf8_and_non_finite_quantities(self):
+        latin1 = SimpleUploadedFile('donations.csv', (
+            'food_type,description,quantity_kg,expiry_time\n'
+            f'RAW,Jalapeños,2,{self.expiry}\n'
+        ).encode('latin-1'), content_type='text/csv')
+        response = self.client.post('/api/donations/bulk/', {'file': latin1}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.json()['file'])
+
+        for quantity in ('nan', 'inf', '-inf'):
+            upload = SimpleUploadedFile('donations.csv', (
+                'food_type,description,quantity_kg,expiry_time\n'
+                f'RAW,Onions,{quantity},{self.expiry}\n'
+            ).encode(), content_type='text/csv')
+            response = self.client.post('/api/donations/bulk/', {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 400, quantity)
+            self.assertIn('quantity_kg', response.json()[0])
+        self.assertFalse(Donation.objects.exists())
+
+
+class DonationFeedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.far_ngo = User.objects.create(username='far', role='NGO', latitude=13.50, longitude=77.59)
+        make_donation(self.donor)
+        self.client = APIClient()
+
+    def get_feed(self, user, **headers):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/donations/', headers=headers)
+        return response, len(queries)
+
+    def test_cached_page_with_per_ngo_distances(self):
+        first, _ = self.get_feed(self.ngo)
+        # Only the version counter is read
+        cached, queries = self.get_feed(self.ngo)
+        self.assertEqual(queries, 1)
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(first.json()['results'][0]['distance_km'], 1.55)
+
+        far, queries = self.get_feed(self.far_ngo)
+        self.assertEqual(queries, 1)
+        self.assertGreater(far.json()['results'][0]['distance_km'], 50)
+        self.assertNotEqual(far['ETag'], first['ETag'])
+
+    def test_etag_revalidation_and_invalidation(self):
+        first, _ = self.get_feed(self.ngo)
+        unchanged, _ = self.get_feed(self.ngo, if_none_match=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+
+        self.client.force_authenticate(self.donor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/donations/', {
+                'food_type': 'RAW',
+                'description': 'Carrots',
+                'quantity_kg': 2,
+                'expiry_time': (timezone.now() + timedelta(days=2)).isoformat(),
+            }, format='json')
+
+        changed, _ = self.get_feed(self.ngo, if_none_match=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['results']), 2)
+
+    def test_version_bumped_by_another_process_invalidates_etag(self):
+        first, _ = self.get_feed(self.ngo)
+        self.assertEqual(len(first.json()['results']), 1)
+
+        # What expire_donations run from another process leaves behind: the
+        # row and the version change in the database, this process's cache
+        # is never told
+        Donation.objects.update(status='EXPIRED')
+        with connection.cursor() as cursor:
+            # Nothing bumped the feed yet, so its counter row is new
+            cursor.execute("INSERT INTO core_cacheversion (name, value) VALUES (%s, %s)", ['donation_feed', 2])
+
+        changed, _ = self.get_feed(self.ngo, if_none_match=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['results'], [])
+
+    @override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+    def test_pagination_links_follow_the_request_host(self):
+        make_donation(self.donor)
+        self.client.force_authenticate(self.ngo)
+
+        first = self.client.get('/api/donations/?page_size=1', HTTP_HOST='a.example')
+        self.assertTrue(first.json()['next'].startswith('http://a.example/api/donations/'))
+
+        for host, secure in [('b.example', False), ('a.example', True)]:
+            response = self.client.get('/api/donations/?page_size=1', HTTP_HOST=host, secure=secure)
+            scheme = 'https' if secure else 'http'
+            self.assertTrue(response.json()['next'].startswith(f'{scheme}://{host}/api/donations/'))
+            self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+class DonationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        self.far_donor = User.objects.create(username='far', role='DONOR', latitude=13.50, longitude=77.59)
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.near = make_donation(self.donor)
+        make_donation(self.far_donor)
+
+    async def next_event(self, stream):
+        while True:
+            frame = (await anext(stream)).decode()
+            if frame.startswith('event:'):
+                name, data = frame.strip().split('\n')
+                return name.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    def test_requires_ngo_token(self):
+        response = self.client.get('/api/donations/stream/')
+        self.assertEqual(response.status_code, 401)
+
+        token = AccessToken.for_user(self.donor)
+        response = self.client.get('/api/donations/stream/', {'token': str(token)})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_pushes_nearby_changes(self):
+        token = await sync_to_async(AccessToken.for_user)(self.ngo)
+        response = await self.async_client.get('/api/donations/stream/', {'token': str(token)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        # Only the donation within the radius is sent on connect
+        name, data = await self.next_event(stream)
+        self.assertEqual((name, data['id'], data['distance_km']), ('donation', self.near.pk, 1.55))
+
+        @sync_to_async
+        def add_donation():
+            return make_donation(self.donor, description='Rice')
+
+        added = await add_donation()
+        broker.publish(2, [added.pk])
+        name, data = await self.next_event(stream)
+        self.assertEqual((name, data['id'], data['description']), ('donation', added.pk, 'Rice'))
+
+        await Donation.objects.filter(pk=self.near.pk).aupdate(status='REQUESTED')
+        broker.publish(3, [self.near.pk])
+        self.assertEqual(await self.next_event(stream), ('removed', {'id': self.near.pk}))
+        await stream.aclose()
+
+    @override_settings(DONATION_STREAM_POLL_SECONDS=0.1)
+    async def test_polls_database_for_changes_from_other_processes(self):
+        token = await sync_to_async(AccessToken.for_user)(self.ngo)
+        response = await self.async_client.get('/api/donations/stream/', {'token': str(token)})
+        stream = aiter(response.streaming_content)
+        name, data = await self.next_event(stream)
+        self.assertEqual((name, data['id']), ('donation', self.near.pk))
+
+        # Another process claims the donation and bumps the version row,
+        # nothing is published to this process's broker
+        @sync_to_async
+        def claim_elsewhere():
+            Donation.objects.filter(pk=self.near.pk).update(status='REQUESTED')
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO core_cacheversion (name, value) VALUES (%s, %s)", ['donation_feed', 2]
+                )
+
+        await claim_elsewhere()
+        self.assertEqual(
+            await asyncio.wait_for(self.next_event(stream), 5), ('removed', {'id': self.near.pk})
+        )
+        await stream.aclose()
+
+    async def test_version_gap_resyncs_at_once(self):
+        token = await sync_to_async(AccessToken.for_user)(self.ngo)
+        response = await self.async_client.get('/api/donations/stream/', {'token': str(token)})
+        stream = aiter(response.streaming_content)
+        name, data = await self.next_event(stream)
+        self.assertEqual((name, data['id']), ('donation', self.near.pk))
+
+        # Another process claims the donation and bumps the version to 2,
+        # then a change here publishes 3, long before the next poll
+        @sync_to_async
+        def claim_elsewhere_then_add():
+            Donation.objects.filter(pk=self.near.pk).update(status='REQUESTED')
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO core_cacheversion (name, value) VALUES (%s, %s)", ['donation_feed', 3]
+                )
+            return make_donation(self.donor, description='Rice')
+
+        added = await claim_elsewhere_then_add()
+        broker.publish(3, [added.pk])
+        events = [await asyncio.wait_for(self.next_event(stream), 5) for _ in range(2)]
+        self.assertEqual(
+            sorted((name, data['id']) for name, data in events),
+            [('donation', added.pk), ('removed', self.near.pk)]
+        )
+        await stream.aclose()
+
+    async def test_streams_share_one_fetch_per_change(self):
+        token = await sync_to_async(AccessToken.for_user)(self.ngo)
+        streams = []
+        for _ in range(3):
+            response = await self.async_client.get('/api/donations/stream/', {'token': str(token)})
+            streams.append(aiter(response.streaming_content))
+            await self.next_event(streams[-1])
+
+        added = await sync_to_async(make_donation)(self.donor, description='Rice')
+        with mock.patch('core.streams._load_snapshot', wraps=streams_module._load_snapshot) as load:
+            broker.publish(2, [added.pk])
+            for stream in streams:
+                name, data = await asyncio.wait_for(self.next_event(stream), 5)
+                self.assertEqual((name, data['id']), ('donation', added.pk))
+        load.assert_called_once_with((added.pk,))
+
+        for stream in streams:
+            await stream.aclose()
+
+
+class ClaimRaceTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        self.ngos = [
+            User.objects.create(username=f'ngo{i}', role='NGO', latitude=12.97, longitude=77.59)
+            for i in range(16)
+        ]
+        self.donation = make_donation(donor)
+
+    def claim(self, ngo):
+        client = APIClient()
+        client.force_authenticate(ngo)
+        return client.post('/api/requests/', {
+            'donation': self.donation.pk,
+            'pickup_time': (timezone.now() + timedelta(hours=1)).isoformat(),
+        }, format='json')
+
+    def test_second_claim_is_rejected(self):
+        self.assertEqual(self.claim(self.ngos[0]).status_code, 201)
+        response = self.claim(self.ngos[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('donation', response.json())
+        self.assertEqual(FoodRequest.objects.get().ngo, self.ngos[0])
+
+    def test_exactly_one_concurrent_claim_wins(self):
+        # The threads need to share a file-backed test database (settings
+        # TEST NAME), SQLite's in-memory one cannot take concurrent writers
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed SQLite test database')
+
+        barrier = threading.Barrier(len(self.ngos))
+
+        def claim(ngo):
+            try:
+                barrier.wait()
+                return self.claim(ngo).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(len(self.ngos)) as pool:
+            codes = list(pool.map(claim, self.ngos))
+
+        self.assertEqual(sorted(codes), [201] + [400] * (len(self.ngos) - 1))
+        self.assertEqual(FoodRequest.objects.count(), 1)
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'REQUESTED')
+
+    def test_expired_donation_cannot_be_claimed(self):
+        Donation.objects.filter(pk=self.donation.pk).update(expiry_time=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.claim(self.ngos[0]).status_code, 400)
+        self.assertFalse(FoodRequest.objects.exists())
+
+
+class NearbyNGOTests(TestCase):
+    # Donor spots around the awkward parts of the map: both poles, both
+    # sides of the antimeridian and a high latitude with wide degrees
+    ORIGINS = [(12.98, 77.60), (89.95, 10.0), (-89.97, -120.0), (0.5, 179.98), (-10.0, -179.99), (70.0, 30.0)]
+
+    def setUp(self):
+        rng = random.Random(7)
+        for i, (lat, lon) in enumerate(self.ORIGINS):
+            for j in range(40):
+                ngo_lat = min(max(lat + rng.uniform(-6, 6), -90), 90)
+                ngo_lon = (lon + rng.uniform(-40, 40) + 180) % 360 - 180
+                User.objects.create(
+                    username=f'ngo-{i}-{j}', role='NGO',
+                    latitude=round(ngo_lat, 6), longitude=round(ngo_lon, 6)
+                )
+        User.objects.create(username='nowhere', role='NGO')
+
+    def full_scan(self, donor, radius_km):
+        found = {}
+        for ngo in User.objects.filter(role='NGO', latitude__isnull=False, longitude__isnull=False):
+            distance = calculate_distance(donor.latitude, donor.longitude, ngo.latitude, ngo.longitude)
+            if distance <= radius_km:
+                found[ngo.pk] = distance
+        return found
+
+    def test_prefilter_matches_full_scan(self):
+        for lat, lon in self.ORIGINS:
+            donor = User.objects.create(username=f'donor-{lat}-{lon}', role='DONOR', latitude=lat, longitude=lon)
+            donation = make_donation(donor)
+            for radius_km in [10, 150, 500, 2000]:
+                with self.subTest(lat=lat, lon=lon, radius_km=radius_km):
+                    nearby = find_nearby_ngos(donation, max_distance_km=radius_km)
+                    expected = self.full_scan(donor, radius_km)
+
+                    self.assertEqual({n['ngo'].pk for n in nearby}, set(expected))
+                    for n in nearby:
+                        self.assertAlmostEqual(n['distance_km'], expected[n['ngo'].pk], delta=0.01)
+                    distances = [n['distance_km'] for n in nearby]
+                    self.assertEqual(distances, sorted(distances))
+
+    def test_bounding_box_contains_the_circle(self):
+        def destination(lat, lon, bearing, km):
+            lat, lon, bearing, d = map(math.radians, (lat, lon, bearing, math.degrees(km / 6371)))
+            lat2 = math.asin(math.sin(lat) * math.cos(d) + math.cos(lat) * math.sin(d) * math.cos(bearing))
+            lon2 = lon + math.atan2(
+                math.sin(bearing) * math.sin(d) * math.cos(lat), math.cos(d) - math.sin(lat) * math.sin(lat2)
+            )
+            return math.degrees(lat2), (math.degrees(lon2) + 180) % 360 - 180
+
+        for lat, lon in self.ORIGINS + [(0, 0), (-45.5, 100.25)]:
+            for radius_km in [1, 10, 150, 2000]:
+                min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+                self.assertTrue(-90 <= min_lat <= lat <= max_lat <= 90)
+                self.assertEqual(min_lon is None, max_lon is None)
+                for bearing in range(0, 360, 5):
+                    point_lat, point_lon = destination(lat, lon, bearing, radius_km)
+                    with self.subTest(lat=lat, lon=lon, radius_km=radius_km, bearing=bearing):
+                        self.assertTrue(min_lat - 1e-9 <= point_lat <= max_lat + 1e-9)
+                        if min_lon is not None:
+                            self.assertTrue(min_lon - 1e-9 <= point_lon <= max_lon + 1e-9)
+
+    def test_bounding_box_drops_longitude_at_poles_and_antimeridian(self):
+        # The circle reaches a pole: every longitude is in range
+        self.assertEqual(bounding_box(89.95, 10.0, 10), (89.95 - math.degrees(10 / 6371), 90, None, None))
+        self.assertEqual(bounding_box(-89.97, -120.0, 10)[1:], (-89.97 + math.degrees(10 / 6371), None, None))
+
+        # The circle crosses the antimeridian on either side
+        self.assertEqual(bounding_box(0.5, 179.98, 10)[2:], (None, None))
+        self.assertEqual(bounding_box(-10.0, -179.99, 10)[2:], (None, None))
+
+        # Close to, but not over, both of them the box stays narrow
+        min_lat, max_lat, min_lon, max_lon = bounding_box(0.5, 179.8, 10)
+        self.assertTrue(179.7 < min_lon < 179.8 < max_lon < 180)
+        min_lat, max_lat, min_lon, max_lon = bounding_box(89.9, 10.0, 1)
+        self.assertLess(max_lat, 90)
+        self.assertTrue(0 < min_lon < 10 < max_lon < 20)
+
+
+class HaversineTests(TestCase):
+    # Same points, antipodes, poles, the antimeridian and Decimal input
+    POINTS = [
+        (12.98, 77.60), (12.97, 77.59), (-12.98, -102.40), (90, 0), (-90, 45), (0.5, 179.98),
+        (0.5, -179.98), (51.5074, -0.1278), (-33.8688, 151.2093), (Decimal('40.712800'), Decimal('-74.006000')),
+    ]
+
+    def scalar(self, lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = map(math.radians, map(float, (lat1, lon1, lat2, lon2)))
+        a = (
+            math.sin((lat2 - lat1) / 2) ** 2
+            + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        )
+        return 2 * 6371 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    def test_batch_and_matrix_match_the_scalar_formula(self):
+        rng = random.Random(11)
+        points = self.POINTS + [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(40)]
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+
+        matrix = haversine_matrix(lats, lons, lats, lons)
+        self.assertEqual(matrix.shape, (len(points), len(points)))
+        for i, (lat, lon) in enumerate(points):
+            row = haversine_distances(lat, lon, lats, lons)
+            for j, (other_lat, other_lon) in enumerate(points):
+                expected = self.scalar(lat, lon, other_lat, other_lon)
+                self.assertAlmostEqual(row[j], expected, delta=1e-6)
+                self.assertAlmostEqual(matrix[i, j], expected, delta=1e-6)
+                self.assertAlmostEqual(
+                    calculate_distance(lat, lon, other_lat, other_lon), round(expected, 2), delta=0.01
+                )
+
+        self.assertEqual(haversine_matrix(lats[:3], lons[:3], [], []).shape, (3, 0))
+        self.assertEqual(haversine_distances(0, 0, [], []).shape, (0,))
+
+    def test_edge_cases(self):
+        self.assertEqual(haversine_distances(12.98, 77.60, [12.98], [77.60])[0], 0)
+        self.assertAlmostEqual(haversine_distances(0, 0, [0], [180])[0], math.pi * 6371, delta=1e-6)
+        self.assertAlmostEqual(haversine_distances(90, 0, [-90], [0])[0], math.pi * 6371, delta=1e-6)
+        # Across the antimeridian is the short way round
+        self.assertLess(calculate_distance(0.5, 179.98, 0.5, -179.98), 5)
+
+
+class MatchingTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        self.near = User.objects.create(
+            username='near', role='NGO', email='near@example.com',
+            latitude=12.97, longitude=77.59, pickup_capacity=1
+        )
+        self.far = User.objects.create(
+            username='far', role='NGO', email='far@example.com',
+            latitude=13.03, longitude=77.60, pickup_capacity=1
+        )
+        self.client = APIClient()
+
+    def assignments(self, **kwargs):
+        result = match_donations(**kwargs)
+        return {a['donation_id']: a['ngo_id'] for a in result['assignments']}
+
+    def test_urgent_donation_gets_the_nearest_ngo(self):
+        later = make_donation(self.donor, expiry_time=timezone.now() + timedelta(days=2))
+        urgent = make_donation(self.donor, expiry_time=timezone.now() + timedelta(hours=2))
+
+        self.assertEqual(self.assignments(), {urgent.pk: self.near.pk, later.pk: self.far.pk})
+
+    def test_capacity_and_radius_limit_matches(self):
+        first = make_donation(self.donor)
+        make_donation(self.donor)
+        FoodRequest.objects.create(donation=first, ngo=self.far, pickup_time=timezone.now())
+
+        # far has no free capacity left, and near is the only NGO in 2 km
+        result = match_donations(radius_km=2)
+        self.assertEqual(result['matched'], 1)
+        self.assertEqual(result['unmatched'], 1)
+        self.assertEqual(result['assignments'][0]['ngo_id'], self.near.pk)
+
+    def test_admin_endpoint_dispatches_once(self):
+        donation = make_donation(self.donor)
+
+        self.client.force_authenticate(self.near)
+        self.assertEqual(self.client.get('/api/dispatch/match/').status_code, 403)
+
+        admin = User.objects.create(username='admin', role='ADMIN')
+        self.client.force_authenticate(admin)
+        preview = self.client.get('/api/dispatch/match/')
+        self.assertEqual(preview.json()['matched'], 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+        response = self.client.post('/api/dispatch/match/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['dispatched'], 1)
+        self.assertEqual(
+            list(NotificationOutbox.objects.values_list('recipient', flat=True)),
+            ['near@example.com']
+        )
+        food_request = FoodRequest.objects.get()
+        self.assertEqual(
+            (food_request.donation, food_request.ngo, food_request.status), (donation, self.near, 'PENDING')
+        )
+        # Picked up after the 1.55 km drive at ROUTE_SPEED_KMH, not at dispatch time
+        drive = timedelta(hours=1.55 / 20)
+        self.assertAlmostEqual(
+            (food_request.pickup_time - food_request.requested_at).total_seconds(), drive.total_seconds(), delta=5
+        )
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, 'REQUESTED')
+
+        # The donation is claimed, a second run has nothing left to send
+        response = self.client.post('/api/dispatch/match/', {}, format='json')
+        self.assertEqual((response.json()['matched'], response.json()['dispatched']), (0, 0))
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(FoodRequest.objects.count(), 1)
+
+        for body in [[], {'radius_km': 'inf'}, {'radius_km': 'nan'}, {'radius_km': -1}]:
+            response = self.client.post('/api/dispatch/match/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_stale_assignments_are_skipped(self):
+        first = make_donation(self.donor, expiry_time=timezone.now() + timedelta(hours=2))
+        second = make_donation(self.donor)
+        assignments = match_donations()['assignments']
+        self.assertEqual(self.assignments(), {first.pk: self.near.pk, second.pk: self.far.pk})
+
+        # Before dispatch far claims first itself, which also fills it up
+        Donation.objects.filter(pk=first.pk).update(status='REQUESTED')
+        FoodRequest.objects.create(donation=first, ngo=self.far, pickup_time=timezone.now())
+
+        self.assertEqual(dispatch_matches(assignments), [])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'AVAILABLE')
+
+        User.objects.filter(pk=self.far.pk).update(pickup_capacity=2)
+        recorded = dispatch_matches(assignments)
+        self.assertEqual([(a['donation_id'], a['ngo_id']) for a in recorded], [(second.pk, self.far.pk)])
+        self.assertEqual(dispatch_matches(assignments), [])
+
+
+class MatchingOptimalityTests(TestCase):
+    def test_greedy_stays_close_to_the_optimal_cost(self):
+        # match_donations is greedy; on small instances it is compared
+        # with the brute-forced minimum total distance
+        ratios = []
+        for seed in range(20):
+            rng = random.Random(seed)
+            User.objects.all().delete()
+            donations = [
+                make_donation(User.objects.create(
+                    username=f'donor{i}', role='DONOR',
+                    latitude=round(12.9 + rng.uniform(0, 0.05), 6), longitude=round(77.55 + rng.uniform(0, 0.05), 6)
+                ))
+                for i in range(6)
+            ]
+            ngos = [
+                User.objects.create(
+                    username=f'ngo{i}', role='NGO', pickup_capacity=2,
+                    latitude=round(12.9 + rng.uniform(0, 0.05), 6), longitude=round(77.55 + rng.uniform(0, 0.05), 6)
+                )
+                for i in range(3)
+            ]
+
+            result = match_donations(radius_km=50, expiry_weight=0)
+            self.assertEqual(result['matched'], len(donations))
+
+            distances = haversine_matrix(
+                [d.donor.latitude for d in donations], [d.donor.longitude for d in donations],
+                [n.latitude for n in ngos], [n.longitude for n in ngos],
+            )
+            slots = [ngo for ngo in range(len(ngos)) for _ in range(2)]
+            optimal = min(
+                sum(distances[donation, ngo] for donation, ngo in enumerate(assignment))
+                for assignment in set(itertools.permutations(slots))
+            )
+            ratios.append(result['total_distance_km'] / optimal)
+
+        self.assertLessEqual(max(ratios), 1.5)
+        self.assertLessEqual(sum(ratios) / len(ratios), 1.15)
+
+
+class PickupRouteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.client = APIClient()
+        self.client.force_authenticate(self.ngo)
+
+    def request_from(self, name, latitude, longitude, expires_in, status='APPROVED'):
+        donor = User.objects.create(username=name, role='DONOR', latitude=latitude, longitude=longitude)
+        donation = make_donation(donor, expiry_time=timezone.now() + expires_in)
+        return FoodRequest.objects.create(
+            donation=donation, ngo=self.ngo, pickup_time=timezone.now(), status=status
+        )
+
+    def test_orders_by_distance_within_time_windows(self):
+        near = self.request_from('near', 12.98, 77.59, timedelta(days=1))
+        middle = self.request_from('middle', 13.00, 77.59, timedelta(days=1))
+        # Farthest away but expiring within the hour, so it goes first
+        urgent = self.request_from('urgent', 13.10, 77.59, timedelta(minutes=50))
+        self.request_from('pending', 12.975, 77.59, timedelta(days=1), status='PENDING')
+        unlocated = self.request_from('unlocated', None, None, timedelta(days=1))
+
+        response = self.client.get('/api/requests/route/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [stop['request_id'] for stop in data['stops']],
+            [urgent.pk, middle.pk, near.pk]
+        )
+        self.assertFalse(any(stop['late'] for stop in data['stops']))
+        self.assertEqual(data['unrouted_request_ids'], [unlocated.pk])
+
+    def test_order_is_cached_per_request_set(self):
+        self.request_from('a', 12.98, 77.59, timedelta(days=1))
+        first = self.client.get('/api/requests/route/').json()
+        self.assertEqual(len([key for key in cache._cache if ':route:' in key]), 1)
+
+        self.request_from('b', 12.99, 77.59, timedelta(days=1))
+        second = self.client.get('/api/requests/route/').json()
+        self.assertEqual(len(second['stops']), 2)
+        self.assertEqual(len([key for key in cache._cache if ':route:' in key]), 2)
+        self.assertEqual(first['stops'][0]['request_id'], second['stops'][0]['request_id'])
+
+    def test_donors_cannot_plan_routes(self):
+        donor = User.objects.create(username='donor', role='DONOR')
+        self.client.force_authenticate(donor)
+        self.assertEqual(self.client.get('/api/requests/route/').status_code, 403)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = User.objects.create(username='donor', role='DONOR', latitude=12.98, longitude=77.60)
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.client = APIClient()
+
+    def get(self, user, path):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], queries
+
+    def test_fields_skip_unrequested_joins(self):
+        donation = make_donation(self.donor)
+
+        results, queries = self.get(self.donor, '/api/donations/?fields=id,status')
+        self.assertEqual(results, [{'id': donation.pk, 'status': 'AVAILABLE'}])
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+
+        results, _ = self.get(self.donor, '/api/donations/?fields=id,donor.username')
+        self.assertEqual(results[0]['donor'], {'username': 'donor'})
+
+    def test_nested_objects_render_as_ids_unless_expanded(self):
+        make_donation(self.donor)
+
+        results, _ = self.get(self.donor, '/api/donations/?fields=donor')
+        self.assertEqual(results, [{'donor': self.donor.pk}])
+
+        results, _ = self.get(self.donor, '/api/donations/?fields=donor&expand=donor')
+        self.assertEqual(results[0]['donor']['username'], 'donor')
+        self.assertIn('average_rating', results[0]['donor'])
+
+    def test_ngo_feed_distances_with_sparse_fields(self):
+        donation = make_donation(self.donor)
+
+        results, _ = self.get(self.ngo, '/api/donations/?fields=id,distance_km')
+        self.assertEqual(results, [{'id': donation.pk, 'distance_km': 1.55}])
+
+    def test_request_list_rows_do_not_query_per_row(self):
+        def add_request():
+            FoodRequest.objects.create(
+                donation=make_donation(self.donor), ngo=self.ngo, pickup_time=timezone.now()
+            )
+
+        add_request()
+        _, one = self.get(self.ngo, '/api/requests/')
+        add_request()
+        add_request()
+        results, three = self.get(self.ngo, '/api/requests/')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(one), len(three))
+
+        results, _ = self.get(self.ngo, '/api/requests/?fields=id,donation.food_type,ngo')
+        self.assertEqual(set(results[0]), {'id', 'donation', 'ngo'})
+        self.assertEqual(results[0]['donation'], {'food_type': 'PACKAGED'})
+        self.assertEqual(results[0]['ngo'], self.ngo.pk)
+
+        results, _ = self.get(self.ngo, '/api/requests/?fields=donation')
+        self.assertIsInstance(results[0]['donation'], int)
+
+
+class FastListTests(TestCase):
+    def setUp(self):
+        self.ngo = User.objects.create(username='ngo', role='NGO', latitude=12.97, longitude=77.59)
+        self.donor = User.objects.create(
+            username='dönor', role='DONOR', email='d@example.com', phone='123',
+            address='1 Main St', latitude=12.98, longitude=77.60
+        )
+        self.unlocated = User.objects.create(username='unlocated', role='DONOR')
+        rate(self.donor, self.ngo, 4)
+        rate(self.donor, self.unlocated, 5)
+
+        now = timezone.now()
+        donations = [
+            make_donation(self.donor, food_type='COOKED', cooked_time=now - timedelta(minutes=90),
+                          description='Dal \u2028 chawal \U0001F35B', quantity_kg=2.5),
+            make_donation(self.donor, expiry_time=now + timedelta(days=1, microseconds=123)),
+            make_donation(self.unlocated, quantity_kg=0.1),
+        ]
+        FoodRiskAssessment.objects.filter(donation=donations[1]).delete()
+        for donation in donations[:2]:
+            FoodRequest.objects.create(donation=donation, ngo=self.ngo, pickup_time=now + timedelta(hours=2))
+        self.client = APIClient()
+
+    def assertSameBytes(self, user, path):
+        self.client.force_authenticate(user)
+        cache.clear()
+        fast = self.client.get(path)
+        cache.clear()
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(path)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_donation_lists_match_serializer_output(self):
+        self.assertSameBytes(self.donor, '/api/donations/')
+        self.assertSameBytes(self.ngo, '/api/donations/')
+        self.assertSameBytes(self.ngo, '/api/donations/?page_size=1')
+
+    def test_request_lists_match_serializer_output(self):
+        self.assertSameBytes(self.ngo, '/api/requests/')
+        self.assertSameBytes(self.donor, '/api/requests/')
+
+        # The page's distances come from one vectorized call
+        self.client.force_authenticate(self.ngo)
+        with mock.patch('core.fast_serializers.haversine_distances', wraps=haversine_distances) as distances:
+            self.client.get('/api/requests/')
+        distances.assert_called_once()
+
+    def test_renderer_matches_json_renderer(self):
+        # Without datetimes, so orjson encodes it
+        data = {
+            'text': 'naïve \u2028 \U0001F35B "quoted"',
+            'numbers': [0, -1, 2.5, 0.1, 0.0001, -0.0, 123456789.125, 9999999999999998.0],
+            'nested': {'none': None, 'flag': True, 'list': [(1, 2.0)]},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        for value in [timezone.now(), 1e-05, 2.5e-08, 1e-07, -3e-300, 1e16, 1.5e22]:
+            data = {'nested': [{'value': value}]}
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data), value)
+
+        # Serializer output is ReturnList / ReturnDict
+        data = ReturnList([ReturnDict({'value': 1e-05}, serializer=None)], serializer=None)
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        for value in [float('nan'), float('inf'), float('-inf')]:
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'nested': [value]})
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dataset = generate_dataset(donors=10, ngos=4, donations=200, ratings=30, impact_logs=20, seed=1)
+
+    def test_dataset_keeps_aggregates_in_step(self):
+        counts = self.dataset.counts
+        self.assertEqual(Donation.objects.count(), 200)
+        self.assertEqual(Rating.objects.count(), counts['ratings'])
+        self.assertEqual(ImpactLog.objects.count(), counts['impact_logs'])
+
+        rollup = ImpactRollup.objects.get(scope='GLOBAL', key='')
+        self.assertEqual(rollup.donations_count, counts['impact_logs'])
+        before = {user.pk: (user.rating_count, user.rating_sum) for user in User.objects.all()}
+        rebuild_rating_aggregates()
+        after = {user.pk: (user.rating_count, user.rating_sum) for user in User.objects.all()}
+        self.assertEqual(before, after)
+
+        # Every user with a location sits near one of the cities
+        for user in User.objects.filter(latitude__isnull=False):
+            self.assertTrue(any(
+                abs(float(user.latitude) - latitude) < 1 and abs(float(user.longitude) - longitude) < 1
+                for _, latitude, longitude, _ in CITIES
+            ))
+
+    def test_client_run_reports_every_scenario(self):
+        report = run_benchmarks(self.dataset, modes=['client'], requests=5, warmup=1)
+
+        self.assertEqual([r['name'] for r in report['results']], [name for name, _, _ in SCENARIOS])
+        for result in report['results']:
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(result['requests'], 5)
+            self.assertGreaterEqual(result['queries_per_request'], 1)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        # Reports are plain JSON, compared by queries and p95
+        heavier = json.loads(json.dumps(report))
+        for result in heavier['results']:
+            result['queries_per_request'] += 1
+        self.assertTrue(all(c['regressed'] for c in compare_reports(report, heavier)))
+        self.assertFalse(any(c['regressed'] for c in compare_reports(heavier, report)))
+
+    def test_delete_dataset(self):
+        delete_dataset(self.dataset)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Donation.objects.exists())
+        self.assertFalse(ImpactLog.objects.exists())
+        self.assertEqual(ImpactRollup.objects.get(scope='GLOBAL', key='').donations_count, 0)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.donor = User.objects.create(username='donor', role='DONOR')
+        self.admin = User.objects.create(username='admin', role='ADMIN')
+        make_donation(self.donor)
+
+    def test_disabled_by_default(self):
+        client = APIClient()
+        client.force_authenticate(self.donor)
+        self.assertNotIn('Server-Timing', client.get('/api/donations/'))
+
+        client.force_authenticate(self.admin)
+        self.assertEqual(client.get('/api/metrics/').status_code, 404)
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_timings_are_reported_per_view(self):
+        client = APIClient()
+        client.force_authenticate(self.donor)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/donations/')
+        # The next request resets connection.queries
+        query_count = len(queries)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Server-Timing'],
+            rf'^db;dur=[\d.]+;desc="{query_count} queries", serialize;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+        self.assertGreater(registry.serialize_duration.series[('donation-list', 'GET')][1], 0)
+
+        self.assertEqual(client.get('/api/metrics/').status_code, 403)
+        client.force_authenticate(self.admin)
+        metrics = client.get('/api/metrics/')
+        self.assertEqual(metrics.status_code, 200)
+        self.assertTrue(metrics['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        body = metrics.content.decode()
+        self.assertIn('api_requests_total{view="donation-list",method="GET",status="200"} 1', body)
+        self.assertIn('api_requests_total{view="metrics",method="GET",status="403"} 1', body)
+        self.assertIn(f'api_request_queries_sum{{view="donation-list",method="GET"}} {query_count}', body)
+        self.assertIn('api_request_duration_seconds_bucket{view="donation-list",method="GET",le="+Inf"} 1', body)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', role='ADMIN')
+        self.donor = User.objects.create(username='dönor', role='DONOR')
+        self.ngo = User.objects.create(username='ngo', role='NGO')
+        self.donations = [
+            make_donation(self.donor, description='Rice, "fresh"\nand dal'),
+            make_donation(self.donor),
+            make_donation(self.donor),
+        ]
+        Donation.objects.filter(pk=self.donations[0].pk).update(created_at=timezone.now() - timedelta(days=3))
+        FoodRequest.objects.create(donation=self.donations[1], ngo=self.ngo, pickup_time=timezone.now())
+        calculate_impact(self.donations[2])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_every_row(self):
+        response = self.client.get('/api/export/donations.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="donations.csv"')
+
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual([int(row['id']) for row in rows], [d.pk for d in self.donations])
+        self.assertEqual(rows[0]['description'], 'Rice, "fresh"\nand dal')
+        self.assertEqual(rows[0]['donor_username'], 'dönor')
+        self.assertEqual(rows[1]['risk_level'], 'LOW')
+
+    def test_ndjson_and_date_range(self):
+        today = timezone.localdate().isoformat()
+        response = self.client.get(f'/api/export/donations.ndjson?from={today}&to={today}')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([line['id'] for line in lines], [d.pk for d in self.donations[1:]])
+        self.assertEqual(lines[0]['cooked_time'], None)
+
+        requests = self.content(self.client.get('/api/export/requests.ndjson'))
+        self.assertEqual(json.loads(requests)['ngo_username'], 'ngo')
+        impact = self.content(self.client.get('/api/export/impact-logs.csv'))
+        self.assertEqual(impact.splitlines()[0], 'id,donation_id,donor_id,meals_saved,food_saved_kg,co2_saved_kg,created_at')
+
+    def test_errors_and_permissions(self):
+        self.assertEqual(self.client.get('/api/export/users.csv').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/donations.xml').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/donations.csv?from=2024-02-30').status_code, 400)
+        self.client.force_authenticate(self.donor)
+        self.assertEqual(self.client.get('/api/export/donations.csv').status_code, 403)
+
+
+class TimeseriesTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create(username='donor', role='DONOR')
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def post(self, food_type, quantity_kg=4):
+        response = self.client.post('/api/donations/', {
+            'food_type': food_type,
+            'description': 'Food',
+            'quantity_kg': quantity_kg,
+            'expiry_time': (timezone.now() + timedelta(days=2)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Donation.objects.get(pk=response.json()['id'])
+
+    def test_daily_stats_follow_donations_and_match_rebuild(self):
+        cooked, raw, changed, deleted = [self.post(t) for t in ('COOKED', 'RAW', 'RAW', 'PACKAGED')]
+        self.client.patch(f'/api/donations/{changed.pk}/', {'food_type': 'COOKED'}, format='json')
+        self.client.delete(f'/api/donations/{deleted.pk}/')
+        self.client.post('/api/donations/bulk/', [
+            {'food_type': 'RAW', 'description': 'Onions', 'quantity_kg': 1,
+             'expiry_time': (timezone.now() + timedelta(days=1)).isoformat()},
+        ] * 2, format='json')
+
+        Donation.objects.filter(pk=raw.pk).update(expiry_time=timezone.now() - timedelta(minutes=1))
+        expire_donations()
+        Donation.objects.filter(pk=cooked.pk).update(status='PICKED_UP')
+        calculate_impact(cooked)
+
+        def snapshot():
+            return sorted(DailyImpactStat.objects.values_list(
+                'day', 'food_type', 'donations_posted', 'donations_expired', 'donations_picked_up',
+                'meals_saved', 'food_saved_kg', 'co2_saved_kg'
+            ))
+
+        today = timezone.localdate()
+        incremental = snapshot()
+        self.assertEqual(incremental, [
+            (today, 'COOKED', 2, 0, 1, 8, 4.0, 10.0),
+            (today, 'PACKAGED', 0, 0, 0, 0, 0.0, 0.0),
+            (today, 'RAW', 3, 1, 0, 0, 0.0, 0.0),
+        ])
+        rebuild_daily_impact_stats()
+        self.assertEqual([row for row in snapshot() if row[2:] != (0,) * 6], [
+            row for row in incremental if row[2:] != (0,) * 6
+        ])
+
+    def test_buckets_fill_gaps_and_group_by_food_type(self):
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday())
+        DailyImpactStat.objects.create(
+            day=monday - timedelta(days=7), food_type='COOKED', meals_saved=10, food_saved_kg=5
+        )
+        DailyImpactStat.objects.create(
+            day=monday - timedelta(days=6), food_type='RAW', meals_saved=4, food_saved_kg=2.005
+        )
+        DailyImpactStat.objects.create(day=today, food_type='RAW', donations_posted=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stats/timeseries/?bucket=week&group_by=food_type')
+        self.assertEqual(len(queries), 1)
+
+        data = response.json()
+        self.assertEqual(data['from'], (monday - timedelta(weeks=11)).isoformat())
+        self.assertEqual(data['to'], (monday + timedelta(days=6)).isoformat())
+        self.assertEqual(len(data['series']), 12)
+        last_week, this_week = data['series'][-2:]
+        self.assertEqual(last_week['period'], (monday - timedelta(days=7)).isoformat())
+        self.assertEqual((last_week['meals_saved'], last_week['food_saved_kg']), (14, 7.0))
+        self.assertEqual(last_week['by_food_type']['RAW']['food_saved_kg'], 2.0)
+        self.assertEqual(this_week['donations_posted'], 3)
+        self.assertEqual(data['series'][0]['meals_saved'], 0)
+
+        day = (monday - timedelta(days=6)).isoformat()
+        response = self.client.get(f'/api/stats/timeseries/?from={day}&to={day}&food_type=RAW')
+        self.assertEqual(response.json()['series'], [{
+            'period': day, 'donations_posted': 0, 'donations_expired': 0, 'donations_picked_up': 0,
+            'meals_saved': 4, 'food_saved_kg': 2.0, 'co2_saved_kg': 0,
+        }])
+        response = self.client.get('/api/stats/timeseries/?bucket=month&from=2024-01-15&to=2024-03-01')
+        self.assertEqual(
+            [entry['period'] for entry in response.json()['series']],
+            ['2024-01-01', '2024-02-01', '2024-03-01']
+        )
+
+        invalid = [
+            'bucket=year', 'food_type=SOUP', 'group_by=donor', 'from=2024-02-30',
+            'from=2024-02-01&to=2024-01-01', 'from=2000-01-01&to=2024-01-01',
+            'to=9999-12-31', 'bucket=month&from=9999-10-01&to=9999-12-31', 'to=0001-01-05',
+        ]
+        for query in invalid:
+            self.assertEqual(self.client.get(f'/api/stats/timeseries/?{query}').status_code, 400, query)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donors = [User.objects.create(username=f'donor{i}', role='DONOR') for i in range(2)]
+        self.ngos = [User.objects.create(username=f'ngo{i}', role='NGO') for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.donors[0])
+
+    def complete_pickup(self, donor, ngo, quantity_kg):
+        food_request = FoodRequest.objects.create(
+            donation=make_donation(donor, quantity_kg=quantity_kg, status='REQUESTED'),
+            ngo=ngo,
+            pickup_time=timezone.now(),
+            status='APPROVED',
+        )
+        client = APIClient()
+        client.force_authenticate(ngo)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/requests/{food_request.pk}/complete_pickup/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_completed_pickups_update_boards_and_match_rebuild(self):
+        self.complete_pickup(self.donors[0], self.ngos[0], 4)
+        self.complete_pickup(self.donors[1], self.ngos[0], 10)
+        self.complete_pickup(self.donors[0], self.ngos[1], 2.5)
+
+        def snapshot():
+            return sorted(LeaderboardEntry.objects.values_list(
+                'board', 'period', 'period_key', 'user__username', 'pickups', 'food_saved_kg', 'score'
+            ))
+
+        incremental = snapshot()
+        self.assertEqual(len(incremental), 12)
+        all_time = [row[3:] for row in incremental if row[1] == 'ALL']
+        self.assertEqual(all_time, [
+            ('donor0', 2, 6.5, 6.5), ('donor1', 1, 10.0, 10.0),
+            ('ngo0', 2, 14.0, 2.0), ('ngo1', 1, 2.5, 1.0),
+        ])
+        rebuild_leaderboards()
+        self.assertEqual(snapshot(), incremental)
+
+        response = self.client.get('/api/stats/leaderboard/donors/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['period_start'],
+            (timezone.localdate() - timedelta(days=timezone.localdate().weekday())).isoformat()
+        )
+        self.assertEqual(
+            [(row['rank'], row['username'], row['food_saved_kg']) for row in response.json()['results']],
+            [(1, 'donor1', 10.0), (2, 'donor0', 6.5)]
+        )
+
+    def test_cursor_pages_rank_ties_in_one_scan_each(self):
+        users = self.ngos + [User.objects.create(username=f'ngo{i}', role='NGO') for i in range(2, 5)]
+        for user, score in zip(users, [8, 10, 8, 5, 8]):
+            LeaderboardEntry.objects.create(board='NGO', period='ALL', user=user, pickups=score, score=score)
+
+        ranks = []
+        url = '/api/stats/leaderboard/ngos/?period=all&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # The version counter and the page
+            self.assertEqual(len(queries), 2)
+            ranks += [(row['rank'], row['username']) for row in response.json()['results']]
+            url = response.json()['next']
+
+        self.assertEqual(ranks, [(1, 'ngo1'), (2, 'ngo0'), (2, 'ngo2'), (2, 'ngo4'), (5, 'ngo3')])
+
+        # Cached until the next pickup
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/stats/leaderboard/ngos/?period=all&page_size=2')
+        self.assertEqual(len(queries), 1)
+        for _ in range(4):
+            self.complete_pickup(self.donors[0], users[3], 1)
+        response = self.client.get('/api/stats/leaderboard/ngos/?period=all&page_size=2')
+        self.assertEqual([row['username'] for row in response.json()['results']], ['ngo1', 'ngo3'])
+
+    def test_cached_page_moves_on_with_the_period(self):
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday())
+        LeaderboardEntry.objects.create(
+            board='DONOR', period='WEEK', period_key=monday.isoformat(), user=self.donors[0], score=5
+        )
+        LeaderboardEntry.objects.create(
+            board='DONOR', period='WEEK', period_key=(monday + timedelta(days=7)).isoformat(),
+            user=self.donors[1], score=3
+        )
+        response = self.client.get('/api/stats/leaderboard/donors/')
+        self.assertEqual([row['username'] for row in response.json()['results']], ['donor0'])
+
+        with mock.patch('django.utils.timezone.localdate', return_value=monday + timedelta(days=7)):
+            response = self.client.get('/api/stats/leaderboard/donors/')
+        self.assertEqual([row['username'] for row in response.json()['results']], ['donor1'])
+
+    @override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+    def test_cursor_links_follow_the_request_host(self):
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday())
+        for i, donor in enumerate(self.donors):
+            LeaderboardEntry.objects.create(
+                board='DONOR', period='WEEK', period_key=monday.isoformat(), user=donor, score=i + 1
+            )
+
+        for host in ['a.example', 'b.example']:
+            response = self.client.get('/api/stats/leaderboard/donors/?page_size=1', HTTP_HOST=host)
+            self.assertTrue(response.json()['next'].startswith(f'http://{host}/'))
+
+    def test_rejects_unknown_boards_periods_and_cursors(self):
+        self.assertEqual(self.client.get('/api/stats/leaderboard/volunteers/').status_code, 404)
+        self.assertEqual(self.client.get('/api/stats/leaderboard/donors/?period=year').status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/leaderboard/donors/?date=2024-02-30').status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/leaderboard/donors/?cursor=bm9wZQ').status_code, 404)
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """Refuses mail to bad@ addresses, calls on_send before each message."""
+
+    sent = []
+    on_send = None
+
+    def send_messages(self, messages):
+        for message in messages:
+            if FlakyEmailBackend.on_send:
+                FlakyEmailBackend.on_send()
+            if message.to[0].startswith('bad@'):
+                raise SMTPRecipientsRefused({message.to[0]: (550, b'Mailbox unavailable')})
+            self.sent.append(message.to[0])
+        return len(messages)
+
+
+@override_settings(EMAIL_BACKEND='core.tests.FlakyEmailBackend')
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        FlakyEmailBackend.sent = []
+        FlakyEmailBackend.on_send = None
+
+    def queue(self, recipient):
+        return NotificationOutbox.objects.create(recipient=recipient, subject='Food', message='Rice')
+
+    def test_batch_is_leased_before_sending(self):
+        self.queue('ngo@example.com')
+        self.queue('other@example.com')
+        concurrent = []
+        # A second worker polling while the first one sends finds nothing due
+        FlakyEmailBackend.on_send = lambda: concurrent.append(send_pending_notifications()['processed'])
+
+        stats = send_pending_notifications(lease_seconds=300)
+
+        self.assertEqual((stats['processed'], stats['sent']), (2, 2))
+        self.assertEqual(concurrent, [0, 0])
+        self.assertEqual(FlakyEmailBackend.sent, ['ngo@example.com', 'other@example.com'])
+        self.assertEqual(
+            set(NotificationOutbox.objects.values_list('status', flat=True)), {'SENT'}
+        )
+
+    def test_failures_back_off_until_max_attempts(self):
+        bad = self.queue('bad@example.com')
+        self.queue('ngo@example.com')
+
+        def run():
+            before = timezone.now()
+            stats = send_pending_notifications(max_attempts=3, retry_delay_seconds=60)
+            bad.refresh_from_db()
+            return stats, (bad.next_attempt_at - before).total_seconds()
+
+        stats, delay = run()
+        self.assertEqual((stats['sent'], stats['retried'], stats['failed']), (1, 1, 0))
+        self.assertEqual((bad.status, bad.attempts), ('PENDING', 1))
+        self.assertIn('Mailbox unavailable', bad.last_error)
+        self.assertAlmostEqual(delay, 60, delta=5)
+
+        # Not due yet
+        self.assertEqual(send_pending_notifications()['processed'], 0)
+
+        NotificationOutbox.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        stats, delay = run()
+        self.assertEqual((stats['processed'], stats['retried'], bad.attempts), (1, 1, 2))
+        self.assertAlmostEqual(delay, 120, delta=5)
+
+        NotificationOutbox.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        stats, _ = run()
+        self.assertEqual((stats['failed'], bad.status, bad.attempts), (1, 'FAILED', 3))
+
+        NotificationOutbox.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_pending_notifications()['processed'], 0)
+        self.assertEqual(FlakyEmailBackend.sent, ['ngo@example.com'])
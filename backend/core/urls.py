@@ -2,18 +2,32 @@ from rest_framework.routers import DefaultRouter
 from django.urls import path
 from .views import (
     DonationViewSet, 
+    ExportView,
     FoodRequestViewSet,
     ImpactStatsView,
+    LeaderboardView,
     HeatmapDataView,
-    RatingViewSet
+    MatchDonationsView,
+    MetricsView,
+    RatingViewSet,
+    TimeseriesStatsView,
 )
+from .streams import donation_stream
 
 router = DefaultRouter()
 router.register("donations", DonationViewSet, basename="donation")
 router.register("requests", FoodRequestViewSet, basename="request")
 router.register("ratings", RatingViewSet, basename="rating")
 
-urlpatterns = router.urls + [
+urlpatterns = [
+    # Ahead of the router so "stream" is not taken for a donation id
+    path("donations/stream/", donation_stream, name="donation-stream"),
+] + router.urls + [
     path("stats/impact/", ImpactStatsView.as_view(), name="impact-stats"),
+    path("stats/timeseries/", TimeseriesStatsView.as_view(), name="timeseries-stats"),
+    path("stats/leaderboard/<slug:board>/", LeaderboardView.as_view(), name="leaderboard"),
     path("stats/heatmap/", HeatmapDataView.as_view(), name="heatmap-data"),
+    path("dispatch/match/", MatchDonationsView.as_view(), name="match-donations"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("export/<slug:resource>.<slug:export_format>", ExportView.as_view(), name="export"),
 ]
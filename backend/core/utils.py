@@ -1,26 +1,284 @@
+import csv
+import io
 import math
+from datetime import date, timedelta
+
+import numpy as np
+
+R = 6371  # Earth radius in km
+
+
+def haversine_distances(lat, lon, lats, lons):
+    """
+    Calculate distances in kilometers from one origin to N points
+    using the Haversine formula.
+
+    Returns an unrounded float ndarray aligned with lats/lons.
+    """
+
+    lat = np.radians(float(lat))
+    lon = np.radians(float(lon))
+    lats = np.radians(np.asarray(lats, dtype=float))
+    lons = np.radians(np.asarray(lons, dtype=float))
+
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    )
+
+    return 2 * R * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """
+    Calculate the N x M matrix of distances in kilometers between two
+    sets of coordinates using the Haversine formula.
+    """
+
+    lats1 = np.radians(np.asarray(lats1, dtype=float))[:, np.newaxis]
+    lons1 = np.radians(np.asarray(lons1, dtype=float))[:, np.newaxis]
+    lats2 = np.radians(np.asarray(lats2, dtype=float))[np.newaxis, :]
+    lons2 = np.radians(np.asarray(lons2, dtype=float))[np.newaxis, :]
+
+    a = (
+        np.sin((lats2 - lats1) / 2) ** 2
+        + np.cos(lats1) * np.cos(lats2) * np.sin((lons2 - lons1) / 2) ** 2
+    )
+
+    return 2 * R * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calculate distance between two coordinates in kilometers
     using Haversine formula
-    """
-
-    R = 6371  # Earth radius in km
 
-    lat1 = math.radians(lat1)
-    lon1 = math.radians(lon1)
-    lat2 = math.radians(lat2)
-    lon2 = math.radians(lon2)
+    Plain math for single pairs, which NumPy's per-call overhead would
+    make several times slower; use haversine_distances for many points.
+    """
 
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
+    lat1 = math.radians(float(lat1))
+    lon1 = math.radians(float(lon1))
+    lat2 = math.radians(float(lat2))
+    lon2 = math.radians(float(lon2))
 
     a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
     )
 
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return round(2 * R * math.asin(math.sqrt(min(max(a, 0), 1))), 2)
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) of a box that fully
+    contains the circle of radius_km around the given point.
+
+    The longitude bounds are None when the box would wrap around the
+    poles or the antimeridian; callers should then filter on latitude only.
+    """
+
+    lat = float(lat)
+    lon = float(lon)
+
+    dlat = math.degrees(radius_km / R)
+    min_lat = lat - dlat
+    max_lat = lat + dlat
+
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+
+    ratio = math.sin(radius_km / R) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, None, None
+
+    dlon = math.degrees(math.asin(ratio))
+    min_lon = lon - dlon
+    max_lon = lon + dlon
+
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def lat_lng_to_tile(lat, lon, zoom):
+    """
+    Return the (x, y) slippy map tile containing the given point
+    at the given zoom level.
+    """
+
+    n = 2 ** zoom
+    lat = min(max(float(lat), -85.0511), 85.0511)
+    lat_rad = math.radians(lat)
+
+    x = int((float(lon) + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * n)
+
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_center(x, y, zoom):
+    """Return the (lat, lon) of the center of a slippy map tile."""
+
+    n = 2 ** zoom
+    lon = (x + 0.5) / n * 360 - 180
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+
+    return lat, lon
+
+
+def period_start(day, bucket):
+    """First day of the 'day', 'week' (Monday) or 'month' holding day."""
+
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def shift_period(start, bucket, periods):
+    """The period start the given number of periods after (or before) start."""
+
+    if bucket == "week":
+        return start + timedelta(weeks=periods)
+    if bucket == "month":
+        months = start.year * 12 + start.month - 1 + periods
+        return date(months // 12, months % 12 + 1, 1)
+    return start + timedelta(days=periods)
+
+
+def read_csv_rows(uploaded_file, limit):
+    """
+    Stream rows from an uploaded CSV file as dicts, dropping empty cells.
+
+    Stops after limit + 1 rows so callers can reject oversized uploads
+    without reading the whole file. Raises ValueError when the file is not
+    UTF-8 text or not valid CSV.
+    """
+
+    reader = csv.DictReader(io.TextIOWrapper(uploaded_file, encoding="utf-8-sig"))
+
+    rows = []
+    try:
+        for row in reader:
+            rows.append({key: value for key, value in row.items() if key and value not in ("", None)})
+            if len(rows) > limit:
+                break
+    except UnicodeDecodeError:
+        raise ValueError("The file must be UTF-8 encoded.")
+    except csv.Error as exc:
+        raise ValueError(f"The file is not valid CSV: {exc}.")
+
+    return rows
+
+
+def route_schedule(route, distances, ready, due, speed_kmh, service_hours=0.0):
+    """
+    Walk a route that starts at point 0 and visits the points in route.
+
+    distances is a matrix in km over point 0 and every stop, ready/due
+    are per point hours from departure. Returns the service start time
+    of each stop, the number of stops reached after their due time and
+    the total distance.
+    """
+
+    clock = 0.0
+    position = 0
+    late = 0
+    total_km = 0.0
+    starts = []
+    for stop in route:
+        total_km += distances[position][stop]
+        clock = max(clock + distances[position][stop] / speed_kmh, ready[stop])
+        if clock > due[stop]:
+            late += 1
+        starts.append(clock)
+        clock += service_hours
+        position = stop
+
+    return starts, late, total_km
+
+
+def order_stops(distances, ready, due, speed_kmh, service_hours=0.0, max_passes=20):
+    """
+    Order stops 1..n for a route starting at point 0, honoring their
+    time windows: a travelling salesman heuristic with time windows.
+
+    The route is built by going to the stop that can be served earliest
+    among those that still leave every other stop reachable in time,
+    then improved by 2-opt moves that shorten it without adding late
+    stops. Returns the ordered stop indexes.
+    """
+
+    matrix = np.asarray(distances, dtype=float)
+    ready = np.asarray(ready, dtype=float)
+    due = np.asarray(due, dtype=float)
+    distances = matrix.tolist()
+
+    route = []
+    remaining = np.arange(1, len(matrix))
+    clock = 0.0
+    position = 0
+    while len(remaining):
+        starts = np.maximum(clock + matrix[position, remaining] / speed_kmh, ready[remaining])
+        on_time = starts <= due[remaining]
+
+        # Serving a stop first is safe if every other stop that can
+        # still be reached on time can be reached right after it
+        then = (starts + service_hours)[:, np.newaxis] + matrix[np.ix_(remaining, remaining)] / speed_kmh
+        keeps = (then <= due[remaining][np.newaxis, :]) | ~on_time[np.newaxis, :]
+        np.fill_diagonal(keeps, True)
+        safe = on_time & keeps.all(axis=1)
+
+        if safe.any():
+            candidates = np.flatnonzero(safe)
+        elif on_time.any():
+            # Something will be late anyway, rescue the most urgent stop
+            candidates = np.flatnonzero(on_time)
+            candidates = candidates[due[remaining][candidates] == due[remaining][candidates].min()]
+        else:
+            candidates = np.arange(len(remaining))
+
+        best = candidates[np.lexsort((due[remaining][candidates], starts[candidates]))[0]]
+        stop = int(remaining[best])
+        clock = starts[best] + service_hours
+        position = stop
+        route.append(stop)
+        remaining = np.delete(remaining, best)
+
+    ready = ready.tolist()
+    due = due.tolist()
+
+    _, late, _ = route_schedule(route, distances, ready, due, speed_kmh, service_hours)
+
+    # 2-opt: reversing route[i..j] swaps edges (a, b) + (c, e) for
+    # (a, c) + (b, e); the route is open so the last stop has no e.
+    for _ in range(max_passes):
+        improved = False
+        for i in range(len(route) - 1):
+            a = route[i - 1] if i else 0
+            b = route[i]
+            for j in range(i + 1, len(route)):
+                c = route[j]
+                e = route[j + 1] if j + 1 < len(route) else None
+                delta = distances[a][c] - distances[a][b]
+                if e is not None:
+                    delta += distances[b][e] - distances[c][e]
+                if delta >= -1e-9:
+                    continue
+
+                candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                _, candidate_late, _ = route_schedule(
+                    candidate, distances, ready, due, speed_kmh, service_hours
+                )
+                if candidate_late <= late:
+                    route, late = candidate, candidate_late
+                    b = route[i]
+                    improved = True
+        if not improved:
+            break
 
-    return round(R * c, 2)
+    return route
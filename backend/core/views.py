@@ -1,24 +1,92 @@
+import hashlib
+import math
+from datetime import datetime, time, timedelta
+
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.decorators import action
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from django.utils import timezone
-from django.db.models import Q, Sum, Count, Avg
-from django.db.models.functions import TruncDate
+from django.db import transaction
+from django.db.models import Q, Sum, Avg, F
+from django.db.models.functions import TruncMonth, TruncWeek
 
-from .models import Donation, FoodRequest, ImpactLog, Rating
+from .models import (
+    DailyImpactStat, Donation, FoodRequest, FoodRiskAssessment, HeatmapCell, ImpactRollup, LeaderboardEntry, Rating,
+)
 from .serializers import (
     DonationSerializer, 
     FoodRequestSerializer, 
     RegisterSerializer,
     ImpactSerializer,
-    RatingSerializer
+    RatingSerializer,
+    is_selected,
+    parse_sparse_fields,
+)
+from .exports import CONTENT_TYPES, EXPORTS, encode_csv, encode_ndjson, export_columns, export_rows
+from .metrics import registry
+from .fast_serializers import donation_payloads, donation_values, food_request_payloads, food_request_values
+from .pagination import RequestedAtCursorPagination, ScoreCursorPagination
+from .permissions import IsAdmin, IsDonor, IsNGO
+from .cache import get_version
+from .services import (
+    DAILY_STAT_FIELDS,
+    LEADERBOARD_PERIODS,
+    apply_rating_change,
+    calculate_impact,
+    create_donations_bulk,
+    dispatch_matches,
+    donation_feed_changed,
+    leaderboard_period_key,
+    match_donations,
+    reassess_food_risk,
+    record_daily_stats,
+    record_heatmap_change,
 )
-from .permissions import IsDonor, IsNGO
-from .services import calculate_impact
+from .utils import (
+    haversine_distances,
+    haversine_matrix,
+    lat_lng_to_tile,
+    order_stops,
+    period_start,
+    read_csv_rows,
+    route_schedule,
+    shift_period,
+    tile_center,
+)
+
+
+def get_sparse_fields(request):
+    """The ?fields= / ?expand= selection of a GET request, or None."""
+    if request.method != 'GET':
+        return None
+    return parse_sparse_fields(request.query_params)
+
+
+def get_date_param(request, name):
+    """A YYYY-MM-DD query param as a date, None when absent."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: "Use a YYYY-MM-DD date."})
+    return day
+
+
+def use_fast_list(request):
+    """Whether a list response can be built by core.fast_serializers."""
+    return settings.FAST_LIST_SERIALIZATION and get_sparse_fields(request) is None
 
 
 class DonationViewSet(ModelViewSet):
@@ -28,17 +96,126 @@ class DonationViewSet(ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'DONOR':
-            return Donation.objects.filter(donor=user)
+            queryset = Donation.objects.filter(donor=user)
         elif user.role == 'NGO':
-            # NGOs can see available donations
-            return Donation.objects.filter(status='AVAILABLE').exclude(expiry_time__lt=timezone.now())
-        return Donation.objects.none()
+            # NGOs can see available donations, expired ones are moved out
+            # of AVAILABLE by manage.py expire_donations
+            queryset = Donation.objects.filter(status='AVAILABLE')
+        else:
+            return Donation.objects.none()
+
+        # Donor (with its denormalized rating) and risk in the same query,
+        # unless a sparse fieldset leaves them out
+        sparse = get_sparse_fields(self.request)
+        related = []
+        if is_selected(sparse, 'donor', nested=True) or is_selected(sparse, 'distance_km'):
+            related.append('donor')
+        if is_selected(sparse, 'risk_assessment'):
+            related.append('risk')
+        # select_related() without names would follow every foreign key
+        return queryset.select_related(*related) if related else queryset
+
+    def list(self, request, *args, **kwargs):
+        if request.user.role != 'NGO':
+            if use_fast_list(request):
+                page = self.paginate_queryset(donation_values(self.filter_queryset(self.get_queryset())))
+                return self.get_paginated_response(donation_payloads(page))
+            return super().list(request, *args, **kwargs)
+
+        # The feed is identical for every NGO apart from distance_km, so the
+        # page is cached without it, keyed by a version bumped whenever a
+        # donation changes, and the distances are filled in per request.
+        # Pagination links are absolute, so scheme and host are part of the key.
+        version = get_version('donation_feed')
+        url = request.build_absolute_uri()
+        etag = '"{}"'.format(hashlib.md5(
+            f"{version}:{request.user.latitude}:{request.user.longitude}:{url}".encode()
+        ).hexdigest())
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        if get_sparse_fields(request) is not None:
+            # Sparse pages are serialized per request, the cached page
+            # needs donor coordinates for the distances filled in below
+            response = super().list(request, *args, **kwargs)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        cache_key = f"donation_feed:{version}:{hashlib.md5(url.encode()).hexdigest()}"
+        data = cache.get(cache_key)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            if use_fast_list(request):
+                results = donation_payloads(self.paginate_queryset(donation_values(queryset)))
+            else:
+                results = self.get_serializer(
+                    self.paginate_queryset(queryset),
+                    many=True,
+                    context={**self.get_serializer_context(), 'omit_distance': True}
+                ).data
+            data = self.get_paginated_response(results).data
+            cache.set(cache_key, data, settings.DONATION_FEED_CACHE_TIMEOUT)
+
+        self._add_distances(data['results'])
+
+        return Response(data, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+    def _add_distances(self, donations):
+        ngo = self.request.user
+        located = [
+            donation for donation in donations
+            if donation['donor']['latitude'] and donation['donor']['longitude']
+        ]
+        if not (ngo.latitude and ngo.longitude and located):
+            return
+
+        distances = haversine_distances(
+            ngo.latitude,
+            ngo.longitude,
+            [donation['donor']['latitude'] for donation in located],
+            [donation['donor']['longitude'] for donation in located],
+        ).round(2)
+        for donation, km in zip(located, distances):
+            donation['distance_km'] = float(km)
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'bulk', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsDonor()]
         return [IsAuthenticated()]
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Donor creates many donations from a JSON array or a CSV upload ('file')"""
+        limit = settings.BULK_DONATION_MAX_ITEMS
+
+        if 'file' in request.FILES:
+            try:
+                items = read_csv_rows(request.FILES['file'], limit)
+            except ValueError as exc:
+                raise ValidationError({'file': str(exc)})
+        elif isinstance(request.data, list):
+            items = request.data
+        else:
+            raise ValidationError("Send a JSON array of donations or a CSV file named 'file'.")
+
+        if not items:
+            raise ValidationError("No donations to create.")
+        if len(items) > limit:
+            raise ValidationError(f"At most {limit} donations can be created at once.")
+
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        donations = create_donations_bulk(request.user, serializer.validated_data)
+
+        return Response(
+            self.get_serializer(donations, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+
     def perform_update(self, serializer):
         donation = self.get_object()
 
@@ -47,7 +224,27 @@ class DonationViewSet(ModelViewSet):
                 "Donation cannot be modified after it has been requested."
             )
 
-        serializer.save()
+        previous_quantity = donation.quantity_kg
+        previous_food_type = donation.food_type
+        previous_risk_inputs = (donation.food_type, donation.cooked_time, donation.expiry_time)
+        with transaction.atomic():
+            donation = serializer.save()
+            if (donation.food_type, donation.cooked_time, donation.expiry_time) != previous_risk_inputs:
+                reassess_food_risk(donation)
+            if donation.quantity_kg != previous_quantity:
+                record_heatmap_change(donation, 0, donation.quantity_kg - previous_quantity)
+            if donation.food_type != previous_food_type:
+                day = timezone.localdate(donation.created_at)
+                record_daily_stats(day, previous_food_type, donations_posted=-1)
+                record_daily_stats(day, donation.food_type, donations_posted=1)
+            donation_feed_changed([donation.pk])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        record_heatmap_change(instance, -1, -instance.quantity_kg)
+        record_daily_stats(timezone.localdate(instance.created_at), instance.food_type, donations_posted=-1)
+        donation_feed_changed([instance.pk])
+        instance.delete()
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -58,21 +255,118 @@ class DonationViewSet(ModelViewSet):
 class FoodRequestViewSet(ModelViewSet):
     serializer_class = FoodRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = RequestedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'NGO':
-            return FoodRequest.objects.filter(ngo=user)
+            queryset = FoodRequest.objects.filter(ngo=user)
         elif user.role == 'DONOR':
             # Donors can see requests for their donations
-            return FoodRequest.objects.filter(donation__donor=user)
-        return FoodRequest.objects.none()
+            queryset = FoodRequest.objects.filter(donation__donor=user)
+        else:
+            return FoodRequest.objects.none()
+
+        # Join only the nested objects the response renders
+        sparse = get_sparse_fields(self.request)
+        related = []
+        if is_selected(sparse, 'ngo', nested=True):
+            related.append('ngo')
+        if is_selected(sparse, 'donation', nested=True):
+            related.append('donation')
+            if is_selected(sparse, 'donation.donor', nested=True) or is_selected(sparse, 'donation.distance_km'):
+                related.append('donation__donor')
+            if is_selected(sparse, 'donation.risk_assessment'):
+                related.append('donation__risk')
+        return queryset.select_related(*related) if related else queryset
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'route']:
             return [IsAuthenticated(), IsNGO()]
         return [IsAuthenticated()]
 
+    def list(self, request, *args, **kwargs):
+        if not use_fast_list(request):
+            return super().list(request, *args, **kwargs)
+
+        # Nested donations carry the distance from a located NGO
+        user = request.user
+        ngo = user if user.role == 'NGO' and user.latitude and user.longitude else None
+
+        page = self.paginate_queryset(food_request_values(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(food_request_payloads(page, ngo))
+
+    @action(detail=False, methods=["get"])
+    def route(self, request):
+        """NGO gets its approved pickups in a suggested visiting order"""
+        ngo = request.user
+        if ngo.latitude is None or ngo.longitude is None:
+            raise ValidationError("Set your location to plan a pickup route.")
+
+        food_requests = list(
+            FoodRequest.objects.filter(ngo=ngo, status='APPROVED')
+            .select_related('donation__donor')
+            .order_by('id')
+        )
+        routable = [
+            food_request for food_request in food_requests
+            if food_request.donation.donor.latitude is not None
+            and food_request.donation.donor.longitude is not None
+        ]
+        routable_ids = {food_request.pk for food_request in routable}
+
+        now = timezone.now()
+
+        def hours(moment):
+            return (moment - now).total_seconds() / 3600
+
+        lats = [ngo.latitude] + [r.donation.donor.latitude for r in routable]
+        lons = [ngo.longitude] + [r.donation.donor.longitude for r in routable]
+        distances = haversine_matrix(lats, lons, lats, lons).tolist()
+        ready = [0.0] + [hours(r.pickup_time) for r in routable]
+        due = [float('inf')] + [hours(r.donation.expiry_time) for r in routable]
+        speed_kmh = settings.ROUTE_SPEED_KMH
+        service_hours = settings.ROUTE_STOP_MINUTES / 60
+
+        # The order only depends on where the NGO is and which requests,
+        # with which pickup times, it has approved
+        cache_key = 'route:{}'.format(hashlib.md5(
+            f"{ngo.pk}:{ngo.latitude}:{ngo.longitude}:".encode()
+            + ','.join(f"{r.pk}@{r.pickup_time.isoformat()}" for r in routable).encode()
+        ).hexdigest())
+        order = cache.get(cache_key)
+        if order is None:
+            order = order_stops(distances, ready, due, speed_kmh, service_hours)
+            cache.set(cache_key, order, settings.ROUTE_CACHE_TIMEOUT)
+
+        starts, _, total_km = route_schedule(order, distances, ready, due, speed_kmh, service_hours)
+
+        stops = []
+        position = 0
+        for stop, start in zip(order, starts):
+            food_request = routable[stop - 1]
+            stops.append({
+                'request_id': food_request.pk,
+                'donation_id': food_request.donation_id,
+                'latitude': food_request.donation.donor.latitude,
+                'longitude': food_request.donation.donor.longitude,
+                'leg_distance_km': round(distances[position][stop], 2),
+                'arrival': now + timedelta(hours=start),
+                'pickup_time': food_request.pickup_time,
+                'expiry_time': food_request.donation.expiry_time,
+                'late': start > due[stop],
+            })
+            position = stop
+
+        return Response({
+            'total_distance_km': round(total_km, 2),
+            'stops': stops,
+            # Donors without a location cannot be placed on the route
+            'unrouted_request_ids': [
+                r.pk for r in food_requests if r.pk not in routable_ids
+            ],
+        })
+
     @action(detail=True, methods=["post"])
     def approve(self, request, pk=None):
         """Donor approves a food request"""
@@ -85,7 +379,7 @@ class FoodRequestViewSet(ModelViewSet):
             raise ValidationError("Request is not pending.")
         
         food_request.status = "APPROVED"
-        food_request.save()
+        food_request.save(update_fields=["status"])
         
         return Response(
             {"message": "Request approved successfully"},
@@ -107,13 +401,21 @@ class FoodRequestViewSet(ModelViewSet):
         if food_request.status != "APPROVED":
             raise ValidationError("Pickup must be approved before completion.")
 
-        food_request.status = "COMPLETED"
-        food_request.save()
+        with transaction.atomic():
+            # Conditional so a repeated submit cannot record the impact twice
+            completed = FoodRequest.objects.filter(
+                pk=food_request.pk, status="APPROVED"
+            ).update(status="COMPLETED")
+            if not completed:
+                raise ValidationError("Pickup already completed.")
 
-        donation.status = "PICKED_UP"
-        donation.save()
+            donation.status = "PICKED_UP"
+            donation.save(update_fields=["status"])
+            # Picked up food needs no further risk reviews
+            FoodRiskAssessment.objects.filter(donation=donation).update(next_review_at=None)
+            donation_feed_changed([donation.pk])
 
-        calculate_impact(donation)
+            calculate_impact(donation, ngo_id=food_request.ngo_id)
 
         return Response(
             {"message": "Pickup completed successfully"},
@@ -146,48 +448,324 @@ class ImpactStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        total_impact = ImpactLog.objects.aggregate(
-            total_meals=Sum('meals_saved'),
-            total_food_kg=Sum('food_saved_kg'),
-            total_co2_kg=Sum('co2_saved_kg')
-        )
-        
-        donations_count = Donation.objects.filter(status='PICKED_UP').count()
+        # Single-row read of the rollup kept by calculate_impact
+        totals = ImpactRollup.objects.filter(scope='GLOBAL', key='').first()
         
         return Response({
-            'total_meals_saved': total_impact['total_meals'] or 0,
-            'total_food_saved_kg': total_impact['total_food_kg'] or 0,
-            'total_co2_saved_kg': total_impact['total_co2_kg'] or 0,
-            'total_donations': donations_count
+            'total_meals_saved': totals.meals_saved if totals else 0,
+            'total_food_saved_kg': totals.food_saved_kg if totals else 0,
+            'total_co2_saved_kg': totals.co2_saved_kg if totals else 0,
+            'total_donations': totals.donations_count if totals else 0
         })
 
 
-class HeatmapDataView(APIView):
+class TimeseriesStatsView(APIView):
+    """
+    Posted, expired and picked up donations with meals, kg and CO2 saved
+    per day, week (from Monday) or month, read from DailyImpactStat.
+
+    Query params: bucket (day, week or month), from and to (YYYY-MM-DD,
+    widened to whole periods; the last 30 days, 12 weeks or 12 months by
+    default), food_type to count only one, and group_by=food_type to
+    break each period down. Periods without activity are zero.
+    """
     permission_classes = [IsAuthenticated]
 
+    BUCKETS = {
+        'day': F('day'),
+        'week': TruncWeek('day'),
+        'month': TruncMonth('day'),
+    }
+    DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}
+
     def get(self, request):
-        # Get donations grouped by location
-        donations = Donation.objects.filter(
-            donor__latitude__isnull=False,
-            donor__longitude__isnull=False
-        ).values('donor__latitude', 'donor__longitude').annotate(
-            count=Count('id'),
-            total_quantity=Sum('quantity_kg')
+        params = request.query_params
+        bucket = params.get('bucket', 'day')
+        if bucket not in self.BUCKETS:
+            raise ValidationError("bucket must be day, week or month.")
+
+        food_types = [value for value, _ in Donation.FOOD_TYPE_CHOICES]
+        food_type = params.get('food_type')
+        if food_type and food_type not in food_types:
+            raise ValidationError(f"food_type must be one of {', '.join(food_types)}.")
+        group_by = params.get('group_by')
+        if group_by and group_by != 'food_type':
+            raise ValidationError("group_by must be food_type.")
+
+        last = period_start(get_date_param(request, 'to') or timezone.localdate(), bucket)
+        first = get_date_param(request, 'from')
+        try:
+            first = (
+                period_start(first, bucket) if first
+                else shift_period(last, bucket, 1 - self.DEFAULT_PERIODS[bucket])
+            )
+            end = shift_period(last, bucket, 1) - timedelta(days=1)
+        except (OverflowError, ValueError):
+            # Periods reaching past year 1 or 9999
+            raise ValidationError("from and to must leave whole periods within years 1 to 9999.")
+        if first > last:
+            raise ValidationError("from must not be after to.")
+
+        periods = [first]
+        while periods[-1] < last:
+            periods.append(shift_period(periods[-1], bucket, 1))
+            if len(periods) > settings.TIMESERIES_MAX_PERIODS:
+                raise ValidationError(
+                    f"At most {settings.TIMESERIES_MAX_PERIODS} periods, use a shorter range or a coarser bucket."
+                )
+
+        # One range scan over the (day, food_type) index, summed per period
+        stats = DailyImpactStat.objects.filter(day__range=(first, end))
+        if food_type:
+            stats = stats.filter(food_type=food_type)
+        rows = stats.values('food_type', period=self.BUCKETS[bucket]).annotate(
+            **{f'total_{name}': Sum(name) for name in DAILY_STAT_FIELDS}
+        ).order_by()
+
+        series = {period: self._empty(food_types if group_by else None) for period in periods}
+        for row in rows:
+            entry = series[row['period']]
+            targets = [entry, entry['by_food_type'][row['food_type']]] if group_by else [entry]
+            for target in targets:
+                for name in DAILY_STAT_FIELDS:
+                    target[name] += row[f'total_{name}']
+
+        for entry in series.values():
+            for target in [entry, *entry.get('by_food_type', {}).values()]:
+                target['food_saved_kg'] = round(target['food_saved_kg'], 2)
+                target['co2_saved_kg'] = round(target['co2_saved_kg'], 2)
+
+        return Response({
+            'bucket': bucket,
+            'from': first,
+            'to': end,
+            'series': [{'period': period, **entry} for period, entry in series.items()],
+        })
+
+    def _empty(self, food_types):
+        entry = {name: 0 for name in DAILY_STAT_FIELDS}
+        if food_types:
+            entry['by_food_type'] = {value: {name: 0 for name in DAILY_STAT_FIELDS} for value in food_types}
+        return entry
+
+
+class LeaderboardView(APIView):
+    """
+    Donors ranked by kg of food picked up, or NGOs by pickups completed,
+    in one week, month or all time, read from LeaderboardEntry.
+
+    Query params: period (week, month or all; week by default), date
+    (YYYY-MM-DD, a day in the week or month to show, today by default)
+    and cursor / page_size for the next pages. Pages are cached until a
+    pickup is completed.
+    """
+    permission_classes = [IsAuthenticated]
+
+    BOARDS = {'donors': 'DONOR', 'ngos': 'NGO'}
+
+    def get(self, request, board):
+        if board not in self.BOARDS:
+            raise NotFound(f"Leaderboards are {' and '.join(self.BOARDS)}.")
+        period = request.query_params.get('period', 'week').upper()
+        if period not in LEADERBOARD_PERIODS:
+            raise ValidationError("period must be week, month or all.")
+        period_key = leaderboard_period_key(period, get_date_param(request, 'date') or timezone.localdate())
+
+        # period_key as well, ?period=week without ?date moves on to the
+        # new week by itself. The whole URL with host, as the cursor links
+        # in the page are absolute
+        cache_key = 'leaderboard:{}:{}:{}'.format(
+            get_version('leaderboard'), period_key, hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
         )
-        
-        heatmap_data = [
-            {
-                'latitude': float(item['donor__latitude']),
-                'longitude': float(item['donor__longitude']),
-                'count': item['count'],
-                'total_quantity_kg': item['total_quantity']
-            }
-            for item in donations
-        ]
-        
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        paginator = ScoreCursorPagination()
+        entries = paginator.paginate_queryset(
+            LeaderboardEntry.objects.filter(
+                board=self.BOARDS[board], period=period, period_key=period_key
+            ).select_related('user'),
+            request
+        )
+        data = {
+            'board': board,
+            'period': period.lower(),
+            'period_start': period_key or None,
+            'next': paginator.get_next_link(),
+            'results': [
+                {
+                    'rank': entry.rank,
+                    'user_id': entry.user_id,
+                    'username': entry.user.username,
+                    'pickups': entry.pickups,
+                    'food_saved_kg': round(entry.food_saved_kg, 2),
+                }
+                for entry in entries
+            ],
+        }
+
+        cache.set(cache_key, data, settings.LEADERBOARD_CACHE_TIMEOUT)
+        return Response(data)
+
+
+class HeatmapDataView(APIView):
+    """
+    Donation counts bucketed into slippy map tiles.
+
+    Query params: zoom (0 to HEATMAP_BASE_ZOOM, defaults to the base zoom),
+    bbox=min_lon,min_lat,max_lon,max_lat and days (only donations created
+    in the last N days). Responses are cached until a donation changes.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        base_zoom = settings.HEATMAP_BASE_ZOOM
+        try:
+            zoom = int(request.query_params.get('zoom', base_zoom))
+            days = request.query_params.get('days')
+            days = int(days) if days else None
+            bbox = request.query_params.get('bbox')
+            bbox = [float(value) for value in bbox.split(',')] if bbox else None
+        except ValueError:
+            raise ValidationError("zoom and days must be integers, bbox four comma separated numbers.")
+
+        if not 0 <= zoom <= base_zoom:
+            raise ValidationError(f"zoom must be between 0 and {base_zoom}.")
+        if days is not None and days < 1:
+            raise ValidationError("days must be a positive integer.")
+        if bbox is not None and (len(bbox) != 4 or not all(map(math.isfinite, bbox))):
+            raise ValidationError("bbox must be min_lon,min_lat,max_lon,max_lat.")
+
+        cells = HeatmapCell.objects.all()
+        since = None
+        if days:
+            try:
+                since = timezone.localdate() - timedelta(days=days - 1)
+            except OverflowError:
+                raise ValidationError("days reaches back past year 1.")
+            cells = cells.filter(day__gte=since)
+
+        tile_range = 'all'
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            # Tile y grows southwards
+            min_x, min_y = lat_lng_to_tile(max_lat, min_lon, base_zoom)
+            max_x, max_y = lat_lng_to_tile(min_lat, max_lon, base_zoom)
+            tile_range = f'{min_x}-{max_x}-{min_y}-{max_y}'
+            cells = cells.filter(tile_x__range=(min_x, max_x), tile_y__range=(min_y, max_y))
+
+        cache_key = f"heatmap:{get_version('heatmap')}:{zoom}:{since}:{tile_range}"
+        heatmap_data = cache.get(cache_key)
+        if heatmap_data is not None:
+            return Response(heatmap_data)
+
+        shift = base_zoom - zoom
+        tiles = cells.values(
+            x=F('tile_x').bitrightshift(shift) if shift else F('tile_x'),
+            y=F('tile_y').bitrightshift(shift) if shift else F('tile_y'),
+        ).annotate(
+            count=Sum('donations_count'),
+            total_quantity=Sum('total_quantity_kg')
+        ).filter(count__gt=0).order_by()
+
+        heatmap_data = []
+        for tile in tiles:
+            latitude, longitude = tile_center(tile['x'], tile['y'], zoom)
+            heatmap_data.append({
+                'latitude': round(latitude, 6),
+                'longitude': round(longitude, 6),
+                'count': tile['count'],
+                'total_quantity_kg': tile['total_quantity'],
+                'zoom': zoom,
+                'x': tile['x'],
+                'y': tile['y'],
+            })
+
+        cache.set(cache_key, heatmap_data, settings.HEATMAP_CACHE_TIMEOUT)
         return Response(heatmap_data)
 
 
+class MatchDonationsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        """Preview the batch assignment of available donations to NGOs"""
+        return Response(self._match(request.query_params))
+
+    def post(self, request):
+        """
+        Compute the assignment, record each match as a PENDING request
+        from its NGO and notify every matched NGO
+        """
+        if not isinstance(request.data, dict):
+            raise ValidationError("Send a JSON object.")
+        result = self._match(request.data)
+        result['dispatched'] = len(dispatch_matches(result['assignments']))
+        return Response(result)
+
+    def _match(self, params):
+        radius_km = params.get('radius_km')
+        if radius_km is not None:
+            try:
+                radius_km = float(radius_km)
+            except (TypeError, ValueError):
+                raise ValidationError("radius_km must be a number.")
+            if not math.isfinite(radius_km) or radius_km <= 0:
+                raise ValidationError("radius_km must be a positive number.")
+        return match_donations(radius_km=radius_km)
+
+
+class MetricsView(APIView):
+    """
+    Request metrics of this process in the Prometheus text format, see
+    core.middleware.RequestMetricsMiddleware.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        if not settings.REQUEST_METRICS:
+            raise NotFound("Request metrics are disabled, set REQUEST_METRICS=1.")
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ExportView(APIView):
+    """
+    Full history of impact-logs, donations or requests as .csv or
+    .ndjson, streamed in id order. ?from= and ?to= (YYYY-MM-DD,
+    inclusive) limit it to rows created on those days.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request, resource, export_format):
+        if resource not in EXPORTS or export_format not in CONTENT_TYPES:
+            raise NotFound(
+                f"Export one of {', '.join(EXPORTS)} as {' or '.join(CONTENT_TYPES)}."
+            )
+
+        start, end = self._day_bound('from', 0), self._day_bound('to', 1)
+        chunk_size = settings.EXPORT_CHUNK_SIZE
+        # Nothing is queried until the response starts streaming
+        rows = export_rows(resource, start, end, chunk_size)
+        encode = encode_csv if export_format == 'csv' else encode_ndjson
+
+        response = StreamingHttpResponse(
+            encode(export_columns(resource), rows, chunk_size),
+            content_type=CONTENT_TYPES[export_format]
+        )
+        days = '-'.join(request.query_params[name] for name in ('from', 'to') if request.query_params.get(name))
+        filename = f"{resource}-{days}" if days else resource
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _day_bound(self, name, days_after):
+        day = get_date_param(self.request, name)
+        if day is None:
+            return None
+        return timezone.make_aware(datetime.combine(day + timedelta(days=days_after), time.min))
+
+
 class RatingViewSet(ModelViewSet):
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated]
@@ -197,11 +775,35 @@ class RatingViewSet(ModelViewSet):
         rated_user_id = self.request.query_params.get('rated_user')
         
         if rated_user_id:
-            return Rating.objects.filter(rated_user_id=rated_user_id)
-        return Rating.objects.filter(rated_user=user)
+            queryset = Rating.objects.filter(rated_user_id=rated_user_id)
+        else:
+            queryset = Rating.objects.filter(rated_user=user)
+
+        sparse = get_sparse_fields(self.request)
+        related = [
+            name for name in ['rated_by', 'rated_user']
+            if is_selected(sparse, name, nested=True)
+        ]
+        return queryset.select_related(*related) if related else queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        rating = serializer.save()
+        apply_rating_change(rating.rated_user_id, 1, rating.rating)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous = serializer.instance.rating
+        rating = serializer.save()
+        apply_rating_change(rating.rated_user_id, 0, rating.rating - previous)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        apply_rating_change(instance.rated_user_id, -1, -instance.rating)
+        instance.delete()
+
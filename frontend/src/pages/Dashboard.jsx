@@ -18,7 +18,7 @@ const Dashboard = () => {
     queryKey: ['donations', user?.role],
     queryFn: async () => {
       const response = await api.get('/api/donations/')
-      return response.data
+      return response.data.results
     },
     enabled: !!user,
   })
@@ -27,7 +27,7 @@ const Dashboard = () => {
     queryKey: ['requests', user?.role],
     queryFn: async () => {
       const response = await api.get('/api/requests/')
-      return response.data
+      return response.data.results
     },
     enabled: !!user,
   })
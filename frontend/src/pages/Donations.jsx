@@ -1,7 +1,7 @@
 import { useState } from 'react'
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 import { useAuth } from '../contexts/AuthContext'
-import api from '../services/api'
+import api, { fetchPage } from '../services/api'
 import './Donations.css'
 
 const Donations = () => {
@@ -16,14 +16,20 @@ const Donations = () => {
     expiry_time: '',
   })
 
-  const { data: donations, isLoading } = useQuery({
-    queryKey: ['donations', user?.role],
-    queryFn: async () => {
-      const response = await api.get('/api/donations/')
-      return response.data
-    },
+  const {
+    data,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['donations', user?.role, 'pages'],
+    queryFn: fetchPage,
+    initialPageParam: '/api/donations/?page_size=50',
+    getNextPageParam: (lastPage) => lastPage.next,
     enabled: !!user,
   })
+  const donations = data?.pages.flatMap((page) => page.results)
 
   const createMutation = useMutation({
     mutationFn: async (data) => {
@@ -164,6 +170,16 @@ const Donations = () => {
           <p>No donations available</p>
         )}
       </div>
+
+      {hasNextPage && (
+        <button
+          className="load-more"
+          onClick={() => fetchNextPage()}
+          disabled={isFetchingNextPage}
+        >
+          {isFetchingNextPage ? 'Loading...' : 'Load more'}
+        </button>
+      )}
     </div>
   )
 }
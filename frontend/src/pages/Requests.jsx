@@ -1,7 +1,7 @@
 import { useState } from 'react'
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 import { useAuth } from '../contexts/AuthContext'
-import api from '../services/api'
+import api, { fetchAllPages, fetchPage } from '../services/api'
 import './Requests.css'
 
 const Requests = () => {
@@ -11,20 +11,27 @@ const Requests = () => {
   const [selectedDonation, setSelectedDonation] = useState(null)
   const [pickupTime, setPickupTime] = useState('')
 
-  const { data: requests, isLoading: requestsLoading } = useQuery({
-    queryKey: ['requests', user?.role],
-    queryFn: async () => {
-      const response = await api.get('/api/requests/')
-      return response.data
-    },
+  const {
+    data: requestPages,
+    isLoading: requestsLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['requests', user?.role, 'pages'],
+    queryFn: fetchPage,
+    initialPageParam: '/api/requests/?page_size=50',
+    getNextPageParam: (lastPage) => lastPage.next,
     enabled: !!user,
   })
+  const requests = requestPages?.pages.flatMap((page) => page.results)
 
+  // Every page, the select has to offer all of them
   const { data: availableDonations } = useQuery({
     queryKey: ['donations', 'available'],
     queryFn: async () => {
-      const response = await api.get('/api/donations/')
-      return response.data.filter((d) => d.status === 'AVAILABLE')
+      const donations = await fetchAllPages('/api/donations/?page_size=100')
+      return donations.filter((d) => d.status === 'AVAILABLE')
     },
     enabled: !!user && user?.role === 'NGO',
   })
@@ -202,6 +209,16 @@ const Requests = () => {
           <p>No requests yet</p>
         )}
       </div>
+
+      {hasNextPage && (
+        <button
+          className="load-more"
+          onClick={() => fetchNextPage()}
+          disabled={isFetchingNextPage}
+        >
+          {isFetchingNextPage ? 'Loading...' : 'Load more'}
+        </button>
+      )}
     </div>
   )
 }
@@ -45,5 +45,23 @@ api.interceptors.response.use(
   }
 )
 
+// List endpoints are cursor paginated: { next, previous, results }.
+// fetchPage is a useInfiniteQuery queryFn, the page param being a URL
+export const fetchPage = async ({ pageParam }) => {
+  const response = await api.get(pageParam)
+  return response.data
+}
+
+// Every result of a list endpoint, following next until it runs out
+export const fetchAllPages = async (url) => {
+  const results = []
+  while (url) {
+    const response = await api.get(url)
+    results.push(...response.data.results)
+    url = response.data.next
+  }
+  return results
+}
+
 export default api
 